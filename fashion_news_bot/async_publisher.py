@@ -0,0 +1,259 @@
+"""
+Asynchronous WordPress publisher for backfills and large runs.
+
+`AsyncWordPressPublisher.publish_many` pipelines many articles: each
+item uploads its featured image and, as soon as that is done, joins the
+next post creation, so posts are created while other uploads are still
+running (all requests bounded by `settings.async_publish_concurrency`).
+Posts that are ready together are created through WordPress' `/batch/v1`
+endpoint, up to `settings.wp_batch_size` per round-trip.  Sites without
+the batch endpoint (WordPress < 5.6, or disabled by a plugin) fall back
+to one request per post.  Every item gets its own `PublishResult`, so
+partial failures (including a failed image upload, reported in
+`media_error`) can be retried individually.  Images can be given as a
+file path or as an in-memory `EncodedImage`, which is uploaded without
+touching the disk.  `pipeline.ArticlePipeline.run_batched` publishes
+through it (e.g. `batch_writer --publish`).
+"""
+
+import asyncio
+import logging
+import mimetypes
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+import httpx
+
+from .config import settings
+from .http_client import NON_IDEMPOTENT_RETRY_STATUSES, backoff_delay, retry_after
+from .image_processing import EncodedImage
+from .publisher import build_post_payload
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PublishItem:
+    """One article to publish.  `key` identifies it in the results."""
+
+    key: str
+    title: str
+    content_html: str
+    excerpt: str = ""
+    categories: Optional[List[int]] = None
+    image_path: Optional[str] = None
+    featured_media: Optional[int] = None
+    image: Optional[EncodedImage] = None
+
+
+@dataclass
+class PublishResult:
+    key: str
+    ok: bool
+    post_id: Optional[int] = None
+    media_id: Optional[int] = None
+    error: Optional[str] = None
+    # El post puede crearse sin imagen si falló su subida
+    media_error: Optional[str] = None
+
+
+class AsyncWordPressPublisher:
+    """Pipelined media uploads and batched post creation over httpx."""
+
+    def __init__(self, concurrency: Optional[int] = None, batch_size: Optional[int] = None) -> None:
+        if not settings.wp_base_url:
+            raise ValueError("WP_BASE_URL no configurada")
+        if not settings.wp_user or not settings.wp_app_password:
+            raise ValueError("WP_USER o WP_APP_PASSWORD no configurados")
+        self.base_url = settings.wp_base_url.rstrip("/")
+        self.auth = (settings.wp_user, settings.wp_app_password)
+        self.concurrency = max(1, concurrency or settings.async_publish_concurrency)
+        # WordPress limita cada lote a 25 peticiones por defecto
+        self.batch_size = max(1, min(batch_size or settings.wp_batch_size, 25))
+        self.use_batch = settings.wp_use_batch
+
+    async def _post(self, client: httpx.AsyncClient, path: str, **kwargs) -> httpx.Response:
+        """POST with the same retry policy as `http_client` for non-idempotent calls."""
+        url = f"{self.base_url}{path}"
+        for attempt in range(settings.http_max_retries + 1):
+            try:
+                resp = await client.post(url, **kwargs)
+            except httpx.ConnectTimeout:
+                if attempt >= settings.http_max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            if resp.status_code not in NON_IDEMPOTENT_RETRY_STATUSES or attempt >= settings.http_max_retries:
+                return resp
+            delay = retry_after(resp)
+            await asyncio.sleep(backoff_delay(attempt) if delay is None else delay)
+        raise AssertionError("unreachable")
+
+    async def _upload_media(
+        self, client: httpx.AsyncClient, sem: asyncio.Semaphore, item: PublishItem
+    ) -> Optional[str]:
+        """Upload the item's image and set `featured_media`; returns the error, if any."""
+        if item.featured_media or not (item.image or item.image_path):
+            return None
+        if item.image is not None:
+            filename = item.image.filename(f"img_{item.key}")
+            mime, data = item.image.mime, item.image.data
+        elif not os.path.exists(item.image_path):
+            logger.warning("Imagen no encontrada: %s", item.image_path)
+            return f"imagen no encontrada: {item.image_path}"
+        else:
+            filename = os.path.basename(item.image_path)
+            mime = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            with open(item.image_path, "rb") as f:
+                data = f.read()
+        async with sem:
+            try:
+                resp = await self._post(
+                    client,
+                    "/wp-json/wp/v2/media",
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+                    files={"file": (filename, data, mime)},
+                )
+            except httpx.HTTPError as e:
+                logger.error("Error subiendo media de %s: %s", item.key, e)
+                return str(e)
+        if resp.is_error:
+            logger.error("Error subiendo media de %s: %s", item.key, resp.status_code)
+            return f"{resp.status_code}: {resp.text[:200]}"
+        item.featured_media = resp.json().get("id")
+        return None
+
+    def _payload(self, item: PublishItem) -> dict:
+        return build_post_payload(
+            item.title, item.content_html, item.excerpt, item.categories, item.featured_media
+        )
+
+    async def _create_one(
+        self, client: httpx.AsyncClient, sem: asyncio.Semaphore, item: PublishItem
+    ) -> PublishResult:
+        async with sem:
+            try:
+                resp = await self._post(client, "/wp-json/wp/v2/posts", json=self._payload(item))
+            except httpx.HTTPError as e:
+                return PublishResult(item.key, False, media_id=item.featured_media, error=str(e))
+        if resp.is_error:
+            return PublishResult(
+                item.key, False, media_id=item.featured_media,
+                error=f"{resp.status_code}: {resp.text[:200]}",
+            )
+        return PublishResult(item.key, True, post_id=resp.json().get("id"), media_id=item.featured_media)
+
+    async def _create_batch(
+        self, client: httpx.AsyncClient, sem: asyncio.Semaphore, items: List[PublishItem]
+    ) -> Optional[List[PublishResult]]:
+        """Create posts in one `/batch/v1` request; None if batching is unavailable."""
+        body = {
+            "validation": "normal",
+            "requests": [
+                {"method": "POST", "path": "/wp/v2/posts", "body": self._payload(item)}
+                for item in items
+            ],
+        }
+        async with sem:
+            try:
+                resp = await self._post(client, "/wp-json/batch/v1", json=body)
+            except httpx.HTTPError as e:
+                return [PublishResult(i.key, False, media_id=i.featured_media, error=str(e)) for i in items]
+        if resp.status_code in (404, 405, 501):
+            logger.info("Endpoint /batch/v1 no disponible: publicando post a post")
+            self.use_batch = False
+            return None
+        if resp.is_error:
+            # Con validation=normal un error de validación rechaza todo el lote
+            error = f"{resp.status_code}: {resp.text[:200]}"
+            return [PublishResult(i.key, False, media_id=i.featured_media, error=error) for i in items]
+        results = []
+        responses = resp.json().get("responses", [])
+        for item, sub in zip(items, responses):
+            status = sub.get("status", 500)
+            sub_body = sub.get("body") or {}
+            if 200 <= status < 300:
+                results.append(PublishResult(item.key, True, post_id=sub_body.get("id"), media_id=item.featured_media))
+            else:
+                results.append(PublishResult(
+                    item.key, False, media_id=item.featured_media,
+                    error=f"{status}: {sub_body.get('message', '')}",
+                ))
+        for item in items[len(responses):]:
+            results.append(PublishResult(item.key, False, media_id=item.featured_media, error="sin respuesta en el lote"))
+        return results
+
+    async def _create_chunk(
+        self, client: httpx.AsyncClient, sem: asyncio.Semaphore, items: List[PublishItem]
+    ) -> List[PublishResult]:
+        if self.use_batch:
+            results = await self._create_batch(client, sem, items)
+            if results is not None:
+                return results
+        return list(await asyncio.gather(*(self._create_one(client, sem, item) for item in items)))
+
+    async def _upload_then_queue(
+        self,
+        client: httpx.AsyncClient,
+        sem: asyncio.Semaphore,
+        index: int,
+        items: List[PublishItem],
+        media_errors: List[Optional[str]],
+        ready: "asyncio.Queue[int]",
+    ) -> None:
+        try:
+            media_errors[index] = await self._upload_media(client, sem, items[index])
+        except Exception as e:
+            media_errors[index] = str(e)
+        finally:
+            await ready.put(index)
+
+    async def publish_many(self, items: List[PublishItem]) -> List[PublishResult]:
+        """Publish `items` and return one result per item, in input order."""
+        if not items:
+            return []
+        sem = asyncio.Semaphore(self.concurrency)
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        results: List[Optional[PublishResult]] = [None] * len(items)
+        media_errors: List[Optional[str]] = [None] * len(items)
+        ready: "asyncio.Queue[int]" = asyncio.Queue()
+        async with httpx.AsyncClient(
+            auth=self.auth,
+            timeout=60,
+            limits=limits,
+            headers={"User-Agent": settings.http_user_agent},
+        ) as client:
+            uploads = [
+                asyncio.create_task(
+                    self._upload_then_queue(client, sem, i, items, media_errors, ready)
+                )
+                for i in range(len(items))
+            ]
+            creations = []
+            remaining = len(items)
+            while remaining:
+                # Cada lote lleva los artículos cuya imagen ya está subida
+                chunk = [await ready.get()]
+                while len(chunk) < self.batch_size and not ready.empty():
+                    chunk.append(ready.get_nowait())
+                remaining -= len(chunk)
+                creations.append((
+                    chunk,
+                    asyncio.create_task(self._create_chunk(client, sem, [items[i] for i in chunk])),
+                ))
+            await asyncio.gather(*uploads)
+            for chunk, task in creations:
+                for i, result in zip(chunk, await task):
+                    result.media_error = media_errors[i]
+                    results[i] = result
+        ok = sum(1 for r in results if r.ok)
+        failed_media = sum(1 for r in results if r.media_error)
+        if failed_media:
+            logger.warning("Publicación por lotes: %d imágenes no se pudieron subir", failed_media)
+        logger.info("Publicación por lotes: %d/%d posts creados", ok, len(items))
+        return results
+
+    def publish_many_sync(self, items: List[PublishItem]) -> List[PublishResult]:
+        """Blocking wrapper around `publish_many` for synchronous callers."""
+        return asyncio.run(self.publish_many(items))
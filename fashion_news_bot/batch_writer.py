@@ -0,0 +1,228 @@
+"""
+Bulk article rewriting through the OpenAI Batch API.
+
+For overnight backfills of hundreds of articles, one synchronous call
+per article is slow and pays the full price.  This module writes one
+JSONL request per article, with the same prompt as the online path
+(`writer.build_article_prompt`), uploads it, creates a batch against
+`/v1/responses`, polls until the batch finishes and maps the results
+back to the articles by hash (the request `custom_id`).
+
+Results are parsed with `writer.parse_article_markdown` and stored in the
+text response cache, so publishing the articles afterwards through the
+normal pipeline (`--publish`) makes no synchronous OpenAI calls; the
+posts are then created together by `async_publisher` (pipelined uploads
+and `/batch/v1`).  The
+batch ID and its articles are saved in `settings.batch_dir`, so a
+backfill interrupted while polling can be picked up with `--resume`::
+
+    python -m fashion_news_bot.batch_writer --limit 300
+    python -m fashion_news_bot.batch_writer --resume batch_abc123 --publish
+
+With `OPENAI_BASE_URL` pointing to a local stand-in server the whole flow
+runs without the real API.
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Tuple
+
+from .config import settings
+from .storage import _atomic_write_json
+from . import writer
+from .language import get_detector
+from .prompt_builder import count_tokens
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+
+def _state_path(batch_id: str) -> str:
+    return os.path.join(settings.batch_dir, f"{batch_id}.json")
+
+
+def build_batch_requests(
+    articles: List[Dict],
+) -> Tuple[List[Dict], Dict[str, str], Dict[str, Dict]]:
+    """Build the batch request lines for `articles`.
+
+    Returns the request lines, the cache key of each article hash and the
+    articles whose rewrite is already cached (parsed, by hash), which are
+    left out of the batch.
+    """
+    requests: List[Dict] = []
+    cache_keys: Dict[str, str] = {}
+    cached: Dict[str, Dict] = {}
+    for art in articles:
+        prompt, cache_key = writer.build_article_prompt(art)
+        cache_keys[art["hash"]] = cache_key
+        hit = writer.text_cache.get(cache_key) if writer.text_cache is not None else None
+        if hit is not None:
+            cached[art["hash"]] = writer.parse_article_markdown(hit["raw_markdown"], art)
+            continue
+        requests.append({
+            "custom_id": art["hash"],
+            "method": "POST",
+            "url": "/v1/responses",
+            "body": {"model": settings.openai_text_model, "input": prompt},
+        })
+    return requests, cache_keys, cached
+
+
+def submit_batch(requests: List[Dict], articles: List[Dict], cache_keys: Dict[str, str]) -> str:
+    """Upload the requests, create the batch and save its state; return its ID."""
+    os.makedirs(settings.batch_dir, exist_ok=True)
+    input_path = os.path.join(settings.batch_dir, f"requests-{int(time.time())}.jsonl")
+    with open(input_path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+    with open(input_path, "rb") as f:
+        input_file = writer.client.files.create(file=f, purpose="batch")
+    os.remove(input_path)
+    batch = writer.client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/responses",
+        completion_window="24h",
+    )
+    wanted = {r["custom_id"] for r in requests}
+    _atomic_write_json(_state_path(batch.id), {
+        "batch_id": batch.id,
+        "created": time.time(),
+        "articles": [art for art in articles if art["hash"] in wanted],
+        "cache_keys": {h: k for h, k in cache_keys.items() if h in wanted},
+    }, indent=2)
+    logger.info("Lote %s enviado con %d artículos", batch.id, len(requests))
+    return batch.id
+
+
+def wait_for_batch(batch_id: str):
+    """Poll the batch until it reaches a terminal status or the wait limit."""
+    deadline = time.time() + settings.batch_max_wait_hours * 3600
+    while True:
+        batch = writer.client.batches.retrieve(batch_id)
+        counts = getattr(batch, "request_counts", None)
+        if counts is not None:
+            logger.info(
+                "Lote %s: %s (%s/%s completadas, %s fallidas)",
+                batch_id, batch.status, counts.completed, counts.total, counts.failed,
+            )
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        if time.time() >= deadline:
+            raise TimeoutError(f"El lote {batch_id} no terminó a tiempo (estado {batch.status})")
+        time.sleep(settings.batch_poll_interval)
+
+
+def _output_text(body: Dict) -> str:
+    """Concatenate the output text of a `/v1/responses` response body."""
+    parts = []
+    for item in body.get("output", []):
+        for content in item.get("content") or []:
+            if content.get("type") == "output_text":
+                parts.append(content.get("text", ""))
+    return "".join(parts)
+
+
+def collect_results(batch, articles: List[Dict], cache_keys: Dict[str, str]) -> Dict[str, Dict]:
+    """Download the batch output and return the parsed article text by hash."""
+    by_hash = {art["hash"]: art for art in articles}
+    results: Dict[str, Dict] = {}
+    if batch.output_file_id:
+        content = writer.client.files.content(batch.output_file_id).text
+        input_tokens = output_tokens = 0
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            art = by_hash.get(item.get("custom_id"))
+            response = item.get("response") or {}
+            if art is None or item.get("error") or response.get("status_code") != 200:
+                logger.warning("Petición del lote fallida: %s", item.get("custom_id"))
+                continue
+            body = response.get("body") or {}
+            raw_markdown = _output_text(body)
+            if not raw_markdown:
+                logger.warning("Respuesta vacía en el lote para %s", art["hash"])
+                continue
+            usage = body.get("usage") or {}
+            input_tokens += usage.get("input_tokens", 0)
+            output_tokens += usage.get("output_tokens", 0)
+            if writer.text_cache is not None:
+                writer.text_cache.put(cache_keys[art["hash"]], {"raw_markdown": raw_markdown})
+            results[art["hash"]] = writer.parse_article_markdown(raw_markdown, art)
+        logger.info("Tokens del lote: %d de entrada, %d de salida", input_tokens, output_tokens)
+        writer.text_budget.charge(input_tokens + output_tokens)
+    if batch.error_file_id:
+        errors = writer.client.files.content(batch.error_file_id).text.splitlines()
+        logger.warning("El lote %s tuvo %d peticiones con error", batch.id, len(errors))
+    logger.info("Lote %s: %d/%d artículos reescritos", batch.id, len(results), len(articles))
+    return results
+
+
+def resume_batch(batch_id: str) -> Tuple[List[Dict], Dict[str, Dict]]:
+    """Wait for a submitted batch and collect it; returns its articles and texts."""
+    with open(_state_path(batch_id), "r", encoding="utf-8") as f:
+        state = json.load(f)
+    batch = wait_for_batch(batch_id)
+    results = collect_results(batch, state["articles"], state["cache_keys"])
+    os.remove(_state_path(batch_id))
+    return state["articles"], results
+
+
+def rewrite_in_batch(articles: List[Dict]) -> Dict[str, Dict]:
+    """Rewrite `articles` through the Batch API; returns the text by hash."""
+    if writer.client is None:
+        raise RuntimeError("OPENAI_API_KEY no configurada: el modo por lotes necesita la API")
+    requests, cache_keys, results = build_batch_requests(articles)
+    if results:
+        logger.info("%d artículos ya estaban en la caché de textos", len(results))
+    if not requests:
+        return results
+    writer.text_budget.check(sum(count_tokens(r["body"]["input"]) for r in requests))
+    batch_id = submit_batch(requests, articles, cache_keys)
+    _, batch_results = resume_batch(batch_id)
+    results.update(batch_results)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reescribe artículos en lote con la Batch API de OpenAI.")
+    parser.add_argument("--limit", type=int, default=100, help="artículos nuevos a reescribir")
+    parser.add_argument("--resume", metavar="BATCH_ID", help="esperar y recoger un lote ya enviado")
+    parser.add_argument("--publish", action="store_true", help="publicar los artículos reescritos")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    if args.resume:
+        articles, results = resume_batch(args.resume)
+    else:
+        from .scraper import get_fresh_fashion_articles
+        articles = get_fresh_fashion_articles(args.limit)
+        results = rewrite_in_batch(articles)
+        get_detector().save()
+    if not args.publish:
+        return
+    if writer.text_cache is None:
+        raise SystemExit("Publicar tras el lote necesita TEXT_CACHE_ENABLED=true.")
+    # El texto ya está en la caché: el pipeline solo genera imágenes y
+    # publica todo junto con el publicador asíncrono (/batch/v1)
+    from .async_publisher import AsyncWordPressPublisher
+    from .journal import PipelineJournal
+    from .pipeline import ArticlePipeline
+    from .publisher import WordPressPublisher
+    from .storage import get_published_store
+
+    published = get_published_store()
+    ready = [art for art in articles if art["hash"] in results]
+    journal = PipelineJournal(published=published)
+    with ArticlePipeline(WordPressPublisher(), published, journal) as pipeline:
+        pipeline.run_batched(ready, AsyncWordPressPublisher())
+    published.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Offline benchmarks for the fashion news bot.
+
+Each module can be run with ``python -m fashion_news_bot.benchmarks.<name>``
+and prints its results to stdout.  None of them touch live services.
+"""
@@ -0,0 +1,104 @@
+"""
+Memory and lookup-time benchmark for the dedup check.
+
+Compares the historical set of 64-character hex strings with a set of raw
+32-byte digests, the SQLite store and the Bloom filter in front of it::
+
+    python -m fashion_news_bot.benchmarks.dedup_benchmark --size 200000
+"""
+
+import argparse
+import gc
+import os
+import secrets
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+from ..bloom import BloomFilter
+from ..config import settings
+from ..storage import BloomFilteredStore, SqlitePublishedStore
+
+
+def _measure_memory(build: Callable[[], object]):
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current
+
+
+def _time_lookups(contains: Callable[[str], bool], keys: List[str]) -> float:
+    start = time.perf_counter()
+    for key in keys:
+        contains(key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=200_000, help="hashes en el histórico")
+    parser.add_argument("--lookups", type=int, default=20_000, help="consultas por prueba")
+    parser.add_argument("--fp-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    history = [secrets.token_hex(32) for _ in range(args.size)]
+    hits = history[: args.lookups]
+    misses = [secrets.token_hex(32) for _ in range(args.lookups)]
+
+    rows = []
+    # Se crean objetos nuevos para que la medición incluya las claves
+    hex_set, mem = _measure_memory(lambda: {h.encode().decode() for h in history})
+    rows.append(("set[str hex]", mem, hex_set.__contains__))
+    digest_set, mem = _measure_memory(lambda: {bytes.fromhex(h) for h in history})
+    rows.append(("set[bytes32]", mem, lambda h: bytes.fromhex(h) in digest_set))
+
+    def build_bloom():
+        bf = BloomFilter(args.size, args.fp_rate)
+        for h in history:
+            bf.add(bytes.fromhex(h))
+        return bf
+
+    bloom, mem = _measure_memory(build_bloom)
+    rows.append((f"bloom (p={args.fp_rate})", mem, lambda h: bytes.fromhex(h) in bloom))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_store = SqlitePublishedStore(
+            os.path.join(tmp, "published.sqlite3"), os.path.join(tmp, "missing.json")
+        )
+        with sqlite_store._conn:
+            sqlite_store._conn.executemany(
+                "INSERT INTO published (digest, published_at) VALUES (?, 0)",
+                ((bytes.fromhex(h),) for h in history),
+            )
+        rows.append(("sqlite", 0, sqlite_store.__contains__))
+        # El almacén dimensiona su propio filtro (BLOOM_CAPACITY o el doble
+        # del histórico): se mide ese filtro, no el construido arriba
+        settings.bloom_capacity = args.size
+        settings.bloom_fp_rate = args.fp_rate
+        bloom_store = BloomFilteredStore(sqlite_store, os.path.join(tmp, "published.bloom"))
+        store_filter = bloom_store.bloom
+        rows.append(("bloom + sqlite", store_filter.num_bits // 8, bloom_store.__contains__))
+
+        print(f"Histórico: {args.size} hashes, {args.lookups} consultas\n")
+        print(f"{'estructura':<20}{'memoria (MiB)':>15}{'hit (µs)':>12}{'miss (µs)':>12}")
+        for name, mem, contains in rows:
+            print(
+                f"{name:<20}{mem / 2**20:>15.2f}"
+                f"{_time_lookups(contains, hits):>12.2f}"
+                f"{_time_lookups(contains, misses):>12.2f}"
+            )
+        false_positives = sum(bytes.fromhex(h) in bloom for h in misses)
+        print(f"\nFalsos positivos del filtro: {false_positives / len(misses):.4f}")
+        false_positives = sum(bytes.fromhex(h) in store_filter for h in misses)
+        print(
+            f"Filtro del almacén: {store_filter.num_bits} bits, {store_filter.num_hashes} funciones, "
+            f"falsos positivos {false_positives / len(misses):.4f}"
+        )
+        sqlite_store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""
+Local stand-in for every external service the bot talks to.
+
+One threaded HTTP server answers, under a path prefix per service, the
+calls the bot makes to NewsAPI (``/newsapi``), RSS feeds (``/rss``), the
+OpenAI API (``/openai/v1``: responses, streaming, images, files and
+batches), Gemini / Imagen (``/gemini``) and the WordPress REST API
+(``/wp``).  Answers are built from the recorded fixtures in
+``benchmarks/fixtures``, multiplied to as many distinct articles as
+requested, and each service can be given a latency and an error rate
+(503 answers) to reproduce slow or flaky providers::
+
+    python -m fashion_news_bot.benchmarks.fake_services --port 8765 \\
+        --latency openai=1.5,gemini=2,wp=0.2 --error-rate wp=0.05
+
+``GET /_stats`` returns the calls served per service and the posts and
+media created.  `benchmarks.run_pipeline` starts this server and points
+the bot at it.
+"""
+
+import argparse
+import base64
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from email import policy
+from email.parser import BytesParser
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image, ImageDraw
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SERVICES = ("newsapi", "rss", "openai", "gemini", "wp")
+
+
+def _fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def parse_service_values(spec: str) -> Dict[str, float]:
+    """Parse ``openai=1.5,wp=0.2`` (or a bare number for every service)."""
+    values: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            name, value = part.split("=", 1)
+            values[name.strip()] = float(value)
+        else:
+            values.update({name: float(part) for name in SERVICES})
+    return values
+
+
+def _render_image(width: int = 1536, height: int = 1024) -> bytes:
+    img = Image.new("RGB", (width, height))
+    draw = ImageDraw.Draw(img)
+    for y in range(0, height, 4):
+        shade = 40 + 160 * y // height
+        draw.rectangle([0, y, width, y + 4], fill=(shade, shade // 2, 90))
+    buf = BytesIO()
+    img.save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+class FakeServices:
+    """Fixtures, injected faults and the state created by the bot."""
+
+    def __init__(
+        self,
+        articles: int = 50,
+        feeds: int = 4,
+        latency: Optional[Dict[str, float]] = None,
+        error_rate: Optional[Dict[str, float]] = None,
+        batch_delay: float = 2.0,
+        seed: int = 0,
+    ) -> None:
+        self.articles = articles
+        self.feeds = feeds
+        self.latency = latency or {}
+        self.error_rate = error_rate or {}
+        self.batch_delay = batch_delay
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {name: 0 for name in SERVICES}
+        self.errors: Dict[str, int] = {name: 0 for name in SERVICES}
+        self.posts: List[Dict] = []
+        self.media = 0
+        self._ids = itertools.count(1)
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict] = {}
+        self.newsapi = json.loads(_fixture("newsapi_everything.json"))
+        self.article_md = _fixture("openai_article.md")
+        self.feed_xml = _fixture("rss_feed.xml")
+        self.item_xml = _fixture("rss_item.xml")
+        self.image = _render_image()
+
+    def add_media(self) -> int:
+        with self._lock:
+            self.media += 1
+            return next(self._ids)
+
+    def add_post(self, payload: Dict) -> int:
+        with self._lock:
+            post_id = next(self._ids)
+            self.posts.append({"id": post_id, "title": payload.get("title")})
+            return post_id
+
+    def begin(self, service: str) -> bool:
+        """Count a call and apply its latency; False if it must fail."""
+        with self._lock:
+            self.calls[service] += 1
+            fail = self._rng.random() < self.error_rate.get(service, 0.0)
+            if fail:
+                self.errors[service] += 1
+        delay = self.latency.get(service, 0.0)
+        if delay:
+            time.sleep(delay)
+        return not fail
+
+    # ---------- NewsAPI y RSS ----------
+
+    def newsapi_everything(self, page_size: int) -> Dict:
+        templates = self.newsapi["articles"]
+        # La mitad de los artículos vienen de NewsAPI y el resto de los feeds
+        count = min(page_size, max(1, self.articles // 2))
+        articles = []
+        for i in range(count):
+            art = dict(templates[i % len(templates)])
+            art["title"] = f"{art['title']} ({i + 1})"
+            art["url"] = f"{art['url']}-{i + 1}"
+            articles.append(art)
+        return {"status": "ok", "totalResults": count, "articles": articles}
+
+    def rss_feed(self, index: int) -> Tuple[str, str]:
+        """Feed XML and its ETag; items are split evenly across the feeds."""
+        per_feed = max(1, (self.articles - self.articles // 2 + self.feeds - 1) // self.feeds)
+        templates = self.newsapi["articles"]
+        items = []
+        for i in range(per_feed):
+            n = index * per_feed + i
+            art = templates[n % len(templates)]
+            items.append(self.item_xml.format(
+                title=f"{art['title']} — feed {index} #{i + 1}",
+                link=f"https://example.com/feed{index}/{i + 1}",
+                guid=f"feed{index}-{i + 1}",
+                pub_date=formatdate(time.time() - n * 600, usegmt=True),
+                summary=art["description"].replace("<p>", "").replace("</p>", ""),
+            ))
+        xml = self.feed_xml.format(feed_title=f"Fake Fashion Feed {index}", items="\n".join(items))
+        return xml, f'"feed-{index}-{self.articles}"'
+
+    # ---------- OpenAI ----------
+
+    def article_text(self, prompt: str) -> str:
+        match = re.search(r"^Título: (.+)$", prompt, re.MULTILINE)
+        headline = (match.group(1) if match else "Tendencias de la temporada") + ": lo que hay que saber"
+        return self.article_md.replace("{headline}", headline)
+
+    @staticmethod
+    def response_body(text: str, prompt: str) -> Dict:
+        input_tokens = len(prompt) // 4
+        output_tokens = len(text) // 4
+        return {
+            "id": "resp_" + uuid.uuid4().hex,
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": "completed",
+            "model": "fake",
+            "output": [{
+                "type": "message",
+                "id": "msg_" + uuid.uuid4().hex,
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }],
+            "usage": {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        }
+
+    def batch_status(self, batch_id: str) -> Dict:
+        with self._lock:
+            batch = self.batches[batch_id]
+            if batch["status"] == "in_progress" and time.time() >= batch["ready_at"]:
+                self._complete_batch(batch)
+            return {k: v for k, v in batch.items() if k != "ready_at"}
+
+    def _complete_batch(self, batch: Dict) -> None:
+        lines = []
+        for raw in self.files[batch["input_file_id"]].decode("utf-8").splitlines():
+            if not raw.strip():
+                continue
+            request = json.loads(raw)
+            prompt = request["body"]["input"]
+            lines.append(json.dumps({
+                "id": "batch_req_" + uuid.uuid4().hex,
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": uuid.uuid4().hex,
+                    "body": self.response_body(self.article_text(prompt), prompt),
+                },
+                "error": None,
+            }, ensure_ascii=False))
+        output_id = "file-" + uuid.uuid4().hex
+        self.files[output_id] = ("\n".join(lines) + "\n").encode("utf-8")
+        batch.update({
+            "status": "completed",
+            "output_file_id": output_id,
+            "completed_at": int(time.time()),
+            "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0},
+        })
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "errors": dict(self.errors),
+                "posts": len(self.posts),
+                "media": self.media,
+            }
+
+
+class FakeServicesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    services: FakeServices
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    # ---------- utilidades ----------
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers=None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, data, status: int = 200) -> None:
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def _unavailable(self) -> None:
+        self._json({"error": {"message": "injected failure"}}, 503)
+
+    def _service(self) -> Optional[str]:
+        name = self.path.lstrip("/").split("/", 1)[0]
+        return name if name in SERVICES else None
+
+    # ---------- rutas ----------
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path == "/_stats":
+            return self._json(self.services.stats())
+        service = self._service()
+        if service is None:
+            return self._json({"error": "not found"}, 404)
+        if not self.services.begin(service):
+            return self._unavailable()
+        if url.path == "/newsapi/v2/everything":
+            page_size = int(parse_qs(url.query).get("pageSize", ["20"])[0])
+            return self._json(self.services.newsapi_everything(page_size))
+        match = re.fullmatch(r"/rss/(\d+)\.xml", url.path)
+        if match:
+            xml, etag = self.services.rss_feed(int(match.group(1)))
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, b"", headers={"ETag": etag})
+            return self._send(200, xml.encode("utf-8"), "application/rss+xml", {"ETag": etag})
+        match = re.fullmatch(r"/openai/v1/batches/([\w-]+)", url.path)
+        if match and match.group(1) in self.services.batches:
+            return self._json(self.services.batch_status(match.group(1)))
+        match = re.fullmatch(r"/openai/v1/files/([\w-]+)/content", url.path)
+        if match and match.group(1) in self.services.files:
+            return self._send(200, self.services.files[match.group(1)], "application/octet-stream")
+        return self._json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        service = self._service()
+        body = self._body()
+        if service is None:
+            return self._json({"error": "not found"}, 404)
+        if not self.services.begin(service):
+            return self._unavailable()
+        path = urlparse(self.path).path
+        if path == "/openai/v1/responses":
+            return self._openai_response(json.loads(body))
+        if path == "/openai/v1/images/generations":
+            return self._json({
+                "created": int(time.time()),
+                "data": [{"b64_json": base64.b64encode(self.services.image).decode("ascii")}],
+            })
+        if path == "/openai/v1/files":
+            return self._openai_file(body)
+        if path == "/openai/v1/batches":
+            return self._openai_batch(json.loads(body))
+        if path.startswith("/gemini/") and path.endswith(":generateContent"):
+            return self._json({"candidates": [{
+                "content": {"role": "model", "parts": [{"inlineData": {
+                    "mimeType": "image/jpeg",
+                    "data": base64.b64encode(self.services.image).decode("ascii"),
+                }}]},
+                "finishReason": "STOP",
+            }]})
+        if path.startswith("/gemini/") and path.endswith(":predict"):
+            return self._json({"predictions": [{
+                "bytesBase64Encoded": base64.b64encode(self.services.image).decode("ascii"),
+                "mimeType": "image/jpeg",
+            }]})
+        if path == "/wp/wp-json/wp/v2/media":
+            return self._json({"id": self.services.add_media()}, 201)
+        if path == "/wp/wp-json/wp/v2/posts":
+            return self._json({"id": self.services.add_post(json.loads(body))}, 201)
+        if path == "/wp/wp-json/batch/v1":
+            requests = json.loads(body).get("requests", [])
+            return self._json({"responses": [
+                {"status": 201, "body": {"id": self.services.add_post(r.get("body") or {})}}
+                for r in requests
+            ]}, 207)
+        return self._json({"error": "not found"}, 404)
+
+    def _openai_response(self, request: Dict) -> None:
+        prompt = request.get("input") or ""
+        text = self.services.article_text(prompt)
+        body = self.services.response_body(text, prompt)
+        if not request.get("stream"):
+            return self._json(body)
+        # Server-sent events, en trozos de ~40 caracteres como los deltas reales
+        events = [{"type": "response.created", "response": {**body, "status": "in_progress", "output": []}}]
+        for i in range(0, len(text), 40):
+            events.append({
+                "type": "response.output_text.delta",
+                "item_id": body["output"][0]["id"],
+                "output_index": 0,
+                "content_index": 0,
+                "delta": text[i:i + 40],
+            })
+        events.append({"type": "response.completed", "response": body})
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for n, event in enumerate(events):
+            event["sequence_number"] = n
+            self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _openai_file(self, body: bytes) -> None:
+        content_type = self.headers.get("Content-Type", "")
+        message = BytesParser(policy=policy.default).parsebytes(
+            b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+        )
+        data, filename = b"", "upload.jsonl"
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                data = part.get_payload(decode=True) or b""
+                filename = part.get_filename() or filename
+        file_id = "file-" + uuid.uuid4().hex
+        self.services.files[file_id] = data
+        self._json({
+            "id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+            "filename": filename, "purpose": "batch", "status": "processed",
+        })
+
+    def _openai_batch(self, request: Dict) -> None:
+        batch_id = "batch_" + uuid.uuid4().hex
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": request.get("endpoint"),
+            "input_file_id": request.get("input_file_id"),
+            "completion_window": request.get("completion_window", "24h"),
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "ready_at": time.time() + self.services.batch_delay,
+        }
+        self.services.batches[batch_id] = batch
+        self._json(self.services.batch_status(batch_id))
+
+
+def serve(services: FakeServices, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the server in a daemon thread and return it."""
+    handler = type("Handler", (FakeServicesHandler,), {"services": services})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-services", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor local que simula NewsAPI, RSS, OpenAI, Gemini y WordPress.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--articles", type=int, default=50, help="artículos distintos entre NewsAPI y los feeds")
+    parser.add_argument("--feeds", type=int, default=4, help="feeds RSS servidos en /rss/<n>.xml")
+    parser.add_argument("--latency", default="", help="segundos por servicio: openai=1.5,wp=0.2")
+    parser.add_argument("--error-rate", default="", help="proporción de 503 por servicio: wp=0.05")
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="segundos hasta completar un lote")
+    args = parser.parse_args()
+    services = FakeServices(
+        args.articles, args.feeds,
+        parse_service_values(args.latency), parse_service_values(args.error_rate),
+        args.batch_delay,
+    )
+    server = serve(services, args.host, args.port)
+    print(f"Servicios simulados en http://{args.host}:{server.server_port}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Latency benchmark of language detection.
+
+Compares the historical call (`langdetect.detect` on up to 8000
+characters of title + description + content) with `LanguageDetector`:
+bounded sample, memo by article hash and per-source learned languages::
+
+    python -m fashion_news_bot.benchmarks.language_benchmark --articles 500
+"""
+
+import argparse
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from ..config import settings
+from ..language import LanguageDetector, sample_text
+
+SAMPLES = {
+    "en": (
+        "The designer closed Paris Fashion Week with a collection built around tailoring, "
+        "sheer layers and oversized outerwear. Editors praised the restrained palette and "
+        "the return of the house's archival silhouettes, while buyers pointed to the "
+        "accessories as the commercial highlight of the season. "
+    ),
+    "es": (
+        "La diseñadora cerró la Semana de la Moda de París con una colección centrada en la "
+        "sastrería, las transparencias y los abrigos amplios. La prensa destacó la paleta "
+        "contenida y el regreso de las siluetas de archivo de la casa, mientras que los "
+        "compradores señalaron los accesorios como lo más comercial de la temporada. "
+    ),
+    "fr": (
+        "La créatrice a clôturé la Fashion Week de Paris avec une collection construite "
+        "autour du tailleur, des superpositions transparentes et des manteaux amples. Les "
+        "rédactrices ont salué la palette sobre et le retour des silhouettes d'archives. "
+    ),
+    "it": (
+        "La stilista ha chiuso la settimana della moda di Parigi con una collezione "
+        "costruita attorno alla sartoria, alle trasparenze e ai capispalla oversize. La "
+        "stampa ha lodato la palette sobria e il ritorno delle silhouette d'archivio. "
+    ),
+}
+
+
+def _articles(count: int, sources: int) -> List[Dict]:
+    rng = random.Random(1)
+    langs = sorted(SAMPLES)
+    articles = []
+    for i in range(count):
+        # Cada fuente publica siempre en el mismo idioma
+        source = i % sources
+        lang = langs[source % len(langs)]
+        body = SAMPLES[lang] * rng.randint(3, 30)
+        articles.append({
+            "hash": f"{i:064x}",
+            "source": f"source-{source}",
+            "title": SAMPLES[lang][:80],
+            "description": body,
+            "content": body,
+            "expected": lang,
+        })
+    return articles
+
+
+def _historical(article: Dict) -> str:
+    from langdetect import LangDetectException, detect
+
+    text = (
+        (article.get("title") or "") + "\n\n"
+        + (article.get("description") or "") + "\n\n"
+        + (article.get("content") or "")
+    )[:8000]
+    try:
+        return detect(text)
+    except LangDetectException:
+        return "unknown"
+
+
+def _first_call_ms() -> float:
+    """Latency of the first langdetect call in a fresh interpreter."""
+    code = (
+        "import time; from langdetect import detect; t = time.perf_counter(); "
+        "detect('The collection opened the show.'); print(time.perf_counter() - t)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip()) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--articles", type=int, default=500, help="artículos sintéticos")
+    parser.add_argument("--sources", type=int, default=8, help="fuentes distintas")
+    args = parser.parse_args()
+
+    articles = _articles(args.articles, args.sources)
+    print(f"Primera llamada a langdetect (carga de perfiles): {_first_call_ms():.0f} ms\n")
+
+    rows = []
+    start = time.perf_counter()
+    results = [_historical(a) for a in articles]
+    rows.append(("detect(8000 chars)", time.perf_counter() - start, results))
+
+    detector = LanguageDetector()
+    detector.warm_up()
+    # Solo la muestra acotada, sin historial por fuente ni memo
+    start = time.perf_counter()
+    results = [detector.detect_text(sample_text(a)) for a in articles]
+    rows.append((f"muestra {settings.language_sample_chars} chars", time.perf_counter() - start, results))
+
+    detector = LanguageDetector()
+    detector.warm_up()
+    start = time.perf_counter()
+    results = [detector.detect_article(a) for a in articles]
+    rows.append(("+ idioma por fuente", time.perf_counter() - start, results))
+
+    start = time.perf_counter()
+    results = [detector.detect_article(a) for a in articles]
+    rows.append(("+ memo por hash", time.perf_counter() - start, results))
+
+    print(f"{'método':<24}{'total (ms)':>12}{'por artículo (µs)':>20}{'aciertos':>10}")
+    for name, seconds, langs in rows:
+        correct = sum(lang == a["expected"] for lang, a in zip(langs, articles))
+        print(
+            f"{name:<24}{seconds * 1000:>12.1f}"
+            f"{seconds / len(articles) * 1e6:>20.0f}"
+            f"{correct / len(articles):>10.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+End-to-end throughput benchmark of `main.run_once`.
+
+Starts `benchmarks.fake_services` in a separate process, points every
+client of the bot at it (NewsAPI, RSS, OpenAI, Gemini, WordPress) with
+its data files in a temporary directory, runs one `run_once` for N
+articles and reports articles per minute, the per-stage latency
+collected by `metrics` and the peak memory of the bot process::
+
+    python -m fashion_news_bot.benchmarks.run_pipeline --articles 50 \\
+        --latency openai=1.5,gemini=2,wp=0.2 --error-rate wp=0.02
+
+With ``--json`` the results are also written to a file, so runs before
+and after a change can be compared (e.g. in CI) to catch regressions.
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+from typing import Dict
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_services(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "fashion_news_bot.benchmarks.fake_services",
+        "--port", str(port),
+        "--articles", str(args.articles),
+        "--feeds", str(args.feeds),
+        "--latency", args.latency,
+        "--error-rate", args.error_rate,
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stats", timeout=1).read()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise SystemExit("El servidor de servicios simulados no arrancó")
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit("El servidor de servicios simulados no respondió a tiempo")
+
+
+def _configure_environment(args: argparse.Namespace, port: int) -> None:
+    """Environment read by `config.Settings`; must be set before importing the bot."""
+    base = f"http://127.0.0.1:{port}"
+    os.environ.update({
+        "NEWSAPI_KEY": "fake",
+        "USE_NEWSAPI": "true",
+        "NEWSAPI_BASE_URL": f"{base}/newsapi/v2",
+        "RSS_FEEDS": ",".join(f"{base}/rss/{i}.xml" for i in range(args.feeds)),
+        "OPENAI_API_KEY": "fake",
+        "OPENAI_BASE_URL": f"{base}/openai/v1",
+        "OPENAI_STREAMING": "true" if args.streaming else "false",
+        "GEMINI_API_KEY": "fake",
+        "GEMINI_BASE_URL": f"{base}/gemini",
+        "IMAGE_PROVIDERS": args.image_providers,
+        "WP_BASE_URL": f"{base}/wp",
+        "WP_USER": "bench",
+        "WP_APP_PASSWORD": "bench",
+        "MAX_ARTICLES_PER_RUN": str(args.articles),
+        # Cada artículo debe recorrer todo el pipeline: sin cachés ni
+        # reutilización de portadas (los fixtures se parecen entre sí)
+        "TEXT_CACHE_ENABLED": "false",
+        "IMAGE_REUSE_ENABLED": "false",
+        "NEAR_DUP_ENABLED": "false",
+        "IMAGE_ARCHIVE": "false",
+        "METRICS_ENABLED": "true",
+        "STATS_FLUSH_INTERVAL": "0",
+    })
+
+
+def _isolate_data(tmp: str) -> None:
+    """Move every data file the bot writes into `tmp`."""
+    from ..config import BASE_DIR, settings
+
+    for name, value in vars(settings).items():
+        # El clasificador solo lee sus ficheros: se usan los del repositorio
+        if name.startswith("classifier_"):
+            continue
+        if isinstance(value, str) and value.startswith(BASE_DIR + os.sep):
+            setattr(settings, name, os.path.join(tmp, os.path.relpath(value, BASE_DIR)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--articles", type=int, default=50, help="artículos a publicar")
+    parser.add_argument("--feeds", type=int, default=4, help="feeds RSS simulados")
+    parser.add_argument("--latency", default="", help="segundos por servicio: openai=1.5,wp=0.2")
+    parser.add_argument("--error-rate", default="", help="proporción de 503 por servicio: wp=0.05")
+    parser.add_argument("--streaming", action="store_true", help="OPENAI_STREAMING=true")
+    parser.add_argument("--image-providers", default="gemini,openai,placeholder")
+    parser.add_argument("--json", metavar="PATH", help="guardar los resultados en JSON")
+    parser.add_argument("--verbose", action="store_true", help="mostrar el log del bot")
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    port = _free_port()
+    services = _start_services(args, port)
+    try:
+        _configure_environment(args, port)
+        with tempfile.TemporaryDirectory() as tmp:
+            _isolate_data(tmp)
+            from .. import main as bot
+            from ..metrics import get_recorder
+
+            start = time.perf_counter()
+            bot.run_once()
+            elapsed = time.perf_counter() - start
+            summary = get_recorder().summary()
+            image_providers = Counter(
+                r.labels["provider"] for r in get_recorder().records
+                if r.name == "image" and r.labels.get("provider")
+            )
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stats") as resp:
+                served = json.load(resp)
+    finally:
+        services.terminate()
+        services.wait()
+
+    # ru_maxrss: KiB en Linux, bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mib = peak / 2**20 if sys.platform == "darwin" else peak / 1024
+    published = served["posts"]
+    results: Dict = {
+        "articles": args.articles,
+        "published": published,
+        "seconds": round(elapsed, 3),
+        "articles_per_minute": round(published / elapsed * 60, 2) if elapsed else 0.0,
+        "peak_rss_mib": round(peak_mib, 1),
+        "stages": summary,
+        "image_providers": dict(image_providers),
+        "services": served,
+        "warnings": [],
+    }
+    # Si el proveedor principal no generó nada, se midió el de respaldo
+    primary = args.image_providers.split(",")[0].strip()
+    if image_providers and not image_providers.get(primary):
+        results["warnings"].append(
+            f"El proveedor {primary} no generó ninguna imagen: el benchmark midió "
+            f"los de respaldo ({', '.join(image_providers)})"
+        )
+
+    print(f"\nPublicados {published}/{args.articles} artículos en {elapsed:.1f}s "
+          f"→ {results['articles_per_minute']:.1f} artículos/min")
+    print(f"Memoria máxima (RSS): {peak_mib:.1f} MiB\n")
+    print(f"{'etapa':<18}{'n':>6}{'err':>6}{'p50 (s)':>10}{'p95 (s)':>10}{'max (s)':>10}")
+    for name, row in summary.items():
+        print(f"{name:<18}{row['count']:>6}{row['errors']:>6}{row['p50']:>10.3f}{row['p95']:>10.3f}{row['max']:>10.3f}")
+    print("\nLlamadas servidas: " + ", ".join(
+        f"{name} {count} ({served['errors'][name]} con error)" for name, count in served["calls"].items()
+    ))
+    print("Imágenes por proveedor: " + (", ".join(
+        f"{name} {count}" for name, count in image_providers.items()
+    ) or "ninguna"))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    for warning in results["warnings"]:
+        print(f"\nAVISO: {warning}", file=sys.stderr)
+    if results["warnings"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
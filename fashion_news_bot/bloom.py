@@ -0,0 +1,92 @@
+"""
+Persisted Bloom filter used as a front layer for the dedup store.
+
+Article hashes are SHA-256 digests, so they are already uniformly
+distributed: the bit positions are derived directly from the digest with
+double hashing instead of re-hashing the key k times.  A negative answer
+is exact, a positive one must be confirmed against the backing store.
+"""
+
+import math
+import os
+import struct
+import threading
+
+# Cabecera del fichero: magic, nº de bits, nº de funciones hash, elementos
+_MAGIC = b"EVBF1"
+_HEADER = struct.Struct("<5sQIQ")
+
+
+def bits_for(capacity: int, fp_rate: float) -> int:
+    """Number of bits needed to hold `capacity` items at `fp_rate`."""
+    capacity = max(1, int(capacity))
+    fp_rate = min(max(fp_rate, 1e-9), 0.5)
+    return max(8, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+
+
+class BloomFilter:
+    """Bloom filter over 32-byte digests sized for a false-positive rate."""
+
+    def __init__(self, capacity: int, fp_rate: float) -> None:
+        capacity = max(1, int(capacity))
+        self.num_bits = bits_for(capacity, fp_rate)
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, digest: bytes):
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, digest: bytes) -> None:
+        with self._lock:
+            for pos in self._positions(digest):
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        # Igual que _positions pero cortando en el primer bit a cero
+        bits = self._bits
+        m = self.num_bits
+        pos = int.from_bytes(digest[:8], "little") % m
+        step = (int.from_bytes(digest[8:16], "little") | 1) % m
+        for _ in range(self.num_hashes):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+            pos = (pos + step) % m
+        return True
+
+    def save(self, path: str) -> None:
+        """Write the filter atomically to `path`."""
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with self._lock:
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, self.num_bits, self.num_hashes, self.count))
+                f.write(self._bits)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BloomFilter":
+        """Read a filter written by `save`.  Raises ValueError if invalid."""
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                raise ValueError("Fichero Bloom truncado")
+            magic, num_bits, num_hashes, count = _HEADER.unpack(header)
+            if magic != _MAGIC:
+                raise ValueError("Fichero Bloom con formato desconocido")
+            bits = f.read()
+        if len(bits) != (num_bits + 7) // 8:
+            raise ValueError("Fichero Bloom truncado")
+        bf = cls.__new__(cls)
+        bf.num_bits = num_bits
+        bf.num_hashes = num_hashes
+        bf.count = count
+        bf._bits = bytearray(bits)
+        bf._lock = threading.Lock()
+        return bf
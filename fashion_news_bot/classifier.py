@@ -1,6 +1,18 @@
+import json
+import logging
 import os
+import re
+import threading
+import time
+import zlib
 import requests
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
 
 # ================================================================
 #   LEER CREDENCIALES DESDE RENDER
@@ -13,54 +25,330 @@ WP_API_URL = "https://elitevogue.online/wp-json/wp/v2/posts"
 # ================================================================
 #   CLASIFICADOR
 # ================================================================
-def classify_article(article: Dict) -> str:
-    text = " ".join([
+# Tabla por defecto; se puede sobrescribir con un JSON (ver
+# settings.classifier_keywords_path) sin tocar el código.  El orden de
+# las categorías desempata cuando dos tienen la misma puntuación.
+DEFAULT_CATEGORY = "moda"
+
+DEFAULT_CATEGORY_KEYWORDS: Dict[str, List[str]] = {
+    "portadas": [
+        "portada", "cover", "editorial photo", "front page",
+        "producción", "modelo destacada", "shoot", "sesión"
+    ],
+    "moda": [
+        "moda", "fashion", "outfit", "vestido", "colección",
+        "desfile", "runway", "silhouette", "estilismo"
+    ],
+    "tendencias": [
+        "tendencia", "trend", "temporada", "color del año",
+        "estará de moda", "forecast", "pronóstico"
+    ],
+    "belleza": [
+        "maquillaje", "makeup", "skincare", "belleza",
+        "cosmética", "fragancia", "piel"
+    ],
+    "editorial": [
+        "reflexión", "poético", "crónica", "ensayo",
+        "observación", "profundo"
+    ],
+    "lifestyle": [
+        "lujo", "lifestyle", "inspiración",
+        "estilo de vida", "viaje"
+    ],
+    "cultura_visual": [
+        "visual", "estética", "fotografía",
+        "imagen", "simbolismo"
+    ],
+    "entrevistas": [
+        "entrevista", "modelo", "diseñador",
+        "perfil", "nos cuenta", "historia"
+    ],
+}
+
+
+# Plurales en -es que pierden la tilde: colección -> colecciones
+_ACCENT_PLURALS = {"ión": "ion", "ón": "on", "én": "en", "ín": "in", "án": "an", "ús": "us"}
+
+
+def _keyword_forms(keyword: str) -> List[str]:
+    """The keyword plus its unaccented stem when the plural drops the accent."""
+    forms = [keyword]
+    for ending, stem in _ACCENT_PLURALS.items():
+        if keyword.endswith(ending):
+            forms.append(keyword[: -len(ending)] + stem)
+            break
+    return forms
+
+
+class KeywordClassifier:
+    """Keyword table compiled into a single word-bounded regex.
+
+    The text is scanned once and every match adds a point to its
+    category(ies), so the cost no longer grows with the number of
+    keywords.  Keywords match whole words, optionally followed by a
+    plural "s"/"es" ("tendencias", "trends", "modelos"; "colección" also
+    matches "colecciones"), but "piel" no longer matches inside
+    "pielagos".
+    """
+
+    def __init__(self, table: Dict[str, List[str]], default: str = DEFAULT_CATEGORY) -> None:
+        self.categories = list(table)
+        self.default = default
+        self._keyword_categories: Dict[str, List[str]] = {}
+        for category, keywords in table.items():
+            for kw in keywords:
+                kw = kw.strip().lower()
+                if kw:
+                    for form in _keyword_forms(kw):
+                        self._keyword_categories.setdefault(form, []).append(category)
+        # Las más largas primero: "estará de moda" gana a "moda"
+        alternation = "|".join(
+            re.escape(kw) for kw in sorted(self._keyword_categories, key=len, reverse=True)
+        )
+        self._regex = re.compile(rf"(?<!\w)({alternation})(?:e?s)?(?!\w)") if alternation else None
+
+    def scores(self, text: str) -> Dict[str, int]:
+        """Return the number of keyword hits for every category."""
+        result = {category: 0 for category in self.categories}
+        if self._regex is None:
+            return result
+        for match in self._regex.finditer(text.lower()):
+            for category in self._keyword_categories[match.group(1)]:
+                result[category] += 1
+        return result
+
+    def classify(self, text: str) -> str:
+        scores = self.scores(text)
+        best = max(self.categories, key=lambda c: scores[c], default=None)
+        if best is None or scores[best] == 0:
+            return self.default
+        return best
+
+
+def load_keyword_table() -> Tuple[Dict[str, List[str]], str]:
+    """Load the keyword table and default category from configuration.
+
+    The JSON file has the shape
+    ``{"default": "moda", "categories": {"belleza": ["makeup", ...], ...}}``.
+    Falls back to the built-in table if the file is missing or invalid.
+    """
+    path = settings.classifier_keywords_path
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data["categories"], data.get("default", DEFAULT_CATEGORY)
+        except Exception as e:
+            logger.warning("Tabla de categorías inválida en %s: %s", path, e)
+    return DEFAULT_CATEGORY_KEYWORDS, DEFAULT_CATEGORY
+
+
+_classifier: Optional[KeywordClassifier] = None
+
+
+def get_classifier() -> KeywordClassifier:
+    """Return the compiled classifier, building it on first use."""
+    global _classifier
+    if _classifier is None:
+        table, default = load_keyword_table()
+        _classifier = KeywordClassifier(table, default)
+    return _classifier
+
+
+def classifier_text(article: Dict) -> str:
+    """The text of an article that the rules and the model score."""
+    return " ".join([
         article.get("title") or "",
         article.get("description") or "",
         article.get("content") or "",
-    ]).lower()
-
-    categories = {
-        "portadas": [
-            "portada", "cover", "editorial photo", "front page",
-            "producción", "modelo destacada", "shoot", "sesión"
-        ],
-        "moda": [
-            "moda", "fashion", "outfit", "vestido", "colección",
-            "desfile", "runway", "silhouette", "estilismo"
-        ],
-        "tendencias": [
-            "tendencia", "trend", "temporada", "color del año",
-            "estará de moda", "forecast", "pronóstico"
-        ],
-        "belleza": [
-            "maquillaje", "makeup", "skincare", "belleza",
-            "cosmética", "fragancia", "piel"
-        ],
-        "editorial": [
-            "reflexión", "poético", "crónica", "ensayo",
-            "observación", "profundo"
-        ],
-        "lifestyle": [
-            "lujo", "lifestyle", "inspiración",
-            "estilo de vida", "viaje"
-        ],
-        "cultura_visual": [
-            "visual", "estética", "fotografía",
-            "imagen", "simbolismo"
-        ],
-        "entrevistas": [
-            "entrevista", "modelo", "diseñador",
-            "perfil", "nos cuenta", "historia"
-        ],
-    }
+    ])
+
+
+def score_article(article: Dict) -> Dict[str, int]:
+    """Return keyword scores for every category of `article`."""
+    return get_classifier().scores(classifier_text(article))
+
+
+def classify_article(article: Dict) -> str:
+    """Return the category with the most keyword hits (default "moda")."""
+    return get_classifier().classify(classifier_text(article))
+
+
+_samples_lock = threading.Lock()
+
+
+def record_training_sample(article: Dict, post_id: Optional[int], category: str) -> None:
+    """Keep the text the classifier scored for a published post.
+
+    `train_classifier` joins these lines with the category each post is
+    filed under in WordPress, so the model trains on the same source text
+    it scores at serving time rather than on the rewritten post.
+    """
+    if not post_id:
+        return
+    record = {"post_id": post_id, "text": classifier_text(article), "category": category, "ts": time.time()}
+    path = settings.training_samples_path
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with _samples_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.warning("No se pudo guardar el ejemplo de entrenamiento: %s", e)
+
+
+# ================================================================
+#   MODELO LINEAL TF-IDF (CLASIFICACIÓN POR LOTES)
+# ================================================================
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(text: str) -> List[str]:
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def hash_vectorize(texts: List[str], n_features: int) -> np.ndarray:
+    """Turn texts into a dense (len(texts), n_features) matrix of log TF.
+
+    Unigrams and bigrams are hashed with CRC32 (stable across processes,
+    unlike `hash`) and the sign bit reduces the bias of collisions.
+    """
+    rows, cols, vals = [], [], []
+    for row, text in enumerate(texts):
+        counts: Dict[int, float] = {}
+        for token in _tokens(text):
+            h = zlib.crc32(token.encode("utf-8"))
+            col = h % n_features
+            counts[col] = counts.get(col, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+        for col, value in counts.items():
+            if value:
+                rows.append(row)
+                cols.append(col)
+                vals.append(value)
+    matrix = np.zeros((len(texts), n_features), dtype=np.float32)
+    if vals:
+        v = np.asarray(vals, dtype=np.float32)
+        matrix[rows, cols] = np.sign(v) * np.log1p(np.abs(v))
+    return matrix
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class LinearTextModel:
+    """Softmax regression over hashed TF-IDF features.
+
+    Trained offline (see `train_classifier`) and saved as a `.npz` file
+    with the weights, bias, IDF vector and category labels.
+    """
+
+    def __init__(self, labels: List[str], weights: np.ndarray, bias: np.ndarray, idf: np.ndarray) -> None:
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.idf = idf
+        self.n_features = weights.shape[0]
+
+    def features(self, texts: List[str]) -> np.ndarray:
+        return _normalize_rows(hash_vectorize(texts, self.n_features) * self.idf)
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        return _softmax(self.features(texts) @ self.weights + self.bias)
+
+    @classmethod
+    def fit(
+        cls,
+        texts: List[str],
+        labels: List[str],
+        n_features: int = 2 ** 13,
+        epochs: int = 300,
+        learning_rate: float = 1.0,
+        l2: float = 1e-4,
+    ) -> "LinearTextModel":
+        """Train with full-batch gradient descent on the cross-entropy loss."""
+        classes = sorted(set(labels))
+        y = np.zeros((len(labels), len(classes)), dtype=np.float32)
+        y[np.arange(len(labels)), [classes.index(l) for l in labels]] = 1.0
+        tf = hash_vectorize(texts, n_features)
+        df = np.count_nonzero(tf, axis=0)
+        idf = (np.log((1 + len(texts)) / (1 + df)) + 1.0).astype(np.float32)
+        x = _normalize_rows(tf * idf)
+        weights = np.zeros((n_features, len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        for _ in range(epochs):
+            grad = (_softmax(x @ weights + bias) - y) / len(texts)
+            weights -= learning_rate * (x.T @ grad + l2 * weights)
+            bias -= learning_rate * grad.sum(axis=0)
+        return cls(classes, weights, bias, idf)
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path, weights=self.weights, bias=self.bias, idf=self.idf,
+            labels=np.array(self.labels),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LinearTextModel":
+        with np.load(path) as data:
+            return cls([str(l) for l in data["labels"]], data["weights"], data["bias"], data["idf"])
+
+
+_model: Optional[LinearTextModel] = None
+_model_loaded = False
+
+
+def get_model() -> Optional[LinearTextModel]:
+    """Return the trained model, or None if there is none on disk."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        _model_loaded = True
+        path = settings.classifier_model_path
+        if path and os.path.exists(path):
+            try:
+                _model = LinearTextModel.load(path)
+                logger.info("Modelo de clasificación cargado (%d categorías)", len(_model.labels))
+            except Exception as e:
+                logger.warning("No se pudo cargar el modelo %s: %s", path, e)
+    return _model
+
 
-    for category, keywords in categories.items():
-        for kw in keywords:
-            if kw in text:
-                return category
+def classify_batch(articles: List[Dict]) -> List[Tuple[str, float]]:
+    """Classify a whole batch of articles at once.
 
-    return "moda"  # por defecto
+    Returns a `(category, confidence)` pair per article.  All articles are
+    scored with one matrix product by the trained model; articles where the
+    model is not confident enough (`settings.classifier_min_confidence`),
+    or every article when no model is trained, fall back to the keyword
+    rules with a confidence equal to the share of keyword hits.
+    """
+    if not articles:
+        return []
+    texts = [classifier_text(a) for a in articles]
+    results: List[Optional[Tuple[str, float]]] = [None] * len(articles)
+    model = get_model()
+    if model is not None:
+        proba = model.predict_proba(texts)
+        best = proba.argmax(axis=1)
+        for i, (idx, p) in enumerate(zip(best, proba[np.arange(len(texts)), best])):
+            if p >= settings.classifier_min_confidence:
+                results[i] = (model.labels[idx], float(p))
+    rules = get_classifier()
+    for i, text in enumerate(texts):
+        if results[i] is None:
+            scores = rules.scores(text)
+            label = rules.classify(text)
+            total = sum(scores.values())
+            results[i] = (label, scores.get(label, 0) / total if total else 0.0)
+    return results
 
 
 # ================================================================
@@ -33,23 +33,132 @@ class Settings:
     newsapi_key: str = os.getenv("NEWSAPI_KEY", "")
     use_newsapi: bool = os.getenv("USE_NEWSAPI", "true").lower() == "true"
     newsapi_query: str = os.getenv("NEWSAPI_QUERY", "fashion OR moda")
+    newsapi_base_url: str = os.getenv("NEWSAPI_BASE_URL", "https://newsapi.org/v2")
 
     # RSS feeds (comma separated list in env)
     rss_feeds: list = field(default_factory=list)
 
+    # Shared HTTP client: keep-alive pool and retries with backoff
+    http_pool_connections: int = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+    http_pool_size: int = int(os.getenv("HTTP_POOL_SIZE", "10"))
+    http_max_retries: int = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+    http_backoff_base: float = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+    http_backoff_max: float = float(os.getenv("HTTP_BACKOFF_MAX", "30"))
+    http_user_agent: str = os.getenv("HTTP_USER_AGENT", "EliteVogueBot/1.0 (+fashion_news_bot)")
+
+    # Concurrent fetch stage: worker limit, per-source timeout (seconds) and
+    # overall deadline for one fetch round (seconds)
+    fetch_concurrency: int = int(os.getenv("FETCH_CONCURRENCY", "8"))
+    fetch_timeout: float = float(os.getenv("FETCH_TIMEOUT", "15"))
+    fetch_deadline: float = float(os.getenv("FETCH_DEADLINE", "60"))
+    # Conditional GET (ETag / Last-Modified) for RSS feeds
+    rss_conditional_get: bool = os.getenv("RSS_CONDITIONAL_GET", "true").lower() == "true"
+
+    # Resident mode (python -m fashion_news_bot.daemon): polling interval per
+    # source in seconds, optional overrides ("NewsAPI=3600,<feed url>=300"),
+    # +/- jitter fraction, and backoff for sources that bring nothing new
+    daemon_newsapi_interval: float = float(os.getenv("DAEMON_NEWSAPI_INTERVAL", "1800"))
+    daemon_rss_interval: float = float(os.getenv("DAEMON_RSS_INTERVAL", "600"))
+    daemon_source_intervals: dict = field(default_factory=dict)
+    daemon_jitter: float = float(os.getenv("DAEMON_JITTER", "0.1"))
+    daemon_backoff_factor: float = float(os.getenv("DAEMON_BACKOFF_FACTOR", "1.5"))
+    daemon_max_interval: float = float(os.getenv("DAEMON_MAX_INTERVAL", "21600"))
+    # Sources due within this many seconds are polled in the same cycle
+    daemon_coalesce_seconds: float = float(os.getenv("DAEMON_COALESCE_SECONDS", "60"))
+    # Run the Telegram control bot inside the daemon process
+    daemon_telegram: bool = os.getenv("DAEMON_TELEGRAM", "false").lower() == "true"
+
     # OpenAI
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
+    # Alternative API endpoint (e.g. a local stand-in server for tests)
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")
+    openai_text_model: str = os.getenv("OPENAI_TEXT_MODEL", "gpt-4.1-mini")
+    # Token budget of the article text sent in each rewrite prompt
+    prompt_max_tokens: int = int(os.getenv("PROMPT_MAX_TOKENS", "1500"))
+    # Stream the rewrite token by token (title known before the body ends)
+    openai_streaming: bool = os.getenv("OPENAI_STREAMING", "false").lower() == "true"
+    # Batch API rewrites (python -m fashion_news_bot.batch_writer)
+    batch_poll_interval: float = float(os.getenv("BATCH_POLL_INTERVAL", "60"))
+    batch_max_wait_hours: float = float(os.getenv("BATCH_MAX_WAIT_HOURS", "24"))
+    # Token budget for text generation (0 = unlimited)
+    openai_tokens_per_run: int = int(os.getenv("OPENAI_TOKENS_PER_RUN", "0"))
+    openai_tokens_per_day: int = int(os.getenv("OPENAI_TOKENS_PER_DAY", "0"))
+    # Circuit breaker for text generation: consecutive failures and cooldown (seconds)
+    text_breaker_failures: int = int(os.getenv("TEXT_BREAKER_FAILURES", "3"))
+    text_breaker_cooldown: float = float(os.getenv("TEXT_BREAKER_COOLDOWN", "600"))
+
+    # Persistent cache of OpenAI rewrites
+    text_cache_enabled: bool = os.getenv("TEXT_CACHE_ENABLED", "true").lower() == "true"
+    text_cache_max_entries: int = int(os.getenv("TEXT_CACHE_MAX_ENTRIES", "2000"))
+    text_cache_max_mb: int = int(os.getenv("TEXT_CACHE_MAX_MB", "50"))
+    text_cache_max_age_days: float = float(os.getenv("TEXT_CACHE_MAX_AGE_DAYS", "7"))
 
     # WordPress credentials
     wp_base_url: str = os.getenv("WP_BASE_URL", "")
     wp_user: str = os.getenv("WP_USER", "")
     wp_app_password: str = os.getenv("WP_APP_PASSWORD", "")
+    # Async publisher (backfills): concurrency and /batch/v1 usage
+    async_publish_concurrency: int = int(os.getenv("ASYNC_PUBLISH_CONCURRENCY", "5"))
+    wp_use_batch: bool = os.getenv("WP_USE_BATCH", "true").lower() == "true"
+    wp_batch_size: int = int(os.getenv("WP_BATCH_SIZE", "25"))
 
     # Article generation
     max_articles_per_run: int = int(os.getenv("MAX_ARTICLES_PER_RUN", "3"))
     translation_enabled: bool = os.getenv("TRANSLATION_ENABLED", "true").lower() == "true"
+    # Language detection: seed, sample size and per-source learned languages
+    language_seed: int = int(os.getenv("LANGUAGE_SEED", "0"))
+    language_sample_chars: int = int(os.getenv("LANGUAGE_SAMPLE_CHARS", "600"))
+    language_source_min_samples: int = int(os.getenv("LANGUAGE_SOURCE_MIN_SAMPLES", "20"))
+    language_source_min_share: float = float(os.getenv("LANGUAGE_SOURCE_MIN_SHARE", "0.95"))
     writer_style: str = os.getenv("WRITER_STYLE", "luxury").lower()  # luxury or streetwear
 
+    # Pipeline concurrency: articles in flight and workers per stage
+    pipeline_concurrency: int = int(os.getenv("PIPELINE_CONCURRENCY", "3"))
+    text_workers: int = int(os.getenv("TEXT_WORKERS", "2"))
+    image_workers: int = int(os.getenv("IMAGE_WORKERS", "2"))
+    publish_workers: int = int(os.getenv("PUBLISH_WORKERS", "2"))
+
+    # Image post-processing: responsive widths and encodings
+    image_processing_enabled: bool = os.getenv("IMAGE_PROCESSING_ENABLED", "true").lower() == "true"
+    image_widths: list = field(default_factory=list)
+    image_formats: list = field(default_factory=list)
+    image_upload_format: str = os.getenv("IMAGE_UPLOAD_FORMAT", "webp").lower()
+    image_jpeg_quality: int = int(os.getenv("IMAGE_JPEG_QUALITY", "82"))
+    image_webp_quality: int = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+    image_process_workers: int = int(os.getenv("IMAGE_PROCESS_WORKERS", "2"))
+    # Images are uploaded from memory; archiving them to disk is optional
+    image_archive: bool = os.getenv("IMAGE_ARCHIVE", "false").lower() == "true"
+
+    # Reuse of covers already generated for articles on the same subject
+    image_reuse_enabled: bool = os.getenv("IMAGE_REUSE_ENABLED", "true").lower() == "true"
+    # Minimum Jaccard similarity between normalized source titles to reuse a cover
+    image_reuse_threshold: float = float(os.getenv("IMAGE_REUSE_THRESHOLD", "0.6"))
+    image_reuse_max_entries: int = int(os.getenv("IMAGE_REUSE_MAX_ENTRIES", "500"))
+    # dHash distance (over 64 bits) under which two images are the same cover
+    image_reuse_phash_distance: int = int(os.getenv("IMAGE_REUSE_PHASH_DISTANCE", "4"))
+
+    # Image providers, tried in order: gemini, openai, placeholder
+    image_providers: list = field(default_factory=list)
+    # Alternative Gemini API endpoint (e.g. benchmarks.fake_services)
+    gemini_base_url: str = os.getenv("GEMINI_BASE_URL", "")
+    # Gemini image models ("gemini-…") use generate_content with an API key;
+    # Imagen models (e.g. "imagegeneration@002") need a Vertex AI client
+    gemini_image_model: str = os.getenv("GEMINI_IMAGE_MODEL", "gemini-2.5-flash-image")
+    openai_image_model: str = os.getenv("OPENAI_IMAGE_MODEL", "gpt-image-1")
+    # Circuit breaker per image provider: consecutive failures and cooldown (seconds)
+    image_breaker_failures: int = int(os.getenv("IMAGE_BREAKER_FAILURES", "3"))
+    image_breaker_cooldown: float = float(os.getenv("IMAGE_BREAKER_COOLDOWN", "900"))
+    # Start the next remote provider if the current one has not answered
+    # after this many seconds (0 disables hedged requests)
+    image_hedge_after: float = float(os.getenv("IMAGE_HEDGE_AFTER", "0"))
+
+    # Circuit breakers also open when the error rate over the last
+    # BREAKER_WINDOW seconds reaches BREAKER_ERROR_RATE (with at least
+    # BREAKER_MIN_CALLS calls in the window)
+    breaker_error_rate: float = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+    breaker_window: float = float(os.getenv("BREAKER_WINDOW", "600"))
+    breaker_min_calls: int = int(os.getenv("BREAKER_MIN_CALLS", "6"))
+
     # Logging
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
 
@@ -57,7 +166,56 @@ class Settings:
     images_output_dir: str = os.path.join(BASE_DIR, "images")
     articles_output_dir: str = os.path.join(BASE_DIR, "data")
     published_db_path: str = os.path.join(BASE_DIR, "data", "published.json")
+    published_sqlite_path: str = os.path.join(BASE_DIR, "data", "published.sqlite3")
+    # Dedup store backend: sqlite (default) or json (legacy published.json)
+    dedup_backend: str = os.getenv("DEDUP_BACKEND", "sqlite").lower()
+    # Optional Bloom filter in front of the dedup store
+    dedup_bloom: bool = os.getenv("DEDUP_BLOOM", "false").lower() == "true"
+    bloom_capacity: int = int(os.getenv("BLOOM_CAPACITY", "1000000"))
+    bloom_fp_rate: float = float(os.getenv("BLOOM_FP_RATE", "0.01"))
+    bloom_filter_path: str = os.path.join(BASE_DIR, "data", "published.bloom")
     stats_db_path: str = os.path.join(BASE_DIR, "data", "stats.json")
+    # Per-stage metrics (JSON lines) and optional Prometheus textfile export
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    metrics_path: str = os.path.join(BASE_DIR, "data", "metrics.jsonl")
+    metrics_max_mb: int = int(os.getenv("METRICS_MAX_MB", "20"))
+    metrics_prometheus_path: str = os.getenv("METRICS_PROMETHEUS_PATH", "")
+    # Accumulated stats are written at the end of a run and every N seconds
+    stats_flush_interval: float = float(os.getenv("STATS_FLUSH_INTERVAL", "60"))
+    stats_hourly_retention_days: float = float(os.getenv("STATS_HOURLY_RETENTION_DAYS", "14"))
+    feed_cache_path: str = os.path.join(BASE_DIR, "data", "feed_cache.json")
+    deferred_articles_path: str = os.path.join(BASE_DIR, "data", "deferred_articles.json")
+    text_cache_dir: str = os.path.join(BASE_DIR, "data", "cache", "text")
+    journal_path: str = os.path.join(BASE_DIR, "data", "journal.jsonl")
+    batch_dir: str = os.path.join(BASE_DIR, "data", "batches")
+    # Unfinished articles are retried until they fail this many times or get too old
+    journal_max_failures: int = int(os.getenv("JOURNAL_MAX_FAILURES", "3"))
+    journal_max_age_hours: float = float(os.getenv("JOURNAL_MAX_AGE_HOURS", "48"))
+
+    # Near-duplicate detection across sources (SimHash + LSH)
+    near_dup_enabled: bool = os.getenv("NEAR_DUP_ENABLED", "true").lower() == "true"
+    near_dup_max_distance: int = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "6"))
+    near_dup_window_hours: float = float(os.getenv("NEAR_DUP_WINDOW_HOURS", "72"))
+    near_dup_index_path: str = os.path.join(BASE_DIR, "data", "simhash_index.json")
+    language_stats_path: str = os.path.join(BASE_DIR, "data", "source_languages.json")
+    image_library_path: str = os.path.join(BASE_DIR, "data", "image_library.json")
+    breaker_state_path: str = os.path.join(BASE_DIR, "data", "circuit_breakers.json")
+    daemon_state_path: str = os.path.join(BASE_DIR, "data", "daemon_schedule.json")
+
+    # Classifier keyword table (JSON: {"default": ..., "categories": {...}})
+    classifier_keywords_path: str = os.getenv(
+        "CLASSIFIER_KEYWORDS_PATH", os.path.join(BASE_DIR, "data", "categories.json")
+    )
+    # Batch classifier model trained offline (python -m fashion_news_bot.train_classifier)
+    classifier_model_path: str = os.getenv(
+        "CLASSIFIER_MODEL_PATH", os.path.join(BASE_DIR, "data", "classifier_model.npz")
+    )
+    classifier_min_confidence: float = float(os.getenv("CLASSIFIER_MIN_CONFIDENCE", "0.6"))
+    # Source text of every published post, joined with its WordPress
+    # category by train_classifier
+    training_samples_path: str = os.path.join(BASE_DIR, "data", "classifier_samples.jsonl")
+    # Optional comma separated category ranking applied before MAX_ARTICLES_PER_RUN
+    category_priority: list = field(default_factory=list)
 
     # Category ID mappings (from env variables like WP_CATEGORY_RUNWAY)
     category_ids: dict = field(default_factory=dict)
@@ -67,6 +225,30 @@ class Settings:
         rss = os.getenv("RSS_FEEDS", "")
         if rss:
             self.rss_feeds = [url.strip() for url in rss.split(",") if url.strip()]
+        self.image_widths = [
+            int(w) for w in os.getenv("IMAGE_WIDTHS", "1600,1024,640").split(",") if w.strip()
+        ]
+        self.image_formats = [
+            f.strip().lower() for f in os.getenv("IMAGE_FORMATS", "jpeg,webp").split(",") if f.strip()
+        ]
+        self.image_providers = [
+            p.strip().lower()
+            for p in os.getenv("IMAGE_PROVIDERS", "gemini,openai,placeholder").split(",")
+            if p.strip()
+        ]
+        intervals = {}
+        for item in os.getenv("DAEMON_SOURCE_INTERVALS", "").split(","):
+            # La URL del feed puede contener "=": se separa por el último
+            name, sep, seconds = item.strip().rpartition("=")
+            if sep and name:
+                try:
+                    intervals[name] = float(seconds)
+                except ValueError:
+                    pass
+        self.daemon_source_intervals = intervals
+        priority = os.getenv("CATEGORY_PRIORITY", "")
+        if priority:
+            self.category_priority = [c.strip() for c in priority.split(",") if c.strip()]
         # Build category mapping using environment variables
         categories = {}
         # Expect environment variables such as WP_CATEGORY_RUNWAY=7
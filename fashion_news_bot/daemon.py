@@ -0,0 +1,243 @@
+"""
+Resident mode of the fashion news bot.
+
+`main` is built for one-shot cron runs: every invocation pays for the
+Python startup, importing openai, google-genai, Pillow, feedparser and
+markdown, building the clients and loading the dedup store and the
+language profiles.  ``python -m fashion_news_bot.daemon`` keeps a single
+process alive instead, so clients, pooled HTTP connections, the image
+providers, the dedup store and the caches stay warm from one cycle to
+the next.
+
+An internal scheduler polls each source (NewsAPI and every RSS feed) on
+its own interval (`settings.daemon_newsapi_interval`,
+`settings.daemon_rss_interval`, overridden per source by
+`DAEMON_SOURCE_INTERVALS`), with random jitter so the feeds do not all
+fire at once.  A source that brings nothing new (no unpublished article
+it had not returned in its previous poll, or an error) backs off by
+`settings.daemon_backoff_factor` up to `settings.daemon_max_interval`;
+the first new article brings it back to its base interval.  The schedule
+is saved in `settings.daemon_state_path` so a restart does not poll
+every source at once.  The sources that are due are fetched and
+published through `main.run_once`.
+
+With ``DAEMON_TELEGRAM=true`` the Telegram control bot runs in a thread
+of the same process and ``/publicar`` polls every source right away,
+in-process, instead of spawning a new interpreter.
+"""
+
+import json
+import logging
+import os
+import random
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from functools import partial
+from typing import Dict, List, Optional, Set
+
+from .config import settings
+from .image_generator import get_providers
+from .journal import PipelineJournal
+from .language import get_detector
+from .main import run_once, setup_logging
+from .scraper import Fetcher, article_hash, fetch_each, load_source_cache, source_jobs
+from .storage import _atomic_write_json, get_published_store, save_feed_cache
+
+logger = logging.getLogger(__name__)
+
+
+class SourceSchedule:
+    """Polling interval and next poll time of one source."""
+
+    def __init__(self, name: str, base_interval: float) -> None:
+        self.name = name
+        self.base_interval = base_interval
+        self.interval = base_interval
+        self.next_poll = 0.0
+        self.idle_polls = 0
+
+    def record(self, new_articles: int, now: float) -> None:
+        """Schedule the next poll after one that brought `new_articles`."""
+        if new_articles:
+            self.interval = self.base_interval
+            self.idle_polls = 0
+        else:
+            self.idle_polls += 1
+            ceiling = max(settings.daemon_max_interval, self.base_interval)
+            self.interval = min(self.interval * settings.daemon_backoff_factor, ceiling)
+        jitter = settings.daemon_jitter
+        self.next_poll = now + self.interval * random.uniform(1 - jitter, 1 + jitter)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"interval": self.interval, "next_poll": self.next_poll, "idle_polls": self.idle_polls}
+
+
+def _base_interval(name: str) -> float:
+    if name in settings.daemon_source_intervals:
+        return settings.daemon_source_intervals[name]
+    return settings.daemon_newsapi_interval if name == "NewsAPI" else settings.daemon_rss_interval
+
+
+def warm_up() -> None:
+    """Load what the first article would otherwise pay for."""
+    get_detector().warm_up()
+    get_providers()
+    get_published_store()
+
+
+class Daemon:
+    """Scheduler that polls due sources and publishes their articles."""
+
+    def __init__(self) -> None:
+        # La caché de feeds vive en memoria; se guarda tras cada ciclo
+        self.feed_cache = load_source_cache()
+        self.fetchers: Dict[str, Fetcher] = dict(source_jobs(self.feed_cache))
+        if not settings.use_newsapi or not settings.newsapi_key:
+            self.fetchers.pop("NewsAPI", None)
+        self.schedules = {name: SourceSchedule(name, _base_interval(name)) for name in self.fetchers}
+        # Hashes devueltos por cada fuente en su última consulta: NewsAPI
+        # repite sus resultados en cada consulta, y eso no es novedad
+        self._last_hashes: Dict[str, Set[str]] = {}
+        # Un solo diario para todo el proceso; run_once lo compacta al final
+        self.journal = PipelineJournal(published=get_published_store())
+        self._load_state()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._requests: List[Future] = []
+        self._requests_lock = threading.Lock()
+
+    def _load_state(self) -> None:
+        path = settings.daemon_state_path
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except Exception as e:
+            logger.warning("No se pudo leer la planificación del daemon: %s", e)
+            return
+        for name, schedule in self.schedules.items():
+            state = saved.get(name)
+            if not state:
+                continue
+            # Si cambió el intervalo base, se respeta el nuevo como mínimo
+            schedule.interval = max(float(state.get("interval", 0)), schedule.base_interval)
+            schedule.next_poll = float(state.get("next_poll", 0))
+            schedule.idle_polls = int(state.get("idle_polls", 0))
+
+    def _save_state(self) -> None:
+        data = {name: schedule.to_dict() for name, schedule in self.schedules.items()}
+        try:
+            os.makedirs(os.path.dirname(settings.daemon_state_path), exist_ok=True)
+            _atomic_write_json(settings.daemon_state_path, data, indent=2)
+        except OSError as e:
+            logger.warning("No se pudo guardar la planificación del daemon: %s", e)
+
+    def due(self, now: float, everything: bool = False) -> List[SourceSchedule]:
+        """Sources to poll now, including those due within the coalesce window."""
+        if everything:
+            return list(self.schedules.values())
+        horizon = now + settings.daemon_coalesce_seconds
+        return [s for s in self.schedules.values() if s.next_poll <= horizon]
+
+    def seconds_until_next(self, now: float) -> float:
+        if not self.schedules:
+            return settings.daemon_max_interval
+        return max(0.0, min(s.next_poll for s in self.schedules.values()) - now)
+
+    def _fetch(self, due: List[SourceSchedule]) -> List[Dict]:
+        """Fetch `due` sources and reschedule each one by what it brought."""
+        results = fetch_each([(s.name, self.fetchers[s.name]) for s in due], self.feed_cache)
+        if self.feed_cache is not None:
+            save_feed_cache(self.feed_cache)
+        published = get_published_store()
+        now = time.time()
+        candidates: List[Dict] = []
+        for schedule, articles in zip(due, results):
+            new = 0
+            if articles is not None:
+                hashes = {h for h in map(article_hash, articles) if h not in published}
+                new = len(hashes - self._last_hashes.get(schedule.name, set()))
+                self._last_hashes[schedule.name] = hashes
+            schedule.record(new, now)
+            if not new:
+                logger.info(
+                    "Fuente sin novedades: %s (próxima consulta en %.0f min)",
+                    schedule.name, (schedule.next_poll - now) / 60,
+                )
+            candidates.extend(articles or [])
+        self._save_state()
+        return candidates
+
+    def run_cycle(self, everything: bool = False) -> int:
+        """Poll the due sources and publish; returns the articles published."""
+        due = self.due(time.time(), everything)
+        if not due and not self.journal.pending():
+            return 0
+        logger.info("Consultando %d fuentes: %s", len(due), ", ".join(s.name for s in due))
+        return run_once(partial(self._fetch, due), self.journal)
+
+    def request_run(self) -> int:
+        """Poll every source now and wait for the result (used by Telegram)."""
+        future: Future = Future()
+        with self._requests_lock:
+            self._requests.append(future)
+        self._wake.set()
+        return future.result()
+
+    def _take_requests(self) -> List[Future]:
+        with self._requests_lock:
+            requests, self._requests = self._requests, []
+        return requests
+
+    def run_forever(self) -> None:
+        logger.info("Daemon iniciado con %d fuentes", len(self.schedules))
+        warm_up()
+        while not self._stop.is_set():
+            self._wake.clear()
+            requests = self._take_requests()
+            try:
+                published = self.run_cycle(everything=bool(requests))
+            except Exception as e:
+                logger.exception("Error en el ciclo del daemon: %s", e)
+                for future in requests:
+                    future.set_exception(e)
+            else:
+                for future in requests:
+                    future.set_result(published)
+            delay = self.seconds_until_next(time.time())
+            if delay > 0:
+                self._wake.wait(delay)
+        logger.info("Daemon detenido")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+
+def _start_telegram(daemon: Daemon) -> Optional[threading.Thread]:
+    try:
+        from . import telegram_bot
+    except RuntimeError as e:
+        logger.error("No se inicia el bot de Telegram: %s", e)
+        return None
+    telegram_bot.run_handler = daemon.request_run
+    thread = threading.Thread(target=telegram_bot.main, name="telegram", daemon=True)
+    thread.start()
+    return thread
+
+
+def main() -> None:
+    setup_logging()
+    daemon = Daemon()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+    if settings.daemon_telegram:
+        _start_telegram(daemon)
+    daemon.run_forever()
+
+
+if __name__ == "__main__":
+    main()
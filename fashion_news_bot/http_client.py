@@ -0,0 +1,128 @@
+"""
+Shared HTTP client layer for the fashion news bot.
+
+All outgoing HTTP traffic (WordPress, NewsAPI, RSS feeds, Telegram) goes
+through one `requests.Session` with a per-host connection pool, so
+connections are kept alive and the TCP+TLS handshake is paid once per
+host instead of once per request.  Requests answered with 429 or 5xx, or
+that fail to connect, are retried with exponential backoff and full
+jitter; a `Retry-After` header from the server takes precedence.
+"""
+
+import email.utils
+import json
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Para métodos no idempotentes (POST) solo se reintenta cuando el servidor
+# indica explícitamente que no procesó la petición
+NON_IDEMPOTENT_RETRY_STATUSES = frozenset({429, 503})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.http_pool_connections,
+                pool_maxsize=settings.http_pool_size,
+                max_retries=0,
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = settings.http_user_agent
+            _session = session
+        return _session
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given attempt (0-based)."""
+    ceiling = min(settings.http_backoff_max, settings.http_backoff_base * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def retry_after(resp: requests.Response) -> Optional[float]:
+    """Delay asked for by a `Retry-After` header, capped at `http_backoff_max`."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        delay = when.timestamp() - time.time()
+    return max(0.0, min(delay, settings.http_backoff_max))
+
+
+def request(method: str, url: str, retries: Optional[int] = None, **kwargs) -> requests.Response:
+    """Send a request through the shared session with retries.
+
+    Accepts the same keyword arguments as `requests.request`.  Request
+    bodies must be bytes or strings (not open files) so they can be sent
+    again on a retry.  The last response is returned even if its status is
+    an error; connection errors are raised after the last attempt.
+    """
+    method = method.upper()
+    retries = settings.http_max_retries if retries is None else retries
+    idempotent = method in IDEMPOTENT_METHODS
+    retry_statuses = RETRY_STATUSES if idempotent else NON_IDEMPOTENT_RETRY_STATUSES
+    session = get_session()
+    body = kwargs.get("data")
+    sent = len(body) if isinstance(body, (bytes, bytearray, memoryview, str)) else 0
+    if kwargs.get("json") is not None:
+        sent = len(json.dumps(kwargs["json"]))
+    for attempt in range(retries + 1):
+        if attempt:
+            metrics.add(retries=1)
+        try:
+            resp = session.request(method, url, **kwargs)
+            metrics.add(bytes_out=sent, bytes_in=0 if kwargs.get("stream") else len(resp.content))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            # Un POST que pudo llegar al servidor no se repite
+            retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+            if attempt >= retries or not retryable:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning("%s %s falló (%s); reintento en %.1fs", method, url, e, delay)
+        else:
+            if resp.status_code not in retry_statuses or attempt >= retries:
+                return resp
+            delay = retry_after(resp)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            logger.warning(
+                "%s %s devolvió %s; reintento %d/%d en %.1fs",
+                method, url, resp.status_code, attempt + 1, retries, delay,
+            )
+            resp.close()
+        time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
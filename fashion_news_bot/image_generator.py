@@ -1,22 +1,36 @@
 """
 Image generator for the fashion news bot.
 
-This module uses Google Gemini / Imagen 3 to create a
-beautiful, magazine-style image for each article. If no API key is
-provided or the generation fails, it returns None. Images are saved
-into the configured images directory.
+Covers are produced by a chain of image providers tried in the order of
+`settings.image_providers`: Google Gemini / Imagen, the OpenAI images API
+and a local placeholder renderer built with Pillow, which works offline
+and never fails.  Each remote provider sits behind a
+`resilience.CircuitBreaker`, so a provider that keeps failing (an
+exhausted billing account, an outage) is skipped for a cooldown period
+instead of being called for every article.  With
+`settings.image_hedge_after` the next remote provider is started when the
+current one is slow, and the first image to arrive wins.
+
+Images are returned as in-memory `EncodedImage` buffers; they only reach
+the configured images directory when `settings.image_archive` is enabled.
 """
 
+import base64
 import os
 import logging
-from typing import Dict, Optional
+import textwrap
 from io import BytesIO
+from typing import Dict, List, Optional
 
 from google import genai
 from google.genai import types
-from PIL import Image
+from openai import OpenAI
+from PIL import Image, ImageDraw, ImageFont
 
+from . import metrics
 from .config import settings
+from .image_processing import FORMAT_INFO, EncodedImage, archive_image
+from .resilience import CircuitOpenError, get_breaker, hedged
 
 logger = logging.getLogger(__name__)
 
@@ -31,24 +45,31 @@ gemini_api_key = getattr(settings, "gemini_api_key", None) or os.environ.get(
 )
 
 if gemini_api_key:
-    client = genai.Client(api_key=gemini_api_key)
+    client = genai.Client(
+        api_key=gemini_api_key,
+        http_options=types.HttpOptions(base_url=settings.gemini_base_url) if settings.gemini_base_url else None,
+    )
 else:
     client = None
     logger.warning(
-        "GEMINI_API_KEY no configurada. image_generator.py trabajará en modo dummy."
+        "GEMINI_API_KEY no configurada. El proveedor de imágenes Gemini queda desactivado."
     )
 
 
 # ======================================
-# FUNCIÓN PRINCIPAL
+# PROMPT
 # ======================================
 
-def generate_fashion_image(article: Dict) -> Optional[str]:
-    os.makedirs(settings.images_output_dir, exist_ok=True)
+def image_subject(article: Dict) -> str:
+    """The article-specific part of the image prompt.
+
+    The rewritten headline when it is already known (streaming mode),
+    otherwise the original title.
+    """
+    return article.get("headline") or article.get("title") or "fashion"
 
-    if client is None:
-        return None
 
+def build_image_prompt(article: Dict) -> str:
     # Prompt según estilo
     prompt = (
         "High-end editorial fashion photo, luxury magazine style, dramatic lighting, "
@@ -57,42 +78,224 @@ def generate_fashion_image(article: Dict) -> Optional[str]:
         else "Urban streetwear fashion editorial photo, modern aesthetics, dynamic pose, "
              "natural city lighting. "
     )
-    prompt += (
-        "High quality, no recognizable faces. Inspired by: " +
-        (article.get('title') or "fashion")
-    )
+    return prompt + "High quality, no recognizable faces. Inspired by: " + image_subject(article)
 
-    try:
-        logger.info("Generando imagen con modelo imagegeneration@002…")
 
+# ======================================
+# PROVEEDORES
+# ======================================
+
+class ImageProvider:
+    """One way of producing a cover.  `generate` raises on failure."""
+
+    name = ""
+    # Los proveedores locales no pasan por el circuito ni se cubren
+    local = False
+
+    def available(self) -> bool:
+        return True
+
+    def generate(self, prompt: str, article: Dict) -> EncodedImage:
+        raise NotImplementedError
+
+
+class GeminiImageProvider(ImageProvider):
+    name = "gemini"
+
+    def available(self) -> bool:
+        return client is not None
+
+    def generate(self, prompt: str, article: Dict) -> EncodedImage:
+        logger.info("Generando imagen con modelo %s…", settings.gemini_image_model)
+        if settings.gemini_image_model.startswith("gemini"):
+            return self._generate_content(prompt)
+        # Modelos Imagen: generate_images solo funciona con un cliente de Vertex AI
         response = client.models.generate_images(
-            model="imagegeneration@002",
+            model=settings.gemini_image_model,
             prompt=prompt,
             config=types.GenerateImagesConfig(
                 number_of_images=1,
                 output_mime_type="image/jpeg",
             ),
         )
-
+        if not response.generated_images:
+            raise RuntimeError("Gemini no devolvió ninguna imagen")
         generated = response.generated_images[0]
+        img_bytes = getattr(generated.image, "image_bytes", None)
+        if not img_bytes:
+            raise RuntimeError("No se encontraron image_bytes en la respuesta")
+        # Los bytes ya vienen codificados: no se decodifican ni se escriben
+        return EncodedImage(
+            img_bytes, getattr(generated.image, "mime_type", None) or "image/jpeg"
+        )
 
-        # Obtener bytes
-        if hasattr(generated.image, "image_bytes"):
-            img_bytes = generated.image.image_bytes
-        else:
-            logger.error("No se encontraron image_bytes en la respuesta")
-            return None
+    @staticmethod
+    def _generate_content(prompt: str) -> EncodedImage:
+        """Image from a Gemini image model (supported with an API key)."""
+        response = client.models.generate_content(
+            model=settings.gemini_image_model,
+            contents=prompt,
+            config=types.GenerateContentConfig(response_modalities=["IMAGE"]),
+        )
+        for candidate in response.candidates or []:
+            for part in (candidate.content.parts if candidate.content else None) or []:
+                if part.inline_data is not None and part.inline_data.data:
+                    return EncodedImage(part.inline_data.data, part.inline_data.mime_type or "image/png")
+        raise RuntimeError("Gemini no devolvió ninguna imagen")
+
+
+class OpenAIImageProvider(ImageProvider):
+    name = "openai"
+
+    def __init__(self) -> None:
+        self.client = (
+            OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url or None)
+            if settings.openai_api_key
+            else None
+        )
+
+    def available(self) -> bool:
+        return self.client is not None
+
+    def generate(self, prompt: str, article: Dict) -> EncodedImage:
+        logger.info("Generando imagen con modelo %s…", settings.openai_image_model)
+        # Se pide directamente el formato de subida para evitar recodificar
+        fmt = settings.image_upload_format if settings.image_upload_format in ("jpeg", "webp") else "jpeg"
+        response = self.client.images.generate(
+            model=settings.openai_image_model,
+            prompt=prompt,
+            size="1536x1024",
+            n=1,
+            output_format=fmt,
+        )
+        b64 = response.data[0].b64_json if response.data else None
+        if not b64:
+            raise RuntimeError("OpenAI no devolvió ninguna imagen")
+        return EncodedImage(base64.b64decode(b64), FORMAT_INFO[fmt][1])
+
+
+class PlaceholderImageProvider(ImageProvider):
+    """Typographic cover rendered locally: style gradient plus the title."""
+
+    name = "placeholder"
+    local = True
+    # (color superior, color inferior, color del texto) por estilo
+    PALETTES = {
+        "luxury": ((24, 20, 18), (92, 74, 52), (236, 220, 190)),
+        "streetwear": ((18, 18, 28), (170, 40, 60), (245, 245, 245)),
+    }
+
+    def generate(self, prompt: str, article: Dict) -> EncodedImage:
+        width = max(settings.image_widths) if settings.image_widths else 1600
+        height = width * 9 // 16
+        top, bottom, ink = self.PALETTES.get(settings.writer_style, self.PALETTES["luxury"])
+        img = Image.new("RGB", (width, height))
+        draw = ImageDraw.Draw(img)
+        for y in range(height):
+            t = y / max(1, height - 1)
+            color = tuple(round(a + (b - a) * t) for a, b in zip(top, bottom))
+            draw.line([(0, y), (width, y)], fill=color)
+        font_size = max(16, width // 24)
+        try:
+            font = ImageFont.load_default(size=font_size)
+        except TypeError:
+            # Pillow < 10.1: fuente bitmap de tamaño fijo
+            font = ImageFont.load_default()
+        lines = textwrap.wrap(image_subject(article), width=28)[:4]
+        line_height = round(font_size * 1.3)
+        y = (height - line_height * len(lines)) // 2
+        for line in lines:
+            text_width = draw.textlength(line, font=font)
+            draw.text(((width - text_width) / 2, y), line, font=font, fill=ink)
+            y += line_height
+        fmt = settings.image_upload_format if settings.image_upload_format in FORMAT_INFO else "jpeg"
+        buf = BytesIO()
+        img.save(buf, FORMAT_INFO[fmt][2], quality=settings.image_webp_quality)
+        # Lleva el título impreso: no sirve como portada de otro artículo
+        return EncodedImage(buf.getvalue(), FORMAT_INFO[fmt][1], width, height, reusable=False)
+
+
+PROVIDER_CLASSES = {
+    cls.name: cls
+    for cls in (GeminiImageProvider, OpenAIImageProvider, PlaceholderImageProvider)
+}
+
+_providers: Optional[List[ImageProvider]] = None
 
-        img = Image.open(BytesIO(img_bytes))
 
-        file_name = f"img_{article.get('hash','img')}.jpg"
-        file_path = os.path.join(settings.images_output_dir, file_name)
-        img.save(file_path, "JPEG")
+def get_providers() -> List[ImageProvider]:
+    """Configured and usable providers, in fallback order."""
+    global _providers
+    if _providers is None:
+        providers = []
+        for name in settings.image_providers:
+            cls = PROVIDER_CLASSES.get(name)
+            if cls is None:
+                logger.warning("Proveedor de imágenes desconocido: %s", name)
+                continue
+            provider = cls()
+            if provider.available():
+                providers.append(provider)
+        _providers = providers
+    return _providers
 
-        logger.info("Imagen guardada en %s", file_path)
-        return file_path
 
+def _run_provider(provider: ImageProvider, prompt: str, article: Dict) -> Optional[EncodedImage]:
+    """Call one provider, through its circuit breaker if it is remote."""
+    try:
+        if provider.local:
+            image = provider.generate(prompt, article)
+        else:
+            breaker = get_breaker(
+                f"image:{provider.name}",
+                settings.image_breaker_failures,
+                settings.image_breaker_cooldown,
+            )
+            image = breaker.call(provider.generate, prompt, article)
+        image.provider = provider.name
+        return image
+    except CircuitOpenError:
+        logger.info("Proveedor de imágenes %s en enfriamiento: se omite", provider.name)
     except Exception as e:
-        logger.error("Error generando imagen: %s", e)
-        return None
+        logger.error("Error generando imagen con %s: %s", provider.name, e)
+    return None
+
+
+# ======================================
+# FUNCIÓN PRINCIPAL
+# ======================================
+
+def generate_fashion_image(article: Dict) -> Optional[EncodedImage]:
+    """Produce a cover for `article` with the first provider that succeeds.
 
+    Returns None only if no provider is configured or all of them fail.
+    """
+    providers = get_providers()
+    if not providers:
+        return None
+    prompt = build_image_prompt(article)
+    remote = [p for p in providers if not p.local]
+    image: Optional[EncodedImage] = None
+    if settings.image_hedge_after > 0 and len(remote) > 1:
+        image = hedged(
+            [lambda p=p: _run_provider(p, prompt, article) for p in remote],
+            settings.image_hedge_after,
+        )
+        rest = [p for p in providers if p.local]
+    else:
+        rest = providers
+    for provider in rest:
+        if image is not None:
+            break
+        image = _run_provider(provider, prompt, article)
+        if image is not None and provider is not providers[0]:
+            logger.warning("Imagen generada con el proveedor de respaldo %s", provider.name)
+    if image is None:
+        return None
+    # Solo los proveedores remotos cuestan dinero por imagen
+    metrics.label(provider=image.provider)
+    metrics.add(images=0 if PROVIDER_CLASSES[image.provider].local else 1, bytes_in=len(image.data))
+    if settings.image_archive:
+        archive_image(image, f"img_{article.get('hash', 'img')}")
+        logger.info("Imagen archivada en %s", image.path)
+    return image
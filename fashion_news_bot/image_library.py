@@ -0,0 +1,222 @@
+"""
+Library of already generated covers, reused across similar articles.
+
+Every generated image is a paid API call, yet stories on the same topic
+("Chanel Fall 2025 runway show", "Chanel's Fall 2025 show: runway highlights")
+would get an interchangeable cover.  The library remembers, for each
+cover it has uploaded, the normalized subject of its article (the source
+title, see `library_subject`), a 64-bit perceptual hash (dHash) of the
+image and the WordPress media ID.
+
+* Before generating, `ImageLibrary.find_similar` compares the subject of
+  the new article against the library (Jaccard similarity of the
+  normalized word sets, for the same writer style).  Above
+  `settings.image_reuse_threshold` the stored media ID is reused and no
+  image is generated.
+* Before uploading, `ImageLibrary.find_by_phash` looks for a cover that
+  is visually the same as the new one and reuses its media ID instead of
+  uploading a duplicate to the media library.
+
+Entries are evicted least recently used first once the library holds
+`settings.image_reuse_max_entries` covers.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, FrozenSet, Optional
+
+from PIL import Image
+
+from .config import settings
+from .near_duplicates import hamming
+from .storage import _atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# Palabras vacías (es/en) que no describen el tema de la portada
+_STOPWORDS = frozenset(
+    """
+    a al and are as at by con de del el en es for from in is its la las los
+    new nueva nuevo of on or para por que se su sus the to un una with y
+    """.split()
+)
+
+
+def normalize_prompt(text: str) -> FrozenSet[str]:
+    """Word set used to compare prompts: no accents, stopwords or plurals."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    words = set()
+    for word in _WORD_RE.findall(text):
+        if word in _STOPWORDS or len(word) < 2:
+            continue
+        # Plural simple: "shows" y "show" cuentan como la misma palabra
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+
+def library_subject(article: Dict) -> str:
+    """Subject under which an article's cover is stored and looked up.
+
+    Always the source title: the rewritten headline only exists in
+    streaming mode and is in another language, so mixing both would
+    keep similar stories from matching.
+    """
+    return article.get("title") or ""
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def dhash(data: bytes) -> int:
+    """64-bit difference hash of an encoded image."""
+    with Image.open(BytesIO(data)) as img:
+        # Con JPEG, draft() decodifica directamente a una escala reducida
+        img.draft("L", (64, 64))
+        small = img.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = value << 1 | (left > right)
+    return value
+
+
+class ImageLibrary:
+    """LRU index of generated covers, persisted as JSON."""
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None) -> None:
+        self.path = path
+        self.max_entries = max(1, max_entries or settings.image_reuse_max_entries)
+        # clave -> entrada, de la menos a la más recientemente usada
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def find_similar(self, subject: str, style: str, threshold: Optional[float] = None) -> Optional[Dict]:
+        """Return the most similar cover for a prompt subject, if close enough."""
+        threshold = settings.image_reuse_threshold if threshold is None else threshold
+        words = normalize_prompt(subject)
+        best_key, best_score = None, 0.0
+        with self._lock:
+            for key, entry in self.entries.items():
+                if entry["style"] != style:
+                    continue
+                score = jaccard(words, entry["words"])
+                if score > best_score:
+                    best_key, best_score = key, score
+            if best_key is None or best_score < threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(best_key)
+            entry = dict(self.entries[best_key])
+        logger.info("Portada reutilizada (similitud %.2f): %s", best_score, entry["subject"])
+        self.save()
+        return entry
+
+    def find_by_phash(self, phash: int, max_distance: Optional[int] = None) -> Optional[Dict]:
+        """Return an uploaded cover that looks the same as `phash`, if any."""
+        max_distance = settings.image_reuse_phash_distance if max_distance is None else max_distance
+        with self._lock:
+            for key, entry in self.entries.items():
+                if hamming(phash, entry["phash"]) <= max_distance:
+                    self.entries.move_to_end(key)
+                    return dict(entry)
+        return None
+
+    def add(self, key: str, subject: str, style: str, phash: int, media_id: int) -> None:
+        """Remember an uploaded cover."""
+        with self._lock:
+            self.entries[key] = {
+                "subject": subject,
+                "words": normalize_prompt(subject),
+                "style": style,
+                "phash": phash,
+                "media_id": media_id,
+                "ts": time.time(),
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self.save()
+
+    def take_counters(self) -> Dict[str, int]:
+        """Return and reset the hit/miss counters."""
+        with self._lock:
+            counters = {"hit": self.hits, "miss": self.misses}
+            self.hits = self.misses = 0
+        return counters
+
+    @classmethod
+    def load(cls, path: str, max_entries: Optional[int] = None) -> "ImageLibrary":
+        library = cls(path, max_entries)
+        if not os.path.exists(path):
+            return library
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning("No se pudo leer la biblioteca de imágenes: %s", e)
+            return library
+        # Guardadas en orden LRU: la última es la más reciente
+        for item in data.get("entries", [])[-library.max_entries:]:
+            if not item.get("media_id"):
+                continue
+            library.entries[item["key"]] = {
+                "subject": item["subject"],
+                "words": normalize_prompt(item["subject"]),
+                "style": item.get("style", ""),
+                "phash": int(item["phash"], 16),
+                "media_id": item["media_id"],
+                "ts": item.get("ts", 0),
+            }
+        return library
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                "entries": [
+                    {
+                        "key": k,
+                        "subject": e["subject"],
+                        "style": e["style"],
+                        "phash": f"{e['phash']:016x}",
+                        "media_id": e["media_id"],
+                        "ts": e["ts"],
+                    }
+                    for k, e in self.entries.items()
+                ]
+            }
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            _atomic_write_json(self.path, data)
+
+
+_library: Optional[ImageLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_library() -> ImageLibrary:
+    """Return the process-wide image library."""
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = ImageLibrary.load(settings.image_library_path)
+        return _library
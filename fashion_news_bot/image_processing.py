@@ -0,0 +1,256 @@
+"""
+Post-processing of generated images before they are uploaded.
+
+Generated covers come out of the model at full size.  This stage works
+entirely in memory: it downscales the image to the configured widths,
+strips all metadata and encodes optimized progressive JPEG and WebP
+(plus AVIF when Pillow was built with it).  When the generator output is
+already in the upload format, small enough and free of metadata it is
+passed through untouched, without a decode/encode round-trip.  Encoding
+is CPU bound, so it runs in a process pool and never holds the GIL of the
+pipeline threads.
+
+Writing the variants to `settings.images_output_dir` is an optional
+archival side-channel (`settings.image_archive`); nothing in the upload
+path reads them back from disk.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional
+
+from PIL import Image, features
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+FORMAT_INFO = {
+    # formato: (extensión, MIME, nombre en Pillow)
+    "jpeg": ("jpg", "image/jpeg", "JPEG"),
+    "webp": ("webp", "image/webp", "WEBP"),
+    "avif": ("avif", "image/avif", "AVIF"),
+}
+_FORMAT_BY_MIME = {mime: fmt for fmt, (_, mime, _) in FORMAT_INFO.items()}
+
+
+@dataclass
+class EncodedImage:
+    """An encoded image held in memory, optionally archived at `path`."""
+
+    data: bytes
+    mime: str
+    width: int = 0
+    height: int = 0
+    path: Optional[str] = None
+    # False for covers that only fit their own article (e.g. placeholders)
+    reusable: bool = True
+    # Name of the image provider that produced it
+    provider: str = ""
+
+    @property
+    def format(self) -> str:
+        return _FORMAT_BY_MIME.get(self.mime, "")
+
+    def filename(self, base_name: str) -> str:
+        ext = FORMAT_INFO[self.format][0] if self.format else "bin"
+        return f"{base_name}.{ext}"
+
+
+def available_formats() -> List[str]:
+    """Configured output formats that this Pillow build can encode."""
+    formats = []
+    for fmt in settings.image_formats:
+        if fmt not in FORMAT_INFO:
+            logger.warning("Formato de imagen desconocido: %s", fmt)
+        elif fmt == "webp" and not features.check("webp"):
+            logger.warning("Pillow sin soporte WebP: se omite")
+        elif fmt == "avif" and not features.check("avif"):
+            logger.warning("Pillow sin soporte AVIF: se omite")
+        else:
+            formats.append(fmt)
+    return formats or ["jpeg"]
+
+
+def _save_options(fmt: str) -> dict:
+    if fmt == "jpeg":
+        return {"quality": settings.image_jpeg_quality, "optimize": True, "progressive": True}
+    if fmt == "webp":
+        return {"quality": settings.image_webp_quality, "method": 6}
+    return {"quality": settings.image_webp_quality}
+
+
+def encode_variants(
+    data: bytes,
+    widths: List[int],
+    formats: List[str],
+    out_dir: Optional[str] = None,
+    base_name: str = "img",
+) -> List[EncodedImage]:
+    """Resize and encode `data`; runs inside a worker process.
+
+    Variants are returned largest first.  With `out_dir` each variant is
+    also written to disk as `<base_name>-<width>.<ext>`.
+    """
+    variants: List[EncodedImage] = []
+    with Image.open(BytesIO(data)) as src:
+        src.load()
+        img = src.convert("RGB")
+    # Sin EXIF, ICC ni XMP: no se copian los metadatos del original
+    img.info = {}
+    done_widths = set()
+    for width in sorted(set(widths), reverse=True):
+        # Nunca se amplía: anchos mayores que el original usan el original
+        target_w = min(width, img.width)
+        if target_w in done_widths:
+            continue
+        done_widths.add(target_w)
+        if target_w < img.width:
+            target_h = max(1, round(img.height * target_w / img.width))
+            resized = img.resize((target_w, target_h), Image.LANCZOS)
+        else:
+            resized = img
+        for fmt in formats:
+            ext, mime, pil_format = FORMAT_INFO[fmt]
+            buf = BytesIO()
+            resized.save(buf, pil_format, **_save_options(fmt))
+            variant = EncodedImage(buf.getvalue(), mime, target_w, resized.height)
+            if out_dir:
+                variant.path = os.path.join(out_dir, f"{base_name}-{target_w}.{ext}")
+                with open(variant.path, "wb") as f:
+                    f.write(variant.data)
+            variants.append(variant)
+    return variants
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # El pool se crea desde un hilo de imagen con los hilos HTTP y de
+            # logging en marcha: con fork el hijo heredaría sus locks tomados
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.image_process_workers), mp_context=context
+            )
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next `_get_pool` starts a new one."""
+    global _pool
+    with _pool_lock:
+        # Otro hilo pudo haberlo reemplazado ya
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(*args) -> List[EncodedImage]:
+    pool = _get_pool()
+    try:
+        return pool.submit(encode_variants, *args).result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+
+def _encode(*args) -> List[EncodedImage]:
+    """Run `encode_variants` in the pool, with a new pool if it broke.
+
+    A worker that dies (e.g. out of memory on a large image) breaks the
+    whole pool; it is replaced and the image retried once.
+    """
+    try:
+        return _submit(*args)
+    except BrokenProcessPool:
+        logger.warning("Pool de procesado de imágenes roto: se reinicia")
+    return _submit(*args)
+
+
+def can_pass_through(image: EncodedImage) -> bool:
+    """True if `image` can be uploaded as-is, without re-encoding."""
+    if image.format != settings.image_upload_format:
+        return False
+    try:
+        # Solo lee la cabecera: no decodifica los píxeles
+        with Image.open(BytesIO(image.data)) as img:
+            too_wide = img.width > max(settings.image_widths or [img.width])
+            has_metadata = any(k in img.info for k in ("exif", "icc_profile", "xmp"))
+            image.width, image.height = img.width, img.height
+    except Exception:
+        return False
+    return not too_wide and not has_metadata
+
+
+def archive_image(image: EncodedImage, base_name: str) -> EncodedImage:
+    """Write `image` to the images directory and record its path."""
+    os.makedirs(settings.images_output_dir, exist_ok=True)
+    image.path = os.path.join(settings.images_output_dir, image.filename(base_name))
+    with open(image.path, "wb") as f:
+        f.write(image.data)
+    return image
+
+
+def prepare_for_upload(image: EncodedImage, base_name: str) -> EncodedImage:
+    """Return the buffer to upload for a freshly generated image.
+
+    Without archival only the upload variant is encoded (or none at all if
+    the image can pass through); with `settings.image_archive` every
+    configured width and format is encoded and written to disk.
+    """
+    if can_pass_through(image) and not settings.image_archive:
+        logger.info("Imagen ya en %s y tamaño final: se sube sin recodificar", image.mime)
+        return image
+    if settings.image_archive:
+        widths, formats = settings.image_widths, available_formats()
+        out_dir = settings.images_output_dir
+        os.makedirs(out_dir, exist_ok=True)
+    else:
+        widths = [max(settings.image_widths)] if settings.image_widths else [10 ** 6]
+        formats = [settings.image_upload_format] if settings.image_upload_format in available_formats() else ["jpeg"]
+        out_dir = None
+    variants = _encode(image.data, widths, formats, out_dir, base_name)
+    logger.info("Imagen procesada en %d variantes", len(variants))
+    # Las variantes son la misma portada: heredan su origen y si se puede
+    # reutilizar (un placeholder no debe entrar en la biblioteca)
+    for variant in variants:
+        variant.reusable, variant.provider = image.reusable, image.provider
+    return primary_variant(variants) or image
+
+
+def primary_variant(variants: List[EncodedImage]) -> Optional[EncodedImage]:
+    """The variant to upload: largest width in `settings.image_upload_format`."""
+    if not variants:
+        return None
+    preferred = [v for v in variants if v.format == settings.image_upload_format]
+    return max(preferred or variants, key=lambda v: v.width)
+
+
+def load_archived(path: str, reusable: bool = False, provider: str = "") -> Optional[EncodedImage]:
+    """Read back an archived image (used when resuming an article).
+
+    `reusable` and `provider` are not stored in the file; the caller
+    passes the values recorded when the image was produced.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    ext = os.path.splitext(path)[1].lstrip(".").lower()
+    fmt = next((f for f, (e, _, _) in FORMAT_INFO.items() if e == ext), "jpeg")
+    with open(path, "rb") as f:
+        return EncodedImage(
+            f.read(), FORMAT_INFO[fmt][1], path=path, reusable=reusable, provider=provider
+        )
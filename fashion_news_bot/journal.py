@@ -0,0 +1,142 @@
+"""
+Durable per-article pipeline journal.
+
+Every completed step of an article (fetched, classified, written,
+image_done, media_uploaded, posted) is appended as one JSON line to
+`settings.journal_path` and fsynced, together with its result (the
+article itself, the category, the generated text, the archived image
+with its provider and reuse flag, the media ID or the post ID).  When a run dies midway the next one replays
+the journal and resumes every unfinished article from its last completed
+step, reusing the stored results instead of paying for the same API
+calls again.
+
+The file is compacted on load and by `compact`: finished articles,
+articles that failed too many times and stale entries are dropped.  The
+hashes of finished articles are added to the published store given to
+the journal before they are dropped, so a run that died after posting
+but before updating the store does not publish the article again.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+from .storage import PublishedStore
+
+logger = logging.getLogger(__name__)
+
+FETCHED = "fetched"
+CLASSIFIED = "classified"
+WRITTEN = "written"
+IMAGE_DONE = "image_done"
+MEDIA_UPLOADED = "media_uploaded"
+POSTED = "posted"
+FAILED = "failed"
+
+STEPS = (FETCHED, CLASSIFIED, WRITTEN, IMAGE_DONE, MEDIA_UPLOADED, POSTED)
+
+
+class PipelineJournal:
+    """Append-only JSONL journal of article state transitions."""
+
+    def __init__(self, path: Optional[str] = None, published: Optional[PublishedStore] = None) -> None:
+        self.path = path or settings.journal_path
+        self.published = published
+        self._lock = threading.Lock()
+        # hash -> {"steps": {step: data}, "failures": int, "ts": float}
+        self._articles: Dict[str, Dict[str, Any]] = {}
+        self._replay()
+        self.compact()
+
+    def _replay(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Última línea a medio escribir tras un corte
+                    continue
+                self._apply(record)
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        entry = self._articles.setdefault(
+            record["hash"], {"steps": {}, "failures": 0, "ts": record.get("ts", 0)}
+        )
+        entry["ts"] = record.get("ts", entry["ts"])
+        if record["step"] == FAILED:
+            entry["failures"] += 1
+        else:
+            entry["steps"][record["step"]] = record.get("data")
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record(self, article_hash: str, step: str, data: Any = None) -> None:
+        """Persist that `step` completed for an article, with its result."""
+        record = {"hash": article_hash, "step": step, "data": data, "ts": time.time()}
+        with self._lock:
+            self._append([record])
+            self._apply(record)
+
+    def steps(self, article_hash: str) -> Dict[str, Any]:
+        """Return the completed steps of an article and their results."""
+        with self._lock:
+            entry = self._articles.get(article_hash)
+            return dict(entry["steps"]) if entry else {}
+
+    def pending(self) -> List[Dict]:
+        """Return the articles that were fetched but never posted."""
+        with self._lock:
+            return [
+                entry["steps"][FETCHED]
+                for entry in self._articles.values()
+                if FETCHED in entry["steps"] and POSTED not in entry["steps"]
+            ]
+
+    def compact(self) -> None:
+        """Rewrite the journal keeping only resumable articles."""
+        cutoff = time.time() - settings.journal_max_age_hours * 3600
+        with self._lock:
+            if self.published is not None:
+                for article_hash, entry in self._articles.items():
+                    if POSTED in entry["steps"] and article_hash not in self.published:
+                        logger.info("Artículo publicado fuera de la base, se registra: %s", article_hash)
+                        self.published.add(article_hash)
+            keep = {
+                h: e for h, e in self._articles.items()
+                if POSTED not in e["steps"]
+                and e["failures"] < settings.journal_max_failures
+                and e["ts"] >= cutoff
+            }
+            dropped = len(self._articles) - len(keep)
+            self._articles = keep
+            if not dropped and os.path.exists(self.path):
+                return
+            tmp_path = f"{self.path}.tmp.{os.getpid()}"
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for article_hash, entry in keep.items():
+                    for step in STEPS:
+                        if step in entry["steps"]:
+                            record = {"hash": article_hash, "step": step,
+                                      "data": entry["steps"][step], "ts": entry["ts"]}
+                            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    for _ in range(entry["failures"]):
+                        record = {"hash": article_hash, "step": FAILED, "data": None, "ts": entry["ts"]}
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        if dropped:
+            logger.info("Diario compactado: %d artículos terminados o descartados", dropped)
@@ -0,0 +1,167 @@
+"""
+Language detection of source articles.
+
+The rewrite prompt asks for a translation when the source is not in
+Spanish, so every article needs its language.  Running `langdetect.detect`
+on the whole text was the slowest step of building a prompt: the cost
+grows with the length of the text, the result is random unless the
+detector is seeded, and the language profiles are loaded lazily by the
+first call.  `LanguageDetector`:
+
+* seeds langdetect (`settings.language_seed`), so the same text always
+  gets the same language, and loads the profiles once, under a lock, in
+  `warm_up`;
+* classifies a bounded plain-text sample (`settings.language_sample_chars`
+  characters of title, description and content, without HTML);
+* learns the language of each source from its history, persisted in
+  `settings.language_stats_path`.  Once a source has
+  `settings.language_source_min_samples` detections and one language
+  reaches `settings.language_source_min_share` of them ("Sneaker News is
+  always en"), its articles skip detection;
+* memoizes results by article hash, so a resumed or re-built article is
+  not detected twice.
+
+    python -m fashion_news_bot.benchmarks.language_benchmark
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from langdetect import DetectorFactory, LangDetectException, detect
+from langdetect.detector_factory import init_factory
+
+from .config import settings
+from .prompt_builder import strip_html
+from .storage import _atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = "unknown"
+
+
+def sample_text(article: Dict, max_chars: Optional[int] = None) -> str:
+    """Plain-text prefix of the article used for detection."""
+    max_chars = settings.language_sample_chars if max_chars is None else max_chars
+    parts = []
+    seen = ""
+    for field in ("title", "description", "content"):
+        text = strip_html(article.get(field))
+        # En RSS la descripción y el contenido son el mismo resumen
+        if text and text not in seen:
+            parts.append(text)
+            seen += text
+        if len(seen) >= max_chars:
+            break
+    text = "\n".join(parts)
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+class LanguageDetector:
+    """Seeded langdetect with per-source shortcuts and a per-article memo."""
+
+    MEMO_SIZE = 5000
+
+    def __init__(self, stats_path: Optional[str] = None) -> None:
+        self.stats_path = stats_path
+        # fuente -> {idioma: detecciones}
+        self.sources: Dict[str, Dict[str, int]] = {}
+        self._memo: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._warm = False
+        self._dirty = False
+
+    def warm_up(self) -> None:
+        """Load the langdetect profiles now instead of on the first article."""
+        with self._lock:
+            if self._warm:
+                return
+            DetectorFactory.seed = settings.language_seed
+            init_factory()
+            self._warm = True
+
+    def detect_text(self, text: str) -> str:
+        """Language of `text` as an ISO 639-1 code, or 'unknown'."""
+        self.warm_up()
+        try:
+            return detect(text)
+        except LangDetectException:
+            return UNKNOWN
+
+    def source_language(self, source: Optional[str]) -> Optional[str]:
+        """The language a source always publishes in, once learned."""
+        counts = self.sources.get(source or "")
+        if not counts:
+            return None
+        total = sum(counts.values())
+        lang, hits = max(counts.items(), key=lambda kv: kv[1])
+        if total >= settings.language_source_min_samples and hits / total >= settings.language_source_min_share:
+            return lang
+        return None
+
+    def detect_article(self, article: Dict) -> str:
+        """Language of an article, using the memo and the source history first."""
+        key = article.get("hash")
+        with self._lock:
+            if key and key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+            known = self.source_language(article.get("source"))
+        if known is not None:
+            lang = known
+        else:
+            lang = self.detect_text(sample_text(article))
+            if lang != UNKNOWN and article.get("source"):
+                with self._lock:
+                    counts = self.sources.setdefault(article["source"], {})
+                    counts[lang] = counts.get(lang, 0) + 1
+                    self._dirty = True
+        if key:
+            with self._lock:
+                self._memo[key] = lang
+                while len(self._memo) > self.MEMO_SIZE:
+                    self._memo.popitem(last=False)
+        return lang
+
+    @classmethod
+    def load(cls, path: str) -> "LanguageDetector":
+        detector = cls(path)
+        if not os.path.exists(path):
+            return detector
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                detector.sources = json.load(f).get("sources", {})
+        except Exception as e:
+            logger.warning("No se pudo leer el historial de idiomas: %s", e)
+        return detector
+
+    def save(self) -> None:
+        """Persist the per-source history if it changed."""
+        if not self.stats_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"sources": self.sources}
+            self._dirty = False
+            os.makedirs(os.path.dirname(self.stats_path), exist_ok=True)
+            _atomic_write_json(self.stats_path, data, indent=2)
+
+
+_detector: Optional[LanguageDetector] = None
+_detector_lock = threading.Lock()
+
+
+def get_detector() -> LanguageDetector:
+    """Return the process-wide language detector."""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = LanguageDetector.load(settings.language_stats_path)
+        return _detector
@@ -4,23 +4,34 @@ Entry point for the fashion news bot.
 This script orchestrates the entire workflow: it fetches fresh
 articles, classifies them, rewrites them using OpenAI, generates
 images, publishes the results to WordPress and updates the stored
-state.  It should be run periodically (e.g. via cron) to keep
-publishing new fashion content.
+state.  Articles are processed concurrently by
+`pipeline.ArticlePipeline` and every step is checkpointed in
+`journal.PipelineJournal`, so a run that dies midway is resumed by the
+next one.  It should be run periodically (e.g. via cron) to keep
+publishing new fashion content, or kept resident with `daemon`, which
+calls `run_once` from its own scheduler.
 """
 
 import logging
 import os
+import threading
 from logging.handlers import RotatingFileHandler
-from typing import Optional, List
+from typing import Callable, Dict, List, Optional
 
 from .config import settings
 from .scraper import get_fresh_fashion_articles
-from .writer import generate_article_text
-from .image_generator import generate_fashion_image
 from .publisher import WordPressPublisher
-from .classifier import classify_article
-from .storage import load_published_hashes, save_published_hashes
-from .stats import update_stats
+from .journal import PipelineJournal
+from .pipeline import ArticlePipeline
+from .stats import flush_stats, update_counters
+from .storage import PublishedStore, get_published_store
+from .image_library import get_library
+from .language import get_detector
+from .metrics import get_recorder
+from .writer import text_budget, text_cache, usage_log
+
+# Una sola ejecución a la vez por proceso (daemon y /publicar de Telegram)
+run_lock = threading.Lock()
 
 
 def setup_logging() -> None:
@@ -43,50 +54,82 @@ def setup_logging() -> None:
     logger.addHandler(fh)
 
 
-def run_once() -> None:
-    """Run a single iteration of the publishing pipeline."""
+def run_once(
+    fetch: Optional[Callable[[], List[Dict]]] = None, journal: Optional[PipelineJournal] = None
+) -> int:
+    """Run a single iteration of the publishing pipeline.
+
+    `fetch` returns the candidate articles (see
+    `get_fresh_fashion_articles`); by default every source is fetched.
+    A long-lived caller (the daemon) passes its own `journal`, which is
+    compacted at the end of the run.  Returns the number of articles
+    published.
+    """
+    with run_lock:
+        return _run_once(fetch, journal)
+
+
+def _run_once(fetch: Optional[Callable[[], List[Dict]]], journal: Optional[PipelineJournal]) -> int:
     logger = logging.getLogger(__name__)
     logger.info("===== INICIO EJECUCIÓN BOT MODA =====")
-    articles = get_fresh_fashion_articles()
-    if not articles:
-        logger.info("No hay artículos nuevos.")
-        return
-    published_hashes = load_published_hashes()
-    wp = WordPressPublisher()
-    for art in articles:
-        try:
-            logger.info("Procesando artículo: %s", art.get("title"))
-            # Classify article
-            category_label = classify_article(art)
-            logger.info("Clasificación: %s", category_label)
-            # Generate text
-            article_text = generate_article_text(art)
-            # Generate image
-            image_path = generate_fashion_image(art)
-            # Upload image
-            media_id: Optional[int] = None
-            if image_path:
-                media_id = wp.upload_media(image_path)
-            # Determine category IDs to assign
-            category_ids: Optional[List[int]] = None
-            if settings.category_ids and category_label in settings.category_ids:
-                category_ids = [settings.category_ids[category_label]]
-            # Create post
-            post_id = wp.create_post(
-                title=article_text["magazine_title"],
-                content_html=article_text["body_html"],
-                excerpt=article_text["meta_description"],
-                categories=category_ids,
-                featured_media=media_id,
-            )
-            logger.info("Publicado post ID %s para hash %s", post_id, art["hash"])
-            published_hashes.add(art["hash"])
-            # Update stats
-            update_stats(art.get("source"), category_label)
-        except Exception as e:
-            logger.exception("Error procesando artículo '%s': %s", art.get("title"), e)
-    # Save state
-    save_published_hashes(published_hashes)
+    published = get_published_store()
+    if journal is None:
+        journal = PipelineJournal(published=published)
+    text_budget.start_run()
+    get_recorder().start_run()
+    try:
+        # Primero los artículos que quedaron a medias en una ejecución anterior
+        resumed = [art for art in journal.pending() if art["hash"] not in published]
+        if resumed:
+            logger.info("Reanudando %d artículos pendientes del diario", len(resumed))
+        fresh = get_fresh_fashion_articles(
+            limit=max(0, settings.max_articles_per_run - len(resumed)),
+            fetch=fetch,
+            exclude={art["hash"] for art in resumed},
+        )
+        articles = resumed + fresh
+        if not articles:
+            logger.info("No hay artículos nuevos.")
+            return 0
+        wp = WordPressPublisher()
+        with ArticlePipeline(wp, published, journal) as pipeline:
+            post_ids = pipeline.run(articles)
+        return sum(1 for post_id in post_ids if post_id)
+    finally:
+        # Toda salida guarda el estado: la descarga ya tocó el detector y
+        # las cachés aunque no haya nada que publicar
+        _finish_run(journal, published)
+
+
+def _finish_run(journal: PipelineJournal, published: PublishedStore) -> None:
+    logger = logging.getLogger(__name__)
+    journal.compact()
+    published.flush()
+    get_detector().save()
+    if text_cache is not None:
+        update_counters({f"cache:text_{k}": v for k, v in text_cache.take_counters().items()})
+    if settings.image_reuse_enabled:
+        update_counters({f"cache:image_{k}": v for k, v in get_library().take_counters().items()})
+    usage = usage_log.take_counters()
+    if usage["calls"]:
+        logger.info(
+            "OpenAI en esta ejecución: %d llamadas, %d tokens de entrada, %d de salida, %.1fs",
+            usage["calls"], usage["input_tokens"], usage["output_tokens"], usage["seconds"],
+        )
+        update_counters({
+            "openai:calls": usage["calls"],
+            "openai:input_tokens": usage["input_tokens"],
+            "openai:output_tokens": usage["output_tokens"],
+        })
+    left = text_budget.remaining()
+    if left["day"] is not None or left["run"] is not None:
+        logger.info(
+            "Presupuesto OpenAI restante: %s tokens en la ejecución, %s hoy",
+            "∞" if left["run"] is None else left["run"],
+            "∞" if left["day"] is None else left["day"],
+        )
+    get_recorder().finish_run()
+    flush_stats()
     logger.info("===== FIN EJECUCIÓN BOT MODA =====")
 
 
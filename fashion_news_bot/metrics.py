@@ -0,0 +1,255 @@
+"""
+Per-stage, per-article performance metrics.
+
+Each unit of work runs inside `stage(name, key)`: fetching a source,
+classifying, writing, generating the image and publishing an article.
+The stage records its wall-clock duration and whether it failed.  Code
+running inside a stage adds to it through `add` without needing a
+reference to it: `http_client` adds the bytes sent and received and the
+retries, `writer` the input and output tokens, `image_generator` the
+images paid for and the provider that produced them.  Stages are tracked
+per thread, so the concurrent pipeline pools do not mix their numbers.
+
+Every finished stage is appended as one JSON line to
+`settings.metrics_path`.  At the end of `main.run_once` the run is
+summarized per stage (count, errors, p50/p95/max duration, bytes,
+retries, tokens, images) in the log, and, with
+`settings.metrics_prometheus_path`, written in the Prometheus text format
+for the node_exporter textfile collector.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Valores numéricos que se suman en el resumen de cada etapa
+SUMMED = ("bytes_in", "bytes_out", "retries", "tokens_in", "tokens_out", "images")
+PROMETHEUS_PREFIX = "fashion_bot"
+
+
+class StageMetrics:
+    """Measurements of one stage of one article (or source)."""
+
+    def __init__(self, name: str, key: Optional[str], labels: Dict[str, str]) -> None:
+        self.name = name
+        self.key = key
+        self.labels = dict(labels)
+        self.values: Dict[str, float] = {}
+        self.ok = True
+        self.started = time.time()
+        self.seconds = 0.0
+
+    def add(self, **values: float) -> None:
+        for field, amount in values.items():
+            self.values[field] = self.values.get(field, 0) + amount
+
+    def to_dict(self, run_id: str) -> Dict[str, Any]:
+        record = {
+            "ts": round(self.started, 3),
+            "run": run_id,
+            "stage": self.name,
+            "key": self.key,
+            "seconds": round(self.seconds, 4),
+            "ok": self.ok,
+        }
+        record.update(self.labels)
+        record.update(self.values)
+        return record
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `values` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class MetricsRecorder:
+    """Collects the stages of the current run and writes them as JSON lines."""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.run_id = ""
+        self.records: List[StageMetrics] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def start_run(self) -> None:
+        with self._lock:
+            self.run_id = time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+            self.records = []
+        if self.path and os.path.exists(self.path):
+            # Rotación simple: se conserva el fichero anterior como .1
+            if os.path.getsize(self.path) > settings.metrics_max_mb * 1024 * 1024:
+                os.replace(self.path, self.path + ".1")
+
+    def _stack(self) -> List[StageMetrics]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self) -> Optional[StageMetrics]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def stage(self, name: str, key: Optional[str] = None, **labels: str) -> Iterator[StageMetrics]:
+        record = StageMetrics(name, key, labels)
+        stack = self._stack()
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record.ok = False
+            raise
+        finally:
+            record.seconds = time.perf_counter() - start
+            stack.pop()
+            self._finish(record)
+
+    def _finish(self, record: StageMetrics) -> None:
+        with self._lock:
+            self.records.append(record)
+            line = json.dumps(record.to_dict(self.run_id), ensure_ascii=False)
+            if not self.path:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logger.warning("No se pudo escribir la métrica: %s", e)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage aggregates of the current run."""
+        with self._lock:
+            records = list(self.records)
+        by_stage: Dict[str, List[StageMetrics]] = {}
+        for record in records:
+            by_stage.setdefault(record.name, []).append(record)
+        result: Dict[str, Dict[str, float]] = {}
+        for name, group in by_stage.items():
+            durations = [r.seconds for r in group]
+            row = {
+                "count": len(group),
+                "errors": sum(1 for r in group if not r.ok),
+                "p50": percentile(durations, 50),
+                "p95": percentile(durations, 95),
+                "max": max(durations),
+                "sum": sum(durations),
+            }
+            for field in SUMMED:
+                row[field] = sum(r.values.get(field, 0) for r in group)
+            result[name] = row
+        return result
+
+    def finish_run(self) -> Dict[str, Dict[str, float]]:
+        """Log the run summary and export it; returns the summary."""
+        summary = self.summary()
+        if summary:
+            logger.info(
+                "Métricas %s:\n%-10s %6s %5s %8s %8s %8s %10s %10s %6s %9s %9s %6s",
+                self.run_id, "etapa", "n", "err", "p50(s)", "p95(s)", "max(s)",
+                "KB in", "KB out", "reint", "tok in", "tok out", "img",
+            )
+            for name, row in summary.items():
+                logger.info(
+                    "%-10s %6d %5d %8.2f %8.2f %8.2f %10.1f %10.1f %6d %9d %9d %6d",
+                    name, row["count"], row["errors"], row["p50"], row["p95"], row["max"],
+                    row["bytes_in"] / 1024, row["bytes_out"] / 1024, row["retries"],
+                    row["tokens_in"], row["tokens_out"], row["images"],
+                )
+        if settings.metrics_prometheus_path:
+            try:
+                write_prometheus(settings.metrics_prometheus_path, summary)
+            except OSError as e:
+                logger.warning("No se pudo escribir el fichero de Prometheus: %s", e)
+        return summary
+
+
+def _prometheus_lines(summary: Dict[str, Dict[str, float]]) -> List[str]:
+    p = PROMETHEUS_PREFIX
+    lines = [
+        f"# HELP {p}_stage_seconds Duration of each pipeline stage in the last run.",
+        f"# TYPE {p}_stage_seconds summary",
+    ]
+    for name, row in summary.items():
+        for quantile, field in (("0.5", "p50"), ("0.95", "p95")):
+            lines.append(f'{p}_stage_seconds{{stage="{name}",quantile="{quantile}"}} {row[field]:.6f}')
+        lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {row["sum"]:.6f}')
+        lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {row["count"]}')
+    for field, help_text in (
+        ("errors", "Failed stage executions"),
+        ("bytes_in", "Bytes received"),
+        ("bytes_out", "Bytes sent"),
+        ("retries", "HTTP retries"),
+        ("tokens_in", "OpenAI input tokens"),
+        ("tokens_out", "OpenAI output tokens"),
+        ("images", "Images generated by paid providers"),
+    ):
+        metric = f"{p}_stage_{field}"
+        lines.append(f"# HELP {metric} {help_text} in the last run.")
+        lines.append(f"# TYPE {metric} gauge")
+        for name, row in summary.items():
+            lines.append(f'{metric}{{stage="{name}"}} {row[field]:g}')
+    lines.append(f"# HELP {p}_last_run_timestamp_seconds End of the last run.")
+    lines.append(f"# TYPE {p}_last_run_timestamp_seconds gauge")
+    lines.append(f"{p}_last_run_timestamp_seconds {time.time():.0f}")
+    return lines
+
+
+def write_prometheus(path: str, summary: Dict[str, Dict[str, float]]) -> None:
+    """Write `summary` in the Prometheus text format, replacing the file atomically."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(_prometheus_lines(summary)) + "\n")
+    os.replace(tmp_path, path)
+
+
+_recorder: Optional[MetricsRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder() -> MetricsRecorder:
+    """Return the process-wide metrics recorder."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = MetricsRecorder(settings.metrics_path if settings.metrics_enabled else None)
+        return _recorder
+
+
+def stage(name: str, key: Optional[str] = None, **labels: str):
+    """Measure a stage: ``with metrics.stage("write", art["hash"]): ...``."""
+    return get_recorder().stage(name, key, **labels)
+
+
+def add(**values: float) -> None:
+    """Add values to the stage running in this thread, if any."""
+    record = get_recorder().current()
+    if record is not None:
+        record.add(**values)
+
+
+def label(**labels: str) -> None:
+    """Attach labels to the stage running in this thread, if any."""
+    record = get_recorder().current()
+    if record is not None:
+        record.labels.update(labels)
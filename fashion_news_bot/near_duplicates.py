@@ -0,0 +1,210 @@
+"""
+Near-duplicate story detection across sources.
+
+The same runway story syndicated by several outlets gets a different
+`source|url|title` hash per outlet.  This module computes a 64-bit SimHash
+over the title, description and content of each candidate and looks it
+up in an LSH index (the signature is split into bands; two signatures
+within `settings.near_dup_max_distance` bits share at least one band).
+Only one representative per cluster of near-identical stories is kept.
+
+The index holds the signatures of recently published articles, persists
+between runs and evicts entries older than `settings.near_dup_window_hours`.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .config import settings
+from .storage import _atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_TAG_RE = re.compile(r"<[^>]+>")
+SIMHASH_BITS = 64
+
+
+def article_text(article: Dict) -> str:
+    """Text used to build the signature of an article."""
+    parts = [article.get("title") or "", article.get("description") or ""]
+    content = article.get("content") or ""
+    # En RSS description y content son el mismo resumen
+    if content != parts[1]:
+        parts.append(content)
+    return _TAG_RE.sub(" ", " ".join(parts)).lower()
+
+
+def simhash(text: str) -> int:
+    """Compute a 64-bit SimHash over word unigrams and bigrams."""
+    words = _WORD_RE.findall(text)
+    features = Counter(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    weights = [0] * SIMHASH_BITS
+    for feature, weight in features.items():
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            if h >> bit & 1:
+                weights[bit] += weight
+            else:
+                weights[bit] -= weight
+    value = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            value |= 1 << bit
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateIndex:
+    """LSH index of SimHash signatures with time-window eviction."""
+
+    def __init__(self, max_distance: int, path: Optional[str] = None) -> None:
+        self.max_distance = max_distance
+        self.path = path
+        # max_distance + 1 bandas: por el principio del palomar, dos firmas a
+        # distancia <= max_distance coinciden al menos en una banda
+        self.num_bands = max_distance + 1
+        self.band_bits = SIMHASH_BITS // self.num_bands
+        self.entries: Dict[str, Dict] = {}
+        self._bands: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def _band_keys(self, signature: int) -> List[str]:
+        keys = []
+        mask = (1 << self.band_bits) - 1
+        for band in range(self.num_bands):
+            shift = band * self.band_bits
+            # La última banda se queda con los bits sobrantes
+            width_mask = mask if band < self.num_bands - 1 else (1 << (SIMHASH_BITS - shift)) - 1
+            keys.append(f"{band}:{(signature >> shift) & width_mask:x}")
+        return keys
+
+    def find(self, signature: int) -> Optional[str]:
+        """Return the key of an indexed near-duplicate of `signature`, if any."""
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates.update(self._bands.get(key, ()))
+            for entry_key in candidates:
+                if hamming(signature, self.entries[entry_key]["simhash"]) <= self.max_distance:
+                    return entry_key
+        return None
+
+    def add(self, key: str, signature: int, ts: Optional[float] = None, title: str = "") -> None:
+        with self._lock:
+            if key in self.entries:
+                return
+            self.entries[key] = {"simhash": signature, "ts": ts or time.time(), "title": title}
+            for band_key in self._band_keys(signature):
+                self._bands.setdefault(band_key, set()).add(key)
+
+    def evict_older_than(self, cutoff: float) -> int:
+        with self._lock:
+            stale = [k for k, e in self.entries.items() if e["ts"] < cutoff]
+            for key in stale:
+                entry = self.entries.pop(key)
+                for band_key in self._band_keys(entry["simhash"]):
+                    members = self._bands.get(band_key)
+                    if members:
+                        members.discard(key)
+                        if not members:
+                            del self._bands[band_key]
+        return len(stale)
+
+    @classmethod
+    def load(cls, path: str, max_distance: int) -> "NearDuplicateIndex":
+        index = cls(max_distance, path)
+        if not os.path.exists(path):
+            return index
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning("No se pudo leer el índice de casi duplicados: %s", e)
+            return index
+        for key, entry in data.get("entries", {}).items():
+            index.add(key, int(entry["simhash"], 16), entry.get("ts"), entry.get("title", ""))
+        return index
+
+    def save(self) -> None:
+        with self._lock:
+            data = {
+                "entries": {
+                    k: {"simhash": f"{e['simhash']:016x}", "ts": e["ts"], "title": e["title"]}
+                    for k, e in self.entries.items()
+                }
+            }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        _atomic_write_json(self.path, data)
+
+
+_index: Optional[NearDuplicateIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> NearDuplicateIndex:
+    """Return the process-wide index of recently published signatures."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NearDuplicateIndex.load(
+                settings.near_dup_index_path, settings.near_dup_max_distance
+            )
+        _index.evict_older_than(time.time() - settings.near_dup_window_hours * 3600)
+        return _index
+
+
+def filter_near_duplicates(articles: List[Dict]) -> List[Dict]:
+    """Drop candidates that are near-duplicates of each other or of history.
+
+    Within a cluster the article with the longest text is kept, since it
+    gives the writer the most material.  The surviving articles keep their
+    original order and get a `simhash` key for `remember_published`.
+    """
+    history = get_index()
+    batch = NearDuplicateIndex(settings.near_dup_max_distance)
+    for art in articles:
+        art["simhash"] = simhash(article_text(art))
+    keep = set()
+    # Primero los más completos: representan a su grupo
+    by_richness = sorted(
+        range(len(articles)), key=lambda i: len(article_text(articles[i])), reverse=True
+    )
+    dropped = 0
+    for i in by_richness:
+        art = articles[i]
+        match = history.find(art["simhash"])
+        if match is not None:
+            logger.info("Casi duplicado de un artículo ya publicado: %s", art.get("title"))
+            dropped += 1
+            continue
+        if batch.find(art["simhash"]) is not None:
+            logger.info("Casi duplicado dentro del lote: %s", art.get("title"))
+            dropped += 1
+            continue
+        batch.add(art["hash"], art["simhash"], title=art.get("title") or "")
+        keep.add(i)
+    if dropped:
+        logger.info("Descartados %d casi duplicados", dropped)
+    return [art for i, art in enumerate(articles) if i in keep]
+
+
+def remember_published(article: Dict) -> None:
+    """Add a published article to the persistent index."""
+    signature = article.get("simhash")
+    if signature is None:
+        signature = simhash(article_text(article))
+    index = get_index()
+    index.add(article["hash"], signature, title=article.get("title") or "")
+    index.save()
@@ -0,0 +1,383 @@
+"""
+Staged, concurrent article processing pipeline.
+
+Each article goes through classification, text generation, image
+generation and publishing.  Every stage has its own bounded thread pool
+so the limits of each external API (OpenAI, Gemini, WordPress) can be
+tuned independently, text and image generation for the same article run
+at the same time, and up to `settings.pipeline_concurrency` articles are
+in flight at once.  With a `journal.PipelineJournal` every completed
+step is checkpointed and an interrupted article resumes where it stopped.
+"""
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+from .config import settings
+from .journal import (
+    CLASSIFIED, FAILED, FETCHED, IMAGE_DONE, MEDIA_UPLOADED, POSTED, WRITTEN,
+    PipelineJournal,
+)
+from .resilience import BudgetExceededError, CircuitOpenError
+from .writer import check_text_available, generate_article_text
+from .image_generator import generate_fashion_image
+from .image_library import dhash, get_library, library_subject
+from .image_processing import EncodedImage, load_archived, prepare_for_upload
+from .async_publisher import AsyncWordPressPublisher, PublishItem
+from .publisher import WordPressPublisher
+from .classifier import classify_article, record_training_sample
+from .near_duplicates import remember_published
+from .stats import update_stats
+from .storage import PublishedStore
+
+logger = logging.getLogger(__name__)
+
+# Resultado de las etapas previas a publicar: categoría, texto, imagen y
+# pasos ya registrados en el diario
+Prepared = Tuple[str, Dict, Optional[EncodedImage], Dict]
+
+
+class ArticlePipeline:
+    """Runs articles through the publishing stages with per-stage pools.
+
+    Use it as a context manager so the stage pools are shut down when the
+    run ends::
+
+        with ArticlePipeline(wp, get_published_store()) as pipeline:
+            pipeline.run(articles)
+    """
+
+    def __init__(
+        self,
+        wp: WordPressPublisher,
+        published: PublishedStore,
+        journal: Optional[PipelineJournal] = None,
+    ) -> None:
+        self.wp = wp
+        self.published = published
+        self.journal = journal
+        # La clasificación es local y barata: un solo worker alcanza
+        self.classify_pool = ThreadPoolExecutor(1, thread_name_prefix="classify")
+        self.text_pool = ThreadPoolExecutor(
+            max(1, settings.text_workers), thread_name_prefix="text"
+        )
+        self.image_pool = ThreadPoolExecutor(
+            max(1, settings.image_workers), thread_name_prefix="image"
+        )
+        self.publish_pool = ThreadPoolExecutor(
+            max(1, settings.publish_workers), thread_name_prefix="publish"
+        )
+
+    def __enter__(self) -> "ArticlePipeline":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for pool in (self.classify_pool, self.text_pool, self.image_pool, self.publish_pool):
+            pool.shutdown(wait=True)
+
+    def _checkpoint(self, art: Dict, step: str, data=None) -> None:
+        if self.journal is not None:
+            self.journal.record(art["hash"], step, data)
+
+    def _classify(self, art: Dict, done: Dict) -> str:
+        if CLASSIFIED in done:
+            return done[CLASSIFIED]
+        # El scraper ya clasifica el lote completo; aquí solo si falta
+        category_label = art.get("category")
+        if not category_label:
+            with metrics.stage("classify", art["hash"]):
+                category_label = self.classify_pool.submit(classify_article, art).result()
+        self._checkpoint(art, CLASSIFIED, category_label)
+        return category_label
+
+    def _write(self, art: Dict, on_title: Optional[Callable[[str], None]] = None) -> Dict:
+        with metrics.stage("write", art["hash"]):
+            article_text = generate_article_text(art, on_title)
+        self._checkpoint(art, WRITTEN, article_text)
+        return article_text
+
+    def _image(self, art: Dict) -> Optional[EncodedImage]:
+        with metrics.stage("image", art["hash"]):
+            image = generate_fashion_image(art)
+        if image is not None and settings.image_processing_enabled:
+            try:
+                with metrics.stage("image_processing", art["hash"]):
+                    image = prepare_for_upload(image, f"img_{art['hash']}")
+            except Exception as e:
+                # Mejor subir la imagen original que quedarse sin imagen
+                logger.error("Error procesando imagen de %s: %s", art["hash"], e)
+        # Solo una imagen archivada en disco sobrevive a un corte; si está
+        # solo en memoria, al reanudar se vuelve a generar
+        if image is None:
+            self._checkpoint(art, IMAGE_DONE, None)
+        elif image.path:
+            self._checkpoint(
+                art,
+                IMAGE_DONE,
+                {"path": image.path, "reusable": image.reusable, "provider": image.provider},
+            )
+        return image
+
+    @staticmethod
+    def _resume_image(step: Any) -> Optional[EncodedImage]:
+        """Image recorded in an IMAGE_DONE step.
+
+        Older journals stored only the path; without the flag the image
+        is not offered to the library, in case it was a placeholder.
+        """
+        if isinstance(step, dict):
+            return load_archived(step["path"], step.get("reusable", False), step.get("provider", ""))
+        return load_archived(step)
+
+    def _reuse_image(self, art: Dict, done: Dict) -> bool:
+        """Reuse the cover of a similar article instead of generating one.
+
+        A reused media ID is recorded as MEDIA_UPLOADED in `done`.
+        """
+        entry = get_library().find_similar(library_subject(art), settings.writer_style)
+        if entry is None:
+            return False
+        self._checkpoint(art, MEDIA_UPLOADED, entry["media_id"])
+        done[MEDIA_UPLOADED] = entry["media_id"]
+        return True
+
+    @staticmethod
+    def _image_phash(image: EncodedImage) -> Optional[int]:
+        if not (settings.image_reuse_enabled and image.reusable):
+            return None
+        try:
+            return dhash(image.data)
+        except Exception as e:
+            logger.warning("No se pudo calcular el hash perceptual: %s", e)
+            return None
+
+    @staticmethod
+    def _twin_media(phash: Optional[int]) -> Optional[int]:
+        """Media ID of an identical cover already uploaded, if any."""
+        if phash is None:
+            return None
+        twin = get_library().find_by_phash(phash)
+        if twin is None:
+            return None
+        logger.info("Imagen idéntica ya subida: se reutiliza media ID %s", twin["media_id"])
+        return twin["media_id"]
+
+    @staticmethod
+    def _remember_image(
+        art: Dict, image: EncodedImage, phash: Optional[int], media_id: Optional[int]
+    ) -> None:
+        if media_id and phash is not None:
+            get_library().add(art["hash"], library_subject(art), settings.writer_style, phash, media_id)
+
+    def _upload_image(self, art: Dict, image: EncodedImage) -> Optional[int]:
+        phash = self._image_phash(image)
+        media_id = self._twin_media(phash)
+        if media_id is not None:
+            return media_id
+        media_id = self.wp.upload_media_bytes(
+            image.data, image.filename(f"img_{art['hash']}"), image.mime
+        )
+        self._remember_image(art, image, phash, media_id)
+        return media_id
+
+    @staticmethod
+    def _category_ids(category_label: str) -> Optional[List[int]]:
+        if settings.category_ids and category_label in settings.category_ids:
+            return [settings.category_ids[category_label]]
+        return None
+
+    def _publish(
+        self,
+        art: Dict,
+        category_label: str,
+        article_text: Dict,
+        image: Optional[EncodedImage],
+        done: Dict,
+    ) -> int:
+        # Upload image straight from memory
+        media_id: Optional[int] = None
+        if MEDIA_UPLOADED in done:
+            media_id = done[MEDIA_UPLOADED]
+        elif image is not None:
+            media_id = self._upload_image(art, image)
+            self._checkpoint(art, MEDIA_UPLOADED, media_id)
+        # Create post
+        post_id = self.wp.create_post(
+            title=article_text["magazine_title"],
+            content_html=article_text["body_html"],
+            excerpt=article_text["meta_description"],
+            categories=self._category_ids(category_label),
+            featured_media=media_id,
+        )
+        return post_id
+
+    def _publish_measured(self, art: Dict, *args) -> int:
+        with metrics.stage("publish", art["hash"]):
+            return self._publish(art, *args)
+
+    def _steps(self, art: Dict) -> Dict:
+        return self.journal.steps(art["hash"]) if self.journal is not None else {}
+
+    def _prepare(self, art: Dict, done: Dict) -> Prepared:
+        """Run every stage before publishing: classify, write and get the image.
+
+        Steps already recorded in the journal (`done`) are skipped and their
+        stored results reused.
+        """
+        if done:
+            logger.info("Reanudando artículo desde el diario: %s", art.get("title"))
+        else:
+            logger.info("Procesando artículo: %s", art.get("title"))
+            self._checkpoint(art, FETCHED, art)
+        category_label = self._classify(art, done)
+        logger.info("Clasificación: %s", category_label)
+        if WRITTEN not in done:
+            # Sin texto posible no se paga la imagen: el artículo se pospone
+            check_text_available()
+        # Texto e imagen en paralelo.  Sin streaming la imagen usa el título
+        # original; en streaming espera solo al titular generado, no al cuerpo
+        need_image = IMAGE_DONE not in done and MEDIA_UPLOADED not in done
+        if settings.image_reuse_enabled and need_image and self._reuse_image(art, done):
+            need_image = False
+        text_future = image_future = None
+        if WRITTEN not in done:
+            headline: Future = Future()
+            on_title = headline.set_result if need_image and settings.openai_streaming else None
+            text_future = self.text_pool.submit(self._write, art, on_title)
+            if on_title is not None:
+                wait([headline, text_future], return_when=FIRST_COMPLETED)
+                if not headline.done():
+                    # El texto terminó (o falló) sin titular: propaga el error
+                    text_future.result()
+                if headline.done():
+                    art["headline"] = headline.result()
+        elif need_image and settings.openai_streaming:
+            art["headline"] = done[WRITTEN]["magazine_title"]
+        if need_image:
+            image_future = self.image_pool.submit(self._image, art)
+        try:
+            article_text = text_future.result() if text_future else done[WRITTEN]
+        except Exception:
+            if image_future is not None:
+                image_future.cancel()
+            raise
+        image: Optional[EncodedImage] = None
+        if image_future is not None:
+            image = image_future.result()
+        elif MEDIA_UPLOADED not in done:
+            image = self._resume_image(done[IMAGE_DONE])
+        return category_label, article_text, image, done
+
+    def _finish(self, art: Dict, category_label: str, post_id: int) -> None:
+        logger.info("Publicado post ID %s para hash %s", post_id, art["hash"])
+        # Primero la base de publicados y luego el diario: al compactar, el
+        # diario descarta los POSTED, y un corte entre ambos pasos no debe
+        # dejar el artículo fuera de la base (se volvería a publicar)
+        self.published.add(art["hash"])
+        self._checkpoint(art, POSTED, post_id)
+        if settings.near_dup_enabled:
+            remember_published(art)
+        update_stats(art.get("source"), category_label)
+        record_training_sample(art, post_id, category_label)
+
+    def process(self, art: Dict) -> int:
+        """Run one article through every stage and return the post ID."""
+        done = self._steps(art)
+        if POSTED in done:
+            self.published.add(art["hash"])
+            return done[POSTED]
+        category_label, article_text, image, done = self._prepare(art, done)
+        post_id = self.publish_pool.submit(
+            self._publish_measured, art, category_label, article_text, image, done
+        ).result()
+        self._finish(art, category_label, post_id)
+        return post_id
+
+    def _process_safe(self, art: Dict, step: Optional[Callable] = None):
+        try:
+            return (step or self.process)(art)
+        except (CircuitOpenError, BudgetExceededError) as e:
+            # No cuenta como fallo del artículo: queda pendiente en el diario
+            logger.warning("Artículo pospuesto (%s): %s", e, art.get("title"))
+            return None
+        except Exception as e:
+            logger.exception("Error procesando artículo '%s': %s", art.get("title"), e)
+            self._checkpoint(art, FAILED, str(e))
+            return None
+
+    def run(self, articles: List[Dict]) -> List[Optional[int]]:
+        """Process `articles` concurrently.
+
+        Returns the post ID for each article, in input order, or None for
+        articles that failed.  A failure never stops the other articles.
+        """
+        if not articles:
+            return []
+        workers = max(1, min(settings.pipeline_concurrency, len(articles)))
+        with ThreadPoolExecutor(workers, thread_name_prefix="article") as pool:
+            return list(pool.map(self._process_safe, articles))
+
+    def _prepare_item(self, art: Dict) -> Tuple[PublishItem, str, Optional[EncodedImage], Optional[int]]:
+        category_label, article_text, image, done = self._prepare(art, self._steps(art))
+        item = PublishItem(
+            key=art["hash"],
+            title=article_text["magazine_title"],
+            content_html=article_text["body_html"],
+            excerpt=article_text["meta_description"],
+            categories=self._category_ids(category_label),
+            featured_media=done.get(MEDIA_UPLOADED),
+        )
+        phash: Optional[int] = None
+        if item.featured_media is None and image is not None:
+            phash = self._image_phash(image)
+            item.featured_media = self._twin_media(phash)
+            if item.featured_media is None:
+                item.image = image
+        return item, category_label, image, phash
+
+    def run_batched(self, articles: List[Dict], publisher: AsyncWordPressPublisher) -> List[Optional[int]]:
+        """Like `run`, but publish every prepared article through `publisher`.
+
+        Text and images are produced concurrently as in `run`; the posts are
+        then created together with pipelined uploads and `/batch/v1`
+        requests, which pays off for backfills of many articles.
+        """
+        post_ids: List[Optional[int]] = [None] * len(articles)
+        todo = []
+        for i, art in enumerate(articles):
+            posted = self._steps(art).get(POSTED)
+            if posted is not None:
+                post_ids[i] = posted
+            else:
+                todo.append(i)
+        if not todo:
+            return post_ids
+        workers = max(1, min(settings.pipeline_concurrency, len(todo)))
+        with ThreadPoolExecutor(workers, thread_name_prefix="article") as pool:
+            prepared = list(pool.map(
+                lambda i: self._process_safe(articles[i], self._prepare_item), todo
+            ))
+        ready = [(i, p) for i, p in zip(todo, prepared) if p is not None]
+        with metrics.stage("publish", f"batch:{len(ready)}") as stage:
+            results = publisher.publish_many_sync([item for _, (item, *_rest) in ready])
+            stage.add(items=len(ready))
+        for (i, (item, category_label, image, phash)), result in zip(ready, results):
+            art = articles[i]
+            if result.media_id:
+                self._checkpoint(art, MEDIA_UPLOADED, result.media_id)
+                if item.image is not None:
+                    self._remember_image(art, image, phash, result.media_id)
+            if result.media_error:
+                logger.warning("Post de %s sin imagen: %s", art["hash"], result.media_error)
+            if not result.ok:
+                logger.error("No se pudo publicar '%s': %s", art.get("title"), result.error)
+                self._checkpoint(art, FAILED, result.error)
+                continue
+            self._finish(art, category_label, result.post_id)
+            post_ids[i] = result.post_id
+        return post_ids
@@ -0,0 +1,196 @@
+"""
+Prompt builder for the article rewrites.
+
+The source block sent to OpenAI used to be the title, description and
+content glued together and cut at 8000 characters.  For RSS items the
+description and the content are the same summary, so it was sent twice,
+often with its HTML markup, and a character cut says little about what
+the call costs.  This module:
+
+* strips HTML tags, entities and NewsAPI's "[+1234 chars]" truncation
+  marker from every field;
+* drops the paragraphs of a field that already appeared in an earlier
+  one (description repeated in the content, title repeated as the first
+  line of the description, ...);
+* budgets the source block in tokens (`settings.prompt_max_tokens`),
+  counted with `tiktoken` when it is installed and estimated from the
+  text length otherwise, cutting at a sentence or word boundary.
+
+The fixed instructions go first and the article last, so consecutive
+prompts share the longest possible prefix.  `UsageLog` records input and
+output tokens and latency per article, for the cost summary of each run.
+"""
+
+import html
+import logging
+import re
+import threading
+from typing import Dict, List, Optional
+
+from .config import settings
+
+try:
+    import tiktoken
+except ImportError:  # dependencia opcional: se estima por longitud
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_BLOCK_TAG_RE = re.compile(r"<\s*(br|/p|/div|/li|/h[1-6])\b[^>]*>", re.IGNORECASE)
+_SCRIPT_RE = re.compile(r"<(script|style)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+# Marca de truncado de NewsAPI al final de `content`
+_TRUNCATION_RE = re.compile(r"\s*…?\s*\[\+\d+ chars\]\s*$")
+_SPACES_RE = re.compile(r"[ \t\r\f\v]+")
+_NORMALIZE_RE = re.compile(r"\W+")
+# Fin de frase para recortar sin dejar oraciones a medias
+_SENTENCE_END_RE = re.compile(r"[.!?…](?=\s)")
+
+# Caracteres por token de media en texto periodístico es/en
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding
+    if tiktoken is None:
+        return None
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                _encoding = tiktoken.encoding_for_model(settings.openai_text_model)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("o200k_base")
+        return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Tokens of `text` for the text model (estimated without tiktoken)."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` to at most `max_tokens`, at a sentence or word boundary."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        cut = encoding.decode(tokens[:max_tokens])
+    else:
+        if len(text) <= max_tokens * CHARS_PER_TOKEN:
+            return text
+        cut = text[: max_tokens * CHARS_PER_TOKEN]
+    # Mejor terminar en una frase completa si no se pierde demasiado
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(cut + " ")]
+    if ends and ends[-1] >= len(cut) * 0.7:
+        return cut[: ends[-1]]
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+def strip_html(text: Optional[str]) -> str:
+    """Plain text of an HTML fragment, keeping paragraph breaks."""
+    if not text:
+        return ""
+    text = _SCRIPT_RE.sub(" ", text)
+    text = _BLOCK_TAG_RE.sub("\n", text)
+    text = html.unescape(_TAG_RE.sub("", text))
+    text = _TRUNCATION_RE.sub("", text)
+    lines = (_SPACES_RE.sub(" ", line).strip() for line in text.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def _key(text: str) -> str:
+    return _NORMALIZE_RE.sub(" ", text.lower()).strip()
+
+
+def dedupe_fields(fields: List[str]) -> List[str]:
+    """Remove from each field the paragraphs already present in earlier ones.
+
+    A paragraph is dropped when its normalized text is contained in what
+    was kept before (e.g. an RSS description equal to the content, or a
+    title repeated as the first line).  Conversely, a field other than the
+    first (the title) that is wholly contained in a later one, such as a
+    NewsAPI description that opens the content, is dropped so the text is
+    sent only once.
+    """
+    kept: List[List[str]] = []
+    seen: List[str] = []
+    for field in fields:
+        paragraphs = []
+        for paragraph in field.split("\n"):
+            key = _key(paragraph)
+            if key and not any(key in k for k in seen):
+                paragraphs.append(paragraph)
+                seen.append(key)
+        whole = _key(" ".join(paragraphs))
+        for earlier in kept[1:]:
+            if earlier and _key(" ".join(earlier)) in whole:
+                earlier.clear()
+        kept.append(paragraphs)
+    return ["\n".join(ps) for ps in kept]
+
+
+def build_source_block(article: Dict, max_tokens: Optional[int] = None) -> str:
+    """Clean, deduplicated and token-budgeted source text of `article`."""
+    max_tokens = settings.prompt_max_tokens if max_tokens is None else max_tokens
+    title, description, content = dedupe_fields([
+        strip_html(article.get("title")),
+        strip_html(article.get("description")),
+        strip_html(article.get("content")),
+    ])
+    parts = []
+    if title:
+        parts.append("Título: " + title)
+    if description:
+        parts.append("Descripción: " + description)
+    if content:
+        parts.append("Contenido:\n" + content)
+    return truncate_to_tokens("\n\n".join(parts), max_tokens)
+
+
+def build_prompt(instructions: str, source: str) -> str:
+    """Full prompt: fixed instructions first, article text last."""
+    return instructions + "\n\nInformación original:\n" + source
+
+
+class UsageLog:
+    """Input/output tokens and latency of the OpenAI text calls of a run."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.seconds = 0.0
+
+    def record(self, article: Dict, input_tokens: int, output_tokens: int, seconds: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.seconds += seconds
+        logger.info(
+            "Tokens OpenAI para %s: %d de entrada, %d de salida (%.1fs)",
+            article.get("hash") or article.get("title", "?"), input_tokens, output_tokens, seconds,
+        )
+
+    def take_counters(self) -> Dict[str, float]:
+        """Return and reset the totals since the last call."""
+        with self._lock:
+            counters = {
+                "calls": self.calls,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "seconds": round(self.seconds, 1),
+            }
+            self.calls = self.input_tokens = self.output_tokens = 0
+            self.seconds = 0.0
+        return counters
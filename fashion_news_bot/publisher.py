@@ -2,20 +2,43 @@
 Publisher module for posting articles to WordPress.
 
 This module wraps the WordPress REST API to upload media and create
-posts.  Categories and excerpts can be set when creating a post.
+posts.  Categories and excerpts can be set when creating a post.  Requests
+go through the shared keep-alive session of `http_client`.
 """
 
 import logging
+import mimetypes
 import os
-from typing import Optional, List
-
-import requests
+from typing import Optional, List, Union
 
+from . import http_client
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
 
+def build_post_payload(
+    title: str,
+    content_html: str,
+    excerpt: str = "",
+    categories: Optional[List[int]] = None,
+    featured_media: Optional[int] = None,
+) -> dict:
+    """Build the JSON body of a `POST /wp/v2/posts` request."""
+    payload = {
+        "title": title,
+        "content": content_html,
+        "status": "publish",
+    }
+    if excerpt:
+        payload["excerpt"] = excerpt
+    if featured_media:
+        payload["featured_media"] = featured_media
+    if categories:
+        payload["categories"] = categories
+    return payload
+
+
 class WordPressPublisher:
     """A simple wrapper around the WordPress REST API for posting articles."""
 
@@ -32,22 +55,35 @@ class WordPressPublisher:
         return (self.user, self.app_password)
 
     def upload_media(self, image_path: str) -> Optional[int]:
-        """Upload an image to WordPress and return the media ID.
+        """Upload an image file to WordPress and return the media ID.
 
-        Returns None if the upload fails.
+        Returns None if the file is missing or the upload fails.
         """
         if not image_path or not os.path.exists(image_path):
             logger.warning("Imagen no encontrada: %s", image_path)
             return None
-        url = f"{self.base_url}/wp-json/wp/v2/media"
         filename = os.path.basename(image_path)
+        with open(image_path, "rb") as f:
+            data = f.read()
+        mime = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        return self.upload_media_bytes(data, filename, mime)
+
+    def upload_media_bytes(
+        self, data: Union[bytes, memoryview], filename: str, mime: str
+    ) -> Optional[int]:
+        """Upload an in-memory image to WordPress and return the media ID.
+
+        The buffer is sent as the multipart body as-is, without touching
+        the disk; it is kept in memory so retries can send it again.
+        Returns None if the upload fails.
+        """
+        url = f"{self.base_url}/wp-json/wp/v2/media"
         headers = {
             "Content-Disposition": f'attachment; filename="{filename}"',
         }
-        with open(image_path, "rb") as f:
-            files = {"file": (filename, f, "image/png")}
-            logger.info("Subiendo media a WordPress…")
-            resp = requests.post(url, headers=headers, files=files, auth=self._auth(), timeout=60)
+        files = {"file": (filename, data, mime)}
+        logger.info("Subiendo media a WordPress (%d bytes)…", len(data))
+        resp = http_client.post(url, headers=headers, files=files, auth=self._auth(), timeout=60)
         try:
             resp.raise_for_status()
         except Exception as e:
@@ -67,19 +103,9 @@ class WordPressPublisher:
     ) -> int:
         """Create a new WordPress post and return its ID."""
         url = f"{self.base_url}/wp-json/wp/v2/posts"
-        payload = {
-            "title": title,
-            "content": content_html,
-            "status": "publish",
-        }
-        if excerpt:
-            payload["excerpt"] = excerpt
-        if featured_media:
-            payload["featured_media"] = featured_media
-        if categories:
-            payload["categories"] = categories
+        payload = build_post_payload(title, content_html, excerpt, categories, featured_media)
         logger.info("Creando post en WordPress…")
-        resp = requests.post(url, json=payload, auth=self._auth(), timeout=60)
+        resp = http_client.post(url, json=payload, auth=self._auth(), timeout=60)
         resp.raise_for_status()
         post_id = resp.json().get("id")
         logger.info("Post creado. ID: %s", post_id)
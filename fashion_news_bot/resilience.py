@@ -0,0 +1,283 @@
+"""
+Resilience helpers for calls to paid external APIs.
+
+`CircuitBreaker` stops calling a provider after `failure_threshold`
+consecutive failures, or when the error rate over the last
+`settings.breaker_window` seconds reaches `settings.breaker_error_rate`,
+and keeps it open for `cooldown` seconds; after the cooldown a single
+trial call is let through (half-open) and its outcome closes or re-opens
+the circuit.  Breaker state is persisted in `settings.breaker_state_path`,
+so a provider that is down (or out of billing credit) is not retried by
+every cron run during its cooldown.
+
+`TokenBudget` caps the tokens spent on a provider per run and per day.
+Daily usage is recorded in the stats file as `tokens:<provider>:<date>`
+(and what is left of a daily limit as `budget:<provider>:remaining_day`),
+so it survives restarts and can be reported by the Telegram bot.
+
+`hedged` runs a list of alternative calls, starting the next one only if
+the previous ones have not answered after `delay` seconds, and returns
+the first usable result.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from .config import settings
+from .stats import read_stats, set_gauges, update_counters
+from .storage import _atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised by `CircuitBreaker.call` while the circuit is open."""
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised by `TokenBudget.check` when the token budget is spent."""
+
+
+class CircuitBreaker:
+    """Circuit breaker on consecutive failures and error rate, with a cooldown."""
+
+    def __init__(self, name: str, failure_threshold: int, cooldown: float) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_until = 0.0
+        self._trial_in_flight = False
+        # (instante, éxito) de las llamadas recientes, para la tasa de error
+        self._outcomes: deque = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_until == 0.0:
+            return CLOSED
+        return OPEN if time.time() < self.opened_until else HALF_OPEN
+
+    def allow(self) -> bool:
+        """True if a call may go through now."""
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_in_flight:
+                # Solo una llamada de prueba a la vez tras el enfriamiento
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def _record_outcome(self, ok: bool) -> float:
+        """Add an outcome to the window and return the current error rate."""
+        now = time.time()
+        self._outcomes.append((now, ok))
+        while self._outcomes and self._outcomes[0][0] < now - settings.breaker_window:
+            self._outcomes.popleft()
+        if len(self._outcomes) < settings.breaker_min_calls:
+            return 0.0
+        return sum(1 for _, success in self._outcomes if not success) / len(self._outcomes)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._record_outcome(True)
+            changed = self.opened_until != 0.0
+            self.failures = 0
+            self.opened_until = 0.0
+            self._trial_in_flight = False
+        if changed:
+            logger.info("Circuito %s cerrado: el proveedor vuelve a responder", self.name)
+            _save_state()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            rate = self._record_outcome(False)
+            trial = self._trial_in_flight
+            self._trial_in_flight = False
+            if (
+                not trial
+                and self.failures < self.failure_threshold
+                and rate < settings.breaker_error_rate
+            ):
+                return
+            self.opened_until = time.time() + self.cooldown
+            self._outcomes.clear()
+        if rate >= settings.breaker_error_rate:
+            reason = f"tasa de error {rate:.0%}"
+        else:
+            reason = f"{self.failures} fallos seguidos"
+        logger.warning("Circuito %s abierto durante %.0fs (%s)", self.name, self.cooldown, reason)
+        _save_state()
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Call `fn` through the breaker; raises `CircuitOpenError` when open."""
+        if not self.allow():
+            raise CircuitOpenError(f"circuito {self.name} abierto")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"failures": self.failures, "opened_until": self.opened_until}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def _load_state() -> Dict[str, Dict[str, Any]]:
+    path = settings.breaker_state_path
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning("No se pudo leer el estado de los circuitos: %s", e)
+        return {}
+
+
+def _save_state() -> None:
+    with _breakers_lock:
+        data = {name: breaker.to_dict() for name, breaker in _breakers.items()}
+    os.makedirs(os.path.dirname(settings.breaker_state_path), exist_ok=True)
+    _atomic_write_json(settings.breaker_state_path, data, indent=2)
+
+
+def get_breaker(name: str, failure_threshold: int, cooldown: float) -> CircuitBreaker:
+    """Return the process-wide breaker for `name`, restoring persisted state."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, failure_threshold, cooldown)
+            saved = _load_state().get(name)
+            if saved:
+                breaker.failures = int(saved.get("failures", 0))
+                breaker.opened_until = float(saved.get("opened_until", 0.0))
+            _breakers[name] = breaker
+        return breaker
+
+
+def load_breaker_states() -> Dict[str, Dict[str, Any]]:
+    """Persisted breaker states, for reporting from another process."""
+    return _load_state()
+
+
+class TokenBudget:
+    """Per-run and per-day token allowance for one provider (0 = unlimited)."""
+
+    def __init__(self, name: str, per_run: int, per_day: int) -> None:
+        self.name = name
+        self.per_run = per_run
+        self.per_day = per_day
+        self.used_run = 0
+        self._day = time.strftime("%Y-%m-%d")
+        self._used_day = used_tokens_today(name)
+        self._lock = threading.Lock()
+
+    def start_run(self) -> None:
+        with self._lock:
+            self.used_run = 0
+
+    def _roll_day(self) -> None:
+        today = time.strftime("%Y-%m-%d")
+        if today != self._day:
+            self._day, self._used_day = today, 0
+
+    def remaining(self) -> Dict[str, Optional[int]]:
+        """Tokens left in this run and today; None means unlimited."""
+        with self._lock:
+            self._roll_day()
+            return {
+                "run": max(0, self.per_run - self.used_run) if self.per_run else None,
+                "day": max(0, self.per_day - self._used_day) if self.per_day else None,
+            }
+
+    def exhausted(self, estimated: int = 0) -> bool:
+        left = [v for v in self.remaining().values() if v is not None]
+        return any(v <= 0 or v < estimated for v in left)
+
+    def check(self, estimated: int = 0) -> None:
+        """Raise `BudgetExceededError` if the next call would not fit."""
+        if self.exhausted(estimated):
+            raise BudgetExceededError(f"presupuesto de tokens de {self.name} agotado")
+
+    def charge(self, tokens: int) -> None:
+        """Record `tokens` spent and persist the daily total."""
+        if tokens <= 0:
+            return
+        with self._lock:
+            self._roll_day()
+            self.used_run += tokens
+            self._used_day += tokens
+            day, left = self._day, max(0, self.per_day - self._used_day)
+        update_counters({f"tokens:{self.name}:{day}": tokens})
+        if self.per_day:
+            set_gauges({f"budget:{self.name}:remaining_day": left})
+
+
+def used_tokens_today(name: str) -> int:
+    return int(read_stats().get(f"tokens:{name}:{time.strftime('%Y-%m-%d')}", 0))
+
+
+_budgets: Dict[str, TokenBudget] = {}
+
+
+def get_budget(name: str, per_run: int, per_day: int) -> TokenBudget:
+    """Return the process-wide token budget for a provider."""
+    with _breakers_lock:
+        budget = _budgets.get(name)
+        if budget is None:
+            budget = _budgets[name] = TokenBudget(name, per_run, per_day)
+        return budget
+
+
+def hedged(calls: List[Callable[[], Optional[T]]], delay: float) -> Optional[T]:
+    """Run `calls` as hedged alternatives and return the first non-None result.
+
+    `calls[0]` starts immediately; each following call starts when the
+    ones already running have not produced a result after `delay`
+    seconds, or as soon as one of them fails.  Calls still running when a
+    result arrives are not cancelled (they already hold an API slot), only
+    ignored.  Returns None if every call fails.
+    """
+    if not calls:
+        return None
+    pool = ThreadPoolExecutor(len(calls), thread_name_prefix="hedge")
+    try:
+        pending = set()
+        remaining = list(calls)
+        while remaining or pending:
+            if remaining:
+                pending.add(pool.submit(remaining.pop(0)))
+            done, pending = wait(pending, timeout=delay if remaining else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning("Llamada cubierta falló: %s", e)
+                    continue
+                if result is not None:
+                    return result
+        return None
+    finally:
+        pool.shutdown(wait=False)
@@ -0,0 +1,131 @@
+"""
+Persistent, content-addressed cache for paid API responses.
+
+Entries are JSON files named after a SHA-256 key of everything that
+determines the response (prompt, model, style, ...).  Writes go through a
+temporary file and an atomic rename, so concurrent readers (threads or
+other processes) either see the previous entry or the complete new one.
+Eviction drops expired entries first and then the oldest ones until the
+cache fits its entry and size limits.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """On-disk cache with age-, count- and size-based eviction."""
+
+    def __init__(
+        self,
+        directory: str,
+        max_entries: int = 2000,
+        max_bytes: int = 50 * 1024 * 1024,
+        max_age: float = 7 * 24 * 3600,
+    ) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_evict = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """Build a stable key from the parts that determine a response."""
+        blob = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if age > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (FileNotFoundError, ValueError, OSError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("No se pudo escribir en la caché %s: %s", path, e)
+            return
+        with self._lock:
+            self._writes_since_evict += 1
+            should_evict = self._writes_since_evict >= 50
+            if should_evict:
+                self._writes_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Remove expired entries and then the oldest ones over the limits."""
+        entries = []
+        now = time.time()
+        removed = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith(".json"):
+                    if now - st.st_mtime <= self.max_age:
+                        entries.append((st.st_mtime, st.st_size, path))
+                        continue
+                elif now - st.st_mtime < 300:
+                    # Temporal de una escritura en curso
+                    continue
+                # Caducado o temporal huérfano
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+            total -= size
+        if removed:
+            logger.info("Caché %s: %d entradas eliminadas", self.directory, removed)
+        return removed
+
+    def take_counters(self) -> Dict[str, int]:
+        """Return and reset the hit/miss counters."""
+        with self._lock:
+            counters = {"hit": self.hits, "miss": self.misses}
+            self.hits = self.misses = 0
+        return counters
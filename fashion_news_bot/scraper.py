@@ -2,23 +2,43 @@
 Fetches fresh fashion articles from NewsAPI and RSS feeds.
 
 The scraper module interacts with the News API (if enabled via
-configuration) and any RSS feeds specified in the environment.  It
-deduplicates articles based on a hash of the source, URL and title and
-returns only those that have not been seen before.
+configuration) and any RSS feeds specified in the environment.  All
+sources are fetched in parallel with a bounded thread pool, and RSS feeds
+are requested conditionally (ETag / Last-Modified) so unchanged feeds are
+skipped without parsing.  It deduplicates articles based on a hash of
+the source, URL and title, drops near-duplicate stories syndicated by
+several outlets, and returns only those that have not been seen before.
 """
 
+import calendar
 import hashlib
 import logging
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from functools import partial
+from typing import Callable, List, Dict, Optional, Set, Tuple
 
-import requests
 import feedparser
 
+from . import http_client, metrics
+from .classifier import classify_batch
 from .config import settings
-from .storage import load_published_hashes
+from .near_duplicates import filter_near_duplicates
+from .storage import (
+    get_published_store,
+    load_deferred_articles,
+    load_feed_cache,
+    save_deferred_articles,
+    save_feed_cache,
+)
 
 logger = logging.getLogger(__name__)
 
+# Descarga de una fuente: devuelve sus artículos y su nueva entrada en la
+# caché de feeds (None si no hay nada que guardar)
+Fetcher = Callable[[], Tuple[List[Dict], Optional[Dict]]]
+# Trabajo de descarga: (etiqueta, función)
+FetchJob = Tuple[str, Fetcher]
+
 
 def _hash_article(source: str, url: str, title: str) -> str:
     """Generate a SHA256 hash for an article based on its source, URL and title."""
@@ -38,7 +58,7 @@ def fetch_from_newsapi() -> List[Dict]:
         logger.warning("NEWSAPI_KEY no configurada. Saltando NewsAPI.")
         return []
 
-    url = "https://newsapi.org/v2/everything"
+    url = settings.newsapi_base_url.rstrip("/") + "/everything"
     params = {
         "q": settings.newsapi_query,
         "sortBy": "publishedAt",
@@ -51,7 +71,7 @@ def fetch_from_newsapi() -> List[Dict]:
     logger.info("Solicitando noticias a NewsAPI…")
     try:
         # Si usás apiKey en params, no hace falta headers
-        resp = requests.get(url, params=params, timeout=30)
+        resp = http_client.get(url, params=params, timeout=settings.fetch_timeout)
         if not resp.ok:
             # Logueamos el cuerpo para ver el mensaje real de NewsAPI
             logger.error(
@@ -82,59 +102,300 @@ def fetch_from_newsapi() -> List[Dict]:
     return articles
 
 
-def fetch_from_rss() -> List[Dict]:
-    """Fetch articles from configured RSS feeds."""
+def _entries_to_articles(feed, entries) -> List[Dict]:
+    """Convert entries of a parsed feed into article dictionaries."""
     results: List[Dict] = []
-    for feed_url in settings.rss_feeds:
-        if not feed_url:
+    for entry in entries:
+        image_url = None
+        # extraer imagen de enclosure o media_content
+        if "media_content" in entry and entry.media_content:
+            image_url = entry.media_content[0].get("url")
+        elif "links" in entry:
+            for l in entry.links:
+                if l.get("rel") == "enclosure" and "image" in l.get("type", ""):
+                    image_url = l.get("href")
+                    break
+        results.append({
+            "source": feed.feed.get("title", "RSS"),
+            "url": entry.get("link"),
+            "title": entry.get("title"),
+            "description": entry.get("summary"),
+            "content": entry.get("summary"),
+            "image_url": image_url,
+            "published_at": entry.get("published"),
+            "author": getattr(entry, "author", None),
+            "origin": "rss",
+        })
+    return results
+
+
+# Número máximo de IDs de entradas recordados por feed
+MAX_SEEN_IDS = 500
+# Número máximo de artículos aplazados por MAX_ARTICLES_PER_RUN
+MAX_DEFERRED = 500
+
+
+def _entry_id(entry) -> str:
+    return entry.get("id") or entry.get("link") or entry.get("title") or ""
+
+
+def _entry_timestamp(entry) -> Optional[float]:
+    parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    if not parsed:
+        return None
+    return calendar.timegm(parsed)
+
+
+def _filter_new_entries(entries, state: Dict) -> List:
+    """Keep only entries not seen in the previous fetch of the same feed.
+
+    An entry is skipped if its ID was already seen or if it is strictly
+    older than the stored watermark (feeds sometimes regenerate GUIDs).
+    """
+    seen = set(state.get("seen_ids") or [])
+    watermark = state.get("watermark")
+    fresh = []
+    for entry in entries:
+        if _entry_id(entry) in seen:
             continue
-        logger.info("Leyendo RSS: %s", feed_url)
-        feed = feedparser.parse(feed_url)
-        for entry in feed.entries:
-            image_url = None
-            # extraer imagen de enclosure o media_content
-            if "media_content" in entry and entry.media_content:
-                image_url = entry.media_content[0].get("url")
-            elif "links" in entry:
-                for l in entry.links:
-                    if l.get("rel") == "enclosure" and "image" in l.get("type", ""):
-                        image_url = l.get("href")
-                        break
-            results.append({
-                "source": feed.feed.get("title", "RSS"),
-                "url": entry.get("link"),
-                "title": entry.get("title"),
-                "description": entry.get("summary"),
-                "content": entry.get("summary"),
-                "image_url": image_url,
-                "published_at": entry.get("published"),
-                "author": getattr(entry, "author", None),
-                "origin": "rss",
-            })
+        ts = _entry_timestamp(entry)
+        if watermark is not None and ts is not None and ts < watermark:
+            continue
+        fresh.append(entry)
+    return fresh
+
+
+def fetch_rss_feed(
+    feed_url: str, cache: Optional[Dict[str, Dict]] = None
+) -> Tuple[List[Dict], Optional[Dict]]:
+    """Download and parse a single RSS feed.
+
+    The download goes through the shared `http_client` session so that
+    `settings.fetch_timeout` applies and connections are reused;
+    feedparser itself has no timeout and a stalled server would otherwise
+    block the worker forever.
+
+    When a `cache` dict (see `storage.load_feed_cache`) is given, the
+    request is conditional: a 304 answer returns no articles without
+    parsing anything, and a changed feed only yields entries newer than
+    the stored watermark.  Entries cut by `MAX_ARTICLES_PER_RUN` are
+    kept apart by `get_fresh_fashion_articles`.
+
+    `cache` is only read.  Returns the articles and the new cache entry
+    for `feed_url` (None when there is nothing to store); `fetch_each`
+    stores it once the fetch has completed in time.
+    """
+    logger.info("Leyendo RSS: %s", feed_url)
+    state = cache.get(feed_url, {}) if cache is not None else {}
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("modified"):
+        headers["If-Modified-Since"] = state["modified"]
+    resp = http_client.get(feed_url, headers=headers, timeout=settings.fetch_timeout)
+    if resp.status_code == 304:
+        logger.info("RSS sin cambios (304): %s", feed_url)
+        return [], None
+    resp.raise_for_status()
+    feed = feedparser.parse(
+        resp.content,
+        response_headers={k.lower(): v for k, v in resp.headers.items()},
+    )
+    if cache is None:
+        return _entries_to_articles(feed, feed.entries), None
+
+    entries = _filter_new_entries(feed.entries, state)
+    timestamps = [ts for ts in map(_entry_timestamp, feed.entries) if ts is not None]
+    watermark = max(timestamps) if timestamps else state.get("watermark")
+    if state.get("watermark") is not None and watermark is not None:
+        watermark = max(watermark, state["watermark"])
+    state = {
+        "etag": resp.headers.get("ETag"),
+        "modified": resp.headers.get("Last-Modified"),
+        "watermark": watermark,
+        "seen_ids": [_entry_id(e) for e in feed.entries][:MAX_SEEN_IDS],
+    }
+    logger.info("RSS %s: %d entradas nuevas de %d", feed_url, len(entries), len(feed.entries))
+    return _entries_to_articles(feed, entries), state
+
+
+def _newsapi_job() -> Tuple[List[Dict], Optional[Dict]]:
+    return fetch_from_newsapi(), None
+
+
+def _measured_fetch(label: str, fetcher: Fetcher) -> Tuple[List[Dict], Optional[Dict]]:
+    with metrics.stage("fetch", label) as stage:
+        articles, state = fetcher()
+        stage.add(items=len(articles))
+        return articles, state
+
+
+def fetch_each(
+    jobs: List[FetchJob], cache: Optional[Dict[str, Dict]] = None
+) -> List[Optional[List[Dict]]]:
+    """Run source fetchers in a bounded thread pool.
+
+    Each job is a `(label, fetcher)` pair (see `FetchJob`).  Returns the
+    articles of each job, in job order, or None for a source that raised
+    or did not finish before `settings.fetch_deadline`; it is logged and
+    skipped, so one slow or broken feed never costs the results of the
+    others.
+
+    The new cache entry of each job that completed in time is stored in
+    `cache` under its label, from the calling thread: a worker left
+    running past the deadline never touches `cache`.
+    """
+    if not jobs:
+        return []
+    results: List[Optional[List[Dict]]] = [None] * len(jobs)
+    workers = max(1, min(settings.fetch_concurrency, len(jobs)))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch")
+    futures = {
+        pool.submit(_measured_fetch, label, fetcher): i
+        for i, (label, fetcher) in enumerate(jobs)
+    }
+    try:
+        for future in as_completed(futures, timeout=settings.fetch_deadline):
+            i = futures[future]
+            try:
+                results[i], state = future.result()
+            except Exception as e:
+                logger.warning("Fuente %s falló: %s", jobs[i][0], e)
+                continue
+            if cache is not None and state is not None:
+                cache[jobs[i][0]] = state
+    except FuturesTimeout:
+        pending = [jobs[i][0] for f, i in futures.items() if not f.done()]
+        logger.warning(
+            "%d fuentes no respondieron en %.0fs: %s",
+            len(pending), settings.fetch_deadline, ", ".join(pending),
+        )
+    finally:
+        # No esperamos a los workers colgados: sus resultados se descartan
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def _fetch_concurrently(jobs: List[FetchJob], cache: Optional[Dict[str, Dict]]) -> List[Dict]:
+    """Fetch every job with `fetch_each` and merge the results in job order.
+
+    Keeping job order makes the output independent of which source
+    happened to answer first.
+    """
+    merged: List[Dict] = []
+    for chunk in fetch_each(jobs, cache):
+        if chunk:
+            merged.extend(chunk)
+    return merged
+
+
+def source_jobs(cache: Optional[Dict[str, Dict]]) -> List[FetchJob]:
+    """`(label, fetcher)` for NewsAPI and every RSS feed, as `fetch_each` expects.
+
+    RSS feeds are labelled with their URL and read the conditional-GET
+    `cache` (see `load_source_cache`); pass the same `cache` to
+    `fetch_each` to store their new entries.
+    """
+    return [("NewsAPI", _newsapi_job)] + _rss_jobs(cache)
+
+
+def _rss_jobs(cache: Optional[Dict[str, Dict]]) -> List[FetchJob]:
+    return [
+        (feed_url, partial(fetch_rss_feed, feed_url, cache))
+        for feed_url in settings.rss_feeds
+        if feed_url
+    ]
+
+
+def load_source_cache() -> Optional[Dict[str, Dict]]:
+    """The RSS conditional-GET cache, or None when `RSS_CONDITIONAL_GET` is off."""
+    return load_feed_cache() if settings.rss_conditional_get else None
+
+
+def fetch_from_rss() -> List[Dict]:
+    """Fetch articles from configured RSS feeds concurrently."""
+    cache = load_source_cache()
+    results = _fetch_concurrently(_rss_jobs(cache), cache)
+    if cache is not None:
+        save_feed_cache(cache)
     logger.info("RSS total: %d artículos", len(results))
     return results
 
 
-def get_fresh_fashion_articles(limit: int = None) -> List[Dict]:
+def fetch_all_sources() -> List[Dict]:
+    """Fetch NewsAPI and every RSS feed in parallel.
+
+    Returns the same article dictionaries as `fetch_from_newsapi` and
+    `fetch_from_rss`, NewsAPI results first and then feeds in
+    configuration order.
+    """
+    cache = load_source_cache()
+    jobs = source_jobs(cache)
+    results = _fetch_concurrently(jobs, cache)
+    if cache is not None:
+        save_feed_cache(cache)
+    logger.info("Total recolectado: %d artículos de %d fuentes", len(results), len(jobs))
+    return results
+
+
+def article_hash(art: Dict) -> str:
+    """Dedup hash of an article dictionary returned by a fetcher."""
+    return _hash_article(art.get("source", ""), art.get("url", ""), art.get("title", ""))
+
+
+def get_fresh_fashion_articles(
+    limit: int = None,
+    fetch: Optional[Callable[[], List[Dict]]] = None,
+    exclude: Optional[Set[str]] = None,
+) -> List[Dict]:
     """Return a list of new, deduplicated articles.
 
-    Articles already present in the published database are filtered out.  A
-    limit can be specified to restrict the number of returned articles.
+    Articles already present in the published database, or whose hash is
+    in `exclude` (e.g. articles resumed from the journal), are filtered
+    out.  A limit can be specified to restrict the number of returned
+    articles.  Candidates come from `fetch`, by default
+    `fetch_all_sources`; the daemon passes one that only fetches the
+    sources due for a poll.
+
+    With `RSS_CONDITIONAL_GET` a feed yields each entry only once, so the
+    articles cut by `limit` are saved (see
+    `storage.save_deferred_articles`) and offered again with the next
+    candidates.  Articles dropped as published or near-duplicates are not.
     """
     if limit is None:
         limit = settings.max_articles_per_run
-    published_hashes = load_published_hashes()
-    candidates: List[Dict] = []
-    # aggregate from sources
-    candidates.extend(fetch_from_newsapi())
-    candidates.extend(fetch_from_rss())
+    exclude = exclude or set()
+    published = get_published_store()
+    # aggregate from sources (fetched in parallel)
+    candidates = (fetch or fetch_all_sources)()
+    if settings.rss_conditional_get:
+        candidates = load_deferred_articles() + candidates
     fresh = []
+    seen: Set[str] = set()
     for art in candidates:
-        h = _hash_article(art.get("source", ""), art.get("url", ""), art.get("title", ""))
+        h = article_hash(art)
         art["hash"] = h
-        if h not in published_hashes:
+        if h not in published and h not in exclude and h not in seen:
+            seen.add(h)
             fresh.append(art)
     logger.info("Artículos nuevos detectados: %d", len(fresh))
+    if settings.near_dup_enabled:
+        fresh = filter_near_duplicates(fresh)
+    # classify the whole batch at once so ranking can use the category
+    with metrics.stage("classify") as stage:
+        stage.add(items=len(fresh))
+        labels = classify_batch(fresh)
+    for art, (category, confidence) in zip(fresh, labels):
+        art["category"] = category
+        art["category_confidence"] = confidence
     # sort by published date descending (if available)
     fresh.sort(key=lambda x: x.get("published_at") or "", reverse=True)
+    if settings.category_priority:
+        rank = {c: i for i, c in enumerate(settings.category_priority)}
+        fresh.sort(key=lambda x: rank.get(x["category"], len(rank)))
+    if settings.rss_conditional_get:
+        deferred = fresh[limit:][:MAX_DEFERRED]
+        if deferred:
+            logger.info("Artículos aplazados para la próxima ejecución: %d", len(deferred))
+        save_deferred_articles(deferred)
     return fresh[:limit]
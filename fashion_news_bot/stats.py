@@ -6,22 +6,213 @@ the number of articles per source and per category.  The stats are
 persisted in a JSON file defined in configuration.  Stats are not
 critical for the bot to function but can help identify which
 sources/categories are performing best.
+
+Updates are accumulated in memory by `StatsAccumulator` and merged into
+the file in one read-modify-write per flush: at the end of a run
+(`flush_stats`), every `settings.stats_flush_interval` seconds, and at
+interpreter exit.  A flush adds the pending deltas to what is on disk
+under an exclusive file lock and writes through an atomic rename, so
+several processes (the cron run, the batch writer) can
+update the file without losing increments.
+
+Besides the all-time `source:<name>` and `category:<name>` totals, each
+published article is counted in hourly and daily buckets
+(`hour:<YYYY-MM-DDTHH>:source:<name>`, `day:<YYYY-MM-DD>:category:<name>`,
+...); `bucket_counts` reads them back as a trend.  Hourly buckets older
+than `settings.stats_hourly_retention_days` are dropped on flush.
 """
 
+import atexit
 import logging
-from typing import Dict
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
 
+from .config import settings
 from .storage import load_stats, save_stats
 
+try:
+    import fcntl
+except ImportError:  # Windows: solo se serializa dentro del proceso
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+HOUR_FORMAT = "%Y-%m-%dT%H"
+DAY_FORMAT = "%Y-%m-%d"
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive lock shared by every process that writes the stats file."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class StatsAccumulator:
+    """In-memory counter deltas and gauges, merged into the stats file on flush."""
+
+    def __init__(self, flush_interval: float = 0.0) -> None:
+        self.flush_interval = flush_interval
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Serializa los flush de este proceso (el lock de fichero, entre procesos)
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def add(self, counters: Dict[str, int]) -> None:
+        with self._lock:
+            for key, amount in counters.items():
+                if amount:
+                    self._counters[key] = self._counters.get(key, 0) + amount
+        self._ensure_timer()
+
+    def set(self, values: Dict[str, int]) -> None:
+        with self._lock:
+            self._gauges.update(values)
+        self._ensure_timer()
+
+    def pending(self) -> Dict[str, int]:
+        """Unflushed counter deltas (for reading this process's own updates)."""
+        with self._lock:
+            return dict(self._counters)
+
+    def flush(self) -> None:
+        """Merge the pending deltas and gauges into the stats file."""
+        with self._flush_lock:
+            with self._lock:
+                counters, self._counters = self._counters, {}
+                gauges, self._gauges = self._gauges, {}
+            if not counters and not gauges:
+                return
+            try:
+                with _file_lock(settings.stats_db_path):
+                    stats: Dict[str, int] = load_stats()
+                    for key, amount in counters.items():
+                        stats[key] = stats.get(key, 0) + amount
+                    stats.update(gauges)
+                    _prune_hourly(stats)
+                    save_stats(stats)
+            except Exception as e:
+                logger.error("No se pudieron guardar las estadísticas: %s", e)
+                # Se devuelven al acumulador para el siguiente intento
+                with self._lock:
+                    for key, amount in counters.items():
+                        self._counters[key] = self._counters.get(key, 0) + amount
+                    self._gauges = {**gauges, **self._gauges}
+                return
+        logger.info("Estadísticas guardadas: %d contadores, %d indicadores", len(counters), len(gauges))
+
+    def _ensure_timer(self) -> None:
+        if self.flush_interval <= 0 or self._timer is not None:
+            return
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Thread(target=self._run_timer, name="stats-flush", daemon=True)
+            self._timer.start()
+
+    def _run_timer(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+
+
+def _prune_hourly(stats: Dict[str, int]) -> None:
+    cutoff = time.strftime(
+        HOUR_FORMAT, time.localtime(time.time() - settings.stats_hourly_retention_days * 86400)
+    )
+    for key in [k for k in stats if k.startswith("hour:") and k[5:18] < cutoff]:
+        del stats[key]
+
+
+_accumulator: Optional[StatsAccumulator] = None
+_accumulator_lock = threading.Lock()
+
+
+def get_accumulator() -> StatsAccumulator:
+    """Return the process-wide stats accumulator (flushed at exit)."""
+    global _accumulator
+    with _accumulator_lock:
+        if _accumulator is None:
+            _accumulator = StatsAccumulator(settings.stats_flush_interval)
+            atexit.register(_accumulator.close)
+        return _accumulator
+
 
 def update_stats(source: str, category: str) -> None:
-    """Increment counters for the given source and category."""
-    stats: Dict[str, int] = load_stats()
+    """Count a published article for its source and category, in total and per hour/day."""
+    now = time.localtime()
+    hour, day = time.strftime(HOUR_FORMAT, now), time.strftime(DAY_FORMAT, now)
     source_key = f"source:{source or 'unknown'}"
     category_key = f"category:{category or 'general'}"
-    stats[source_key] = stats.get(source_key, 0) + 1
-    stats[category_key] = stats.get(category_key, 0) + 1
-    save_stats(stats)
-    logger.info("Actualizadas estadísticas: %s=%d, %s=%d", source_key, stats[source_key], category_key, stats[category_key])
\ No newline at end of file
+    counters: Dict[str, int] = {}
+    for key in (source_key, category_key):
+        counters[key] = 1
+        counters[f"hour:{hour}:{key}"] = 1
+        counters[f"day:{day}:{key}"] = 1
+    get_accumulator().add(counters)
+    logger.info("Estadísticas acumuladas: %s, %s", source_key, category_key)
+
+
+def update_counters(counters: Dict[str, int]) -> None:
+    """Add arbitrary counters (e.g. cache hits) to the stats file."""
+    counters = {k: v for k, v in counters.items() if v}
+    if not counters:
+        return
+    get_accumulator().add(counters)
+    logger.info("Actualizados contadores: %s", counters)
+
+
+def set_gauges(values: Dict[str, int]) -> None:
+    """Overwrite point-in-time values (e.g. remaining budget) in the stats file."""
+    get_accumulator().set(values)
+
+
+def flush_stats() -> None:
+    """Write the accumulated statistics now (end of a run)."""
+    get_accumulator().flush()
+
+
+def read_stats() -> Dict[str, int]:
+    """Stats file plus the increments of this process not flushed yet."""
+    stats = load_stats()
+    for key, amount in get_accumulator().pending().items():
+        stats[key] = stats.get(key, 0) + amount
+    return stats
+
+
+def bucket_counts(
+    kind: str, granularity: str = "day", last: int = 7, stats: Optional[Dict[str, int]] = None
+) -> List[Tuple[str, Dict[str, int]]]:
+    """Per-bucket counts of a `kind` (`source` or `category`), oldest first.
+
+    Returns the last `last` buckets of `granularity` (`hour` or `day`)
+    that have data, each with its counts by name.
+    """
+    stats = read_stats() if stats is None else stats
+    prefix = f"{granularity}:"
+    marker = f":{kind}:"
+    buckets: Dict[str, Dict[str, int]] = {}
+    for key, value in stats.items():
+        if not key.startswith(prefix):
+            continue
+        bucket, sep, name = key[len(prefix):].partition(marker)
+        if sep:
+            buckets.setdefault(bucket, {})[name] = value
+    return sorted(buckets.items())[-last:]
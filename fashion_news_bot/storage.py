@@ -3,22 +3,45 @@ Storage helpers for the fashion news bot.
 
 This module provides functions for reading and writing the persistent
 state used by the bot.  It stores hashes of already published
-articles to avoid duplication and simple statistics about which
-sources and categories have been published.
+articles to avoid duplication (through a pluggable `PublishedStore`
+backend, SQLite by default), simple statistics about which
+sources and categories have been published and the HTTP validators
+(ETag / Last-Modified) of every RSS feed.
 """
 
 import json
+import logging
 import os
-from typing import Set, Dict
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set
 
+from .bloom import BloomFilter, bits_for
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
 
 def _ensure_dirs() -> None:
     """Ensure that the data directory exists."""
     os.makedirs(os.path.dirname(settings.published_db_path), exist_ok=True)
 
 
+def _atomic_write_json(path: str, data: Any, **kwargs) -> None:
+    """Write JSON to `path` through a temporary file and an atomic rename.
+
+    A crash in the middle of the write leaves the previous file intact
+    instead of a truncated one.
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, **kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
 def load_published_hashes() -> Set[str]:
     """Load the set of article hashes that have already been published."""
     _ensure_dirs()
@@ -35,8 +58,252 @@ def load_published_hashes() -> Set[str]:
 def save_published_hashes(hashes: Set[str]) -> None:
     """Persist the set of article hashes that have been published."""
     _ensure_dirs()
-    with open(settings.published_db_path, "w", encoding="utf-8") as f:
-        json.dump({"hashes": list(hashes)}, f, ensure_ascii=False, indent=2)
+    _atomic_write_json(settings.published_db_path, {"hashes": list(hashes)}, indent=2)
+
+
+class PublishedStore:
+    """Interface of the dedup store holding hashes of published articles.
+
+    Backends must support O(1) membership checks (`hash in store`) and
+    persist every `add` immediately, so an interrupted run never loses the
+    articles it already published.
+    """
+
+    def __contains__(self, article_hash: str) -> bool:
+        raise NotImplementedError
+
+    def add(self, article_hash: str) -> None:
+        raise NotImplementedError
+
+    def __iter__(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Persist any auxiliary in-memory state (no-op by default)."""
+
+    def close(self) -> None:
+        self.flush()
+
+
+class JsonPublishedStore(PublishedStore):
+    """Legacy backend: the whole set lives in `published.json`.
+
+    Every `add` rewrites the file atomically, which is fine for small
+    histories and keeps the file format unchanged.  In memory the hashes
+    are kept as raw 32-byte digests; the set and object overhead
+    dominates, so this only saves about a fifth of the memory of hex
+    strings.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or settings.published_db_path
+        self._digests: Set[bytes] = {
+            bytes.fromhex(h) for h in self._load(self.path) if _is_hex_digest(h)
+        }
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(path: str) -> Set[str]:
+        if not os.path.exists(path):
+            return set()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return set(json.load(f).get("hashes", []))
+        except Exception:
+            return set()
+
+    def __contains__(self, article_hash: str) -> bool:
+        return _is_hex_digest(article_hash) and bytes.fromhex(article_hash) in self._digests
+
+    def add(self, article_hash: str) -> None:
+        digest = bytes.fromhex(article_hash)
+        with self._lock:
+            if digest in self._digests:
+                return
+            self._digests.add(digest)
+            hashes = [d.hex() for d in self._digests]
+            _atomic_write_json(self.path, {"hashes": hashes}, indent=2)
+
+    def __iter__(self) -> Iterator[str]:
+        return (d.hex() for d in list(self._digests))
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+
+class SqlitePublishedStore(PublishedStore):
+    """SQLite backend with an indexed table of raw 32-byte digests.
+
+    Membership is a primary-key lookup, each `add` is a single committed
+    INSERT (journalled by SQLite, so a crash never corrupts the table) and
+    nothing is loaded into memory up front.  On first use the hashes of a
+    legacy `published.json` are imported.
+    """
+
+    def __init__(self, path: Optional[str] = None, legacy_json_path: Optional[str] = None) -> None:
+        self.path = path or settings.published_sqlite_path
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS published ("
+            " digest BLOB PRIMARY KEY,"
+            " published_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._conn.commit()
+        self._migrate_json(legacy_json_path or settings.published_db_path)
+
+    def _migrate_json(self, json_path: str) -> None:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'migrated_json'"
+        ).fetchone()
+        if row is not None or not os.path.exists(json_path):
+            return
+        hashes = JsonPublishedStore._load(json_path)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO published (digest, published_at) VALUES (?, ?)",
+                ((bytes.fromhex(h), now) for h in hashes if _is_hex_digest(h)),
+            )
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('migrated_json', ?)", (json_path,)
+            )
+        logger.info("Migrados %d hashes desde %s a SQLite", len(hashes), json_path)
+
+    def __contains__(self, article_hash: str) -> bool:
+        if not _is_hex_digest(article_hash):
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM published WHERE digest = ?", (bytes.fromhex(article_hash),)
+            ).fetchone()
+        return row is not None
+
+    def add(self, article_hash: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO published (digest, published_at) VALUES (?, ?)",
+                (bytes.fromhex(article_hash), time.time()),
+            )
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT digest FROM published").fetchall()
+        return (digest.hex() for (digest,) in rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM published").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class BloomFilteredStore(PublishedStore):
+    """Probabilistic front layer over another `PublishedStore`.
+
+    Most candidates of a run were never published, and for those the Bloom
+    filter answers "no" without touching the backing store.  Positives are
+    confirmed with an exact lookup, so a false positive costs one query
+    and never drops an article.  The filter is saved on `flush` together
+    with the number of items it holds; if that count does not match the
+    backing store on startup (crash, edits, other backend) it is rebuilt.
+    """
+
+    def __init__(self, inner: PublishedStore, path: Optional[str] = None) -> None:
+        self.inner = inner
+        self.path = path or settings.bloom_filter_path
+        self._lock = threading.Lock()
+        self.bloom = self._load_or_rebuild()
+
+    def _load_or_rebuild(self) -> BloomFilter:
+        size = len(self.inner)
+        needed_bits = bits_for(max(settings.bloom_capacity, size), settings.bloom_fp_rate)
+        try:
+            bloom = BloomFilter.load(self.path)
+            if bloom.count == size and bloom.num_bits >= needed_bits:
+                return bloom
+            logger.info("Filtro Bloom desactualizado (%d vs %d hashes): reconstruyendo", bloom.count, size)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudo leer el filtro Bloom %s: %s", self.path, e)
+        bloom = BloomFilter(max(settings.bloom_capacity, 2 * size), settings.bloom_fp_rate)
+        for article_hash in self.inner:
+            bloom.add(bytes.fromhex(article_hash))
+        bloom.save(self.path)
+        return bloom
+
+    def __contains__(self, article_hash: str) -> bool:
+        if not _is_hex_digest(article_hash):
+            return False
+        if bytes.fromhex(article_hash) not in self.bloom:
+            return False
+        return article_hash in self.inner
+
+    def add(self, article_hash: str) -> None:
+        with self._lock:
+            if article_hash in self:
+                return
+            self.inner.add(article_hash)
+            self.bloom.add(bytes.fromhex(article_hash))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.inner)
+
+    def __len__(self) -> int:
+        return len(self.inner)
+
+    def flush(self) -> None:
+        self.inner.flush()
+        self.bloom.save(self.path)
+
+    def close(self) -> None:
+        self.flush()
+        self.inner.close()
+
+
+def _is_hex_digest(value: str) -> bool:
+    if not value or len(value) != 64:
+        return False
+    try:
+        bytes.fromhex(value)
+    except ValueError:
+        return False
+    return True
+
+
+_published_store: Optional[PublishedStore] = None
+_published_store_lock = threading.Lock()
+
+
+def get_published_store() -> PublishedStore:
+    """Return the process-wide dedup store selected by `settings.dedup_backend`."""
+    global _published_store
+    with _published_store_lock:
+        if _published_store is None:
+            _ensure_dirs()
+            backend = settings.dedup_backend
+            if backend == "json":
+                _published_store = JsonPublishedStore()
+            else:
+                if backend != "sqlite":
+                    logger.warning("DEDUP_BACKEND desconocido '%s', usando sqlite", backend)
+                _published_store = SqlitePublishedStore()
+            if settings.dedup_bloom:
+                _published_store = BloomFilteredStore(_published_store)
+        return _published_store
 
 
 def load_stats() -> Dict[str, int]:
@@ -58,5 +325,44 @@ def load_stats() -> Dict[str, int]:
 def save_stats(stats: Dict[str, int]) -> None:
     """Save statistics dictionary to disk."""
     _ensure_dirs()
-    with open(settings.stats_db_path, "w", encoding="utf-8") as f:
-        json.dump(stats, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+    _atomic_write_json(settings.stats_db_path, stats, indent=2)
+
+
+def load_feed_cache() -> Dict[str, Dict[str, Any]]:
+    """Load the per-feed HTTP validator cache.
+
+    Maps each feed URL to a dict with the keys `etag`, `modified`,
+    `watermark` (newest entry timestamp) and `seen_ids`.
+    """
+    _ensure_dirs()
+    if not os.path.exists(settings.feed_cache_path):
+        return {}
+    try:
+        with open(settings.feed_cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_feed_cache(cache: Dict[str, Dict[str, Any]]) -> None:
+    """Persist the per-feed HTTP validator cache."""
+    _ensure_dirs()
+    _atomic_write_json(settings.feed_cache_path, cache)
+
+
+def load_deferred_articles() -> List[Dict[str, Any]]:
+    """Load the articles cut by `MAX_ARTICLES_PER_RUN` in the last run."""
+    _ensure_dirs()
+    if not os.path.exists(settings.deferred_articles_path):
+        return []
+    try:
+        with open(settings.deferred_articles_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return []
+
+
+def save_deferred_articles(articles: List[Dict[str, Any]]) -> None:
+    """Persist the articles to offer again in the next run."""
+    _ensure_dirs()
+    _atomic_write_json(settings.deferred_articles_path, articles)
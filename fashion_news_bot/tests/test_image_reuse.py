@@ -0,0 +1,59 @@
+"""Placeholder covers must never enter the image library."""
+
+from fashion_news_bot import image_generator, pipeline
+from fashion_news_bot.config import settings
+from fashion_news_bot.image_generator import PlaceholderImageProvider
+from fashion_news_bot.journal import IMAGE_DONE, PipelineJournal
+from fashion_news_bot.pipeline import ArticlePipeline
+
+
+class _Library:
+    def __init__(self):
+        self.added = []
+
+    def add(self, *args, **kwargs):
+        self.added.append(args)
+
+    def find_by_phash(self, phash, max_distance=None):
+        return None
+
+
+class _WordPress:
+    def upload_media_bytes(self, data, filename, mime):
+        return 7
+
+
+def _archiving_pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_path", str(tmp_path / "metrics.jsonl"))
+    monkeypatch.setattr(settings, "image_archive", True)
+    monkeypatch.setattr(settings, "image_processing_enabled", True)
+    monkeypatch.setattr(settings, "image_reuse_enabled", True)
+    monkeypatch.setattr(settings, "images_output_dir", str(tmp_path / "images"))
+    monkeypatch.setattr(image_generator, "_providers", [PlaceholderImageProvider()])
+    library = _Library()
+    monkeypatch.setattr(pipeline, "get_library", lambda: library)
+    journal = PipelineJournal(str(tmp_path / "journal.jsonl"))
+    return ArticlePipeline(_WordPress(), None, journal), journal, library
+
+
+def test_archived_placeholder_is_not_added_to_library(tmp_path, monkeypatch):
+    art = {"hash": "ab" * 32, "title": "Chanel Fall 2025 runway show"}
+    article_pipeline, journal, library = _archiving_pipeline(tmp_path, monkeypatch)
+    with article_pipeline as p:
+        image = p._image(art)
+        assert image.path and image.provider == "placeholder"
+        assert not image.reusable
+        assert p._upload_image(art, image) == 7
+    assert library.added == []
+
+
+def test_resumed_placeholder_is_not_added_to_library(tmp_path, monkeypatch):
+    art = {"hash": "cd" * 32, "title": "Dior resort collection in Kyoto"}
+    article_pipeline, journal, library = _archiving_pipeline(tmp_path, monkeypatch)
+    with article_pipeline as p:
+        p._image(art)
+        resumed = p._resume_image(journal.steps(art["hash"])[IMAGE_DONE])
+        assert resumed.provider == "placeholder"
+        assert not resumed.reusable
+        p._upload_image(art, resumed)
+    assert library.added == []
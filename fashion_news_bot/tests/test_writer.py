@@ -0,0 +1,37 @@
+"""Title and subtitle extraction of the streamed article parser."""
+
+from fashion_news_bot.writer import ArticleStreamParser
+
+ARTICLE = """```python
+# not the title
+## not the subtitle
+```
+
+# Chanel abre su temporada en París
+
+## Una colección de tweed y perlas
+
+El desfile reunió a la prensa internacional.
+"""
+
+
+def _parse(text, chunk=7):
+    titles = []
+    parser = ArticleStreamParser("fallback", titles.append)
+    for i in range(0, len(text), chunk):
+        parser.feed(text[i:i + chunk])
+    parser.finish()
+    return parser, titles
+
+
+def test_headings_inside_fence_before_first_heading_are_ignored():
+    parser, titles = _parse(ARTICLE)
+    assert parser.title == "Chanel abre su temporada en París"
+    assert parser.subtitle == "Una colección de tweed y perlas"
+    assert titles == ["Chanel abre su temporada en París"]
+
+
+def test_tilde_fence_is_ignored_too():
+    parser, _ = _parse(ARTICLE.replace("```", "~~~"), chunk=3)
+    assert parser.title == "Chanel abre su temporada en París"
+    assert parser.subtitle == "Una colección de tweed y perlas"
@@ -0,0 +1,136 @@
+"""
+Offline training of the batch classification model.
+
+The model must see at training time the same text it scores at serving
+time: the source article (title, description and content) as fetched,
+not the rewritten Spanish post.  The pipeline records that text for
+every published post in `settings.training_samples_path`
+(`classifier.record_training_sample`); this script joins it with the
+category each post is currently filed under in WordPress, so editors'
+corrections become labels, and fits `classifier.LinearTextModel`.  A
+JSONL file with `title`, `description`, `content` and `category` per
+line can be used instead.  Labels are the classifier's own categories
+(the keyword table), mapped from WordPress IDs with `CATEGORY_ID_MAP`.
+The result is saved to `settings.classifier_model_path`, where
+`classifier.classify_batch` picks it up on the next run::
+
+    python -m fashion_news_bot.train_classifier
+    python -m fashion_news_bot.train_classifier --from-jsonl articles.jsonl
+"""
+
+import argparse
+import json
+import logging
+import os
+from typing import Dict, List, Tuple
+
+from . import http_client
+from .classifier import CATEGORY_ID_MAP, LinearTextModel, classifier_text, get_classifier
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _category_labels() -> Dict[int, str]:
+    """WordPress category ID -> classifier category, for the known categories only."""
+    known = set(get_classifier().categories)
+    return {cat_id: name for name, cat_id in CATEGORY_ID_MAP.items() if name in known}
+
+
+def fetch_post_categories(max_pages: int = 50) -> Dict[int, str]:
+    """Download the category of every published post, by post ID."""
+    if not settings.wp_base_url:
+        raise ValueError("WP_BASE_URL no configurada")
+    labels = _category_labels()
+    url = f"{settings.wp_base_url.rstrip('/')}/wp-json/wp/v2/posts"
+    auth = (settings.wp_user, settings.wp_app_password) if settings.wp_user else None
+    categories: Dict[int, str] = {}
+    for page in range(1, max_pages + 1):
+        resp = http_client.get(
+            url,
+            params={"per_page": 100, "page": page, "_fields": "id,categories"},
+            auth=auth,
+            timeout=60,
+        )
+        # WordPress responde 400 al pasar de la última página
+        if resp.status_code == 400:
+            break
+        resp.raise_for_status()
+        posts = resp.json()
+        if not posts:
+            break
+        for post in posts:
+            label = next((labels[c] for c in post.get("categories", []) if c in labels), None)
+            if label is not None:
+                categories[post["id"]] = label
+    return categories
+
+
+def load_recorded_samples(categories: Dict[int, str]) -> List[Tuple[str, str]]:
+    """Source texts recorded at publish time, labelled with their post's category."""
+    path = settings.training_samples_path
+    if not os.path.exists(path):
+        return []
+    texts: Dict[int, str] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            texts[item["post_id"]] = item["text"]
+    samples = [(text, categories[post_id]) for post_id, text in texts.items() if post_id in categories]
+    logger.info(
+        "%d posts con texto de origen y categoría conocida (%d textos, %d posts)",
+        len(samples), len(texts), len(categories),
+    )
+    return samples
+
+
+def load_jsonl(path: str) -> List[Tuple[str, str]]:
+    known = set(get_classifier().categories)
+    samples: List[Tuple[str, str]] = []
+    skipped = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if item["category"] not in known:
+                skipped += 1
+                continue
+            samples.append((classifier_text(item), item["category"]))
+    if skipped:
+        logger.warning("%d ejemplos con categorías que el clasificador no conoce", skipped)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Entrena el modelo de clasificación por lotes.")
+    parser.add_argument("--from-jsonl", help="usar un export JSONL en lugar de WordPress")
+    parser.add_argument("--output", default=settings.classifier_model_path)
+    parser.add_argument("--features", type=int, default=2 ** 13)
+    parser.add_argument("--epochs", type=int, default=300)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    if args.from_jsonl:
+        samples = load_jsonl(args.from_jsonl)
+    else:
+        samples = load_recorded_samples(fetch_post_categories())
+    labels = {label for _, label in samples}
+    if len(labels) < 2:
+        raise SystemExit("Se necesitan ejemplos de al menos dos categorías para entrenar.")
+    logger.info("Entrenando con %d ejemplos de %d categorías", len(samples), len(labels))
+    model = LinearTextModel.fit(
+        [text for text, _ in samples],
+        [label for _, label in samples],
+        n_features=args.features,
+        epochs=args.epochs,
+    )
+    model.save(args.output)
+    logger.info("Modelo guardado en %s", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,31 +7,72 @@ configuration.  It can also translate source material into Spanish if
 translation is enabled and the original language is not Spanish.
 
 If the OpenAI API key is not provided the module returns a basic
-placeholder article to allow the rest of the pipeline to run.
+placeholder article to allow the rest of the pipeline to run.  Responses
+are cached on disk, so re-running an article after a crash further down
+the pipeline does not pay for the same rewrite twice.  Calls go through a
+circuit breaker and a token budget (see `resilience`): while OpenAI keeps
+failing or the budget is spent, articles are postponed instead of
+repeating a call that is bound to fail.
 """
 
 import logging
-from typing import Dict
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 import re                     # 👈 nuevo
 import markdown  
 from openai import OpenAI
-from langdetect import detect, LangDetectException
 
+from . import metrics
 from .config import settings
+from .language import get_detector
+from .prompt_builder import UsageLog, build_prompt, build_source_block, count_tokens
+from .resilience import OPEN, CircuitOpenError, get_breaker, get_budget
+from .response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
 
+# Persistent cache of rewrites keyed by prompt, model, style and translation
+text_cache: Optional[ResponseCache] = None
+if settings.text_cache_enabled:
+    text_cache = ResponseCache(
+        settings.text_cache_dir,
+        max_entries=settings.text_cache_max_entries,
+        max_bytes=settings.text_cache_max_mb * 1024 * 1024,
+        max_age=settings.text_cache_max_age_days * 24 * 3600,
+    )
+
+
 # Preconfigure OpenAI client if API key is available
 client = None
 if settings.openai_api_key:
-    client = OpenAI(api_key=settings.openai_api_key)
+    client = OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url or None)
 else:
     logger.warning(
         "OPENAI_API_KEY no configurada. writer.py trabajará en modo dummy."
     )
 
 
+# Shared breaker and token budget for every OpenAI text call
+text_breaker = get_breaker(
+    "text:openai", settings.text_breaker_failures, settings.text_breaker_cooldown
+)
+text_budget = get_budget(
+    "openai", settings.openai_tokens_per_run, settings.openai_tokens_per_day
+)
+# Input/output tokens and latency of each rewrite, summarized per run
+usage_log = UsageLog()
+
+
+def check_text_available() -> None:
+    """Raise `CircuitOpenError` or `BudgetExceededError` if no text can be generated now."""
+    if client is None:
+        return
+    if text_breaker.state == OPEN:
+        raise CircuitOpenError(f"circuito {text_breaker.name} abierto")
+    text_budget.check()
+
+
 # Style templates for different writer styles
 STYLE_TEMPLATES = {
     "luxury": (
@@ -74,18 +115,79 @@ def markdown_a_html_bonito(texto: str) -> str:
     # Contenedor para poder estilizar fácil desde el theme
     return f'<div class="elitevogue-article">{html}</div>'
 
-def _detect_language(text: str) -> str:
-    """Detect the language of a piece of text using langdetect.
 
-    Returns a two‑letter ISO 639‑1 language code, or 'unknown' on failure.
+def build_article_prompt(article: Dict) -> Tuple[str, str]:
+    """Build the rewrite prompt for `article` and its response cache key.
+
+    Shared by the online path and the batch mode (`batch_writer`), so both
+    produce the same prompt and hit the same cache entries.
     """
-    try:
-        return detect(text)  # e.g. 'es', 'en'
-    except LangDetectException:
-        return "unknown"
+    # Title, description and content without HTML, repeats or excess tokens
+    source = build_source_block(article)
 
+    # Detect language for possible translation
+    lang = get_detector().detect_article(article)
+    logger.info("Idioma detectado: %s", lang)
+
+    # Determine style instructions
+    style_key = settings.writer_style if settings.writer_style in STYLE_TEMPLATES else "luxury"
+    style_instructions = STYLE_TEMPLATES[style_key]
 
-def generate_article_text(article: Dict) -> Dict:
+    # Compose prompt for OpenAI: fixed instructions first, article last
+    translation_instruction = (
+        "Traduce toda la información al español neutro antes de escribir el artículo. "
+        if settings.translation_enabled and lang != "es"
+        else ""
+    )
+    prompt = build_prompt(
+        "Eres un redactor senior de una revista de moda. "
+        + translation_instruction
+        + "Con la información original de abajo, redacta un artículo completamente nuevo "
+        + "en español neutro, sin copiar frases literales; si la fuente es muy corta, "
+        + "amplíala con contexto de moda actual. Usa subtítulos y párrafos.\n"
+        + style_instructions,
+        source,
+    )
+
+    # Caché por contenido: un reintento tras un fallo posterior no vuelve a pagar
+    cache_key = ResponseCache.make_key(
+        prompt=prompt,
+        model=settings.openai_text_model,
+        style=style_key,
+        translate=bool(translation_instruction),
+    )
+    return prompt, cache_key
+
+
+def _usage_tokens(usage) -> Tuple[int, int]:
+    """Input and output tokens reported in a response `usage` object."""
+    return (
+        getattr(usage, "input_tokens", 0) or 0,
+        getattr(usage, "output_tokens", 0) or 0,
+    )
+
+
+def _stream_response(prompt: str, parser: "ArticleStreamParser") -> Tuple[int, int]:
+    """Consume a streamed response into `parser`; return input and output tokens."""
+    tokens = (0, 0)
+    stream = client.responses.create(
+        model=settings.openai_text_model,
+        input=prompt,
+        stream=True,
+    )
+    for event in stream:
+        if event.type == "response.output_text.delta":
+            parser.feed(event.delta)
+        elif event.type == "response.completed":
+            tokens = _usage_tokens(getattr(event.response, "usage", None))
+        elif event.type in ("response.failed", "error"):
+            raise RuntimeError(f"Streaming de OpenAI fallido: {getattr(event, 'message', None) or event.type}")
+    return tokens
+
+
+def generate_article_text(
+    article: Dict, on_title: Optional[Callable[[str], None]] = None
+) -> Dict:
     """Generate an editorial article in Spanish based on a raw article dictionary.
 
     The dictionary is expected to contain keys `title`, `description` and
@@ -97,24 +199,11 @@ def generate_article_text(article: Dict) -> Dict:
     - body_html: the article content in simple HTML
     - meta_description: a short meta description for SEO
     - category: optional; classification label provided externally
-    """
-    # Concatenate available fields as the input for rewriting
-    base_content = (
-        (article.get("title") or "")
-        + "\n\n"
-        + (article.get("description") or "")
-        + "\n\n"
-        + (article.get("content") or "")
-    )[:8000]
-
-    # Detect language for possible translation
-    lang = _detect_language(base_content)
-    logger.info("Idioma detectado: %s", lang)
-
-    # Determine style instructions
-    style_key = settings.writer_style if settings.writer_style in STYLE_TEMPLATES else "luxury"
-    style_instructions = STYLE_TEMPLATES[style_key]
 
+    `on_title` is called with the headline as soon as it is known; with
+    `settings.openai_streaming` that is while the body is still being
+    generated.
+    """
     # Dummy mode: return simple placeholder if no OpenAI key
     if client is None:
         logger.warning("Sin OPENAI_API_KEY: devolviendo contenido de ejemplo.")
@@ -126,6 +215,8 @@ def generate_article_text(article: Dict) -> Dict:
             "Este artículo es un marcador de posición generado localmente. "
             "Configura OPENAI_API_KEY para obtener texto editorial real."
         )
+        if on_title is not None:
+            on_title(dummy_title)
         return {
             "magazine_title": dummy_title,
             "subtitle": dummy_subtitle,
@@ -134,70 +225,164 @@ def generate_article_text(article: Dict) -> Dict:
             "meta_description": dummy_title,
         }
 
-    # Compose prompt for OpenAI
-    translation_instruction = (
-        "Traduce toda la información al español neutro antes de escribir el artículo. "
-        if settings.translation_enabled and lang != "es"
-        else ""
-    )
-    prompt = (
-        "Eres un redactor senior de una revista de moda. "
-        + translation_instruction
-        + "A partir de la siguiente información original (título, descripción y contenido), "
-        + "reformula y redacta un artículo completamente nuevo en español neutro. "
-        + style_instructions
-        + "\n\nInformación original:\n"  # separate the content
-        + base_content
-        + "\n\n## Instrucciones adicionales:\n"
-        + "* No copies literalmente el texto original; reescribe con tu propio estilo.\n"
-        + "* Si la fuente original es muy corta, amplía la información con contexto de moda actual.\n"
-        + "* Usa subtítulos y párrafos para estructurar el artículo.\n"
-    )
+    prompt, cache_key = build_article_prompt(article)
+    parser = ArticleStreamParser(article.get("title", "Artículo de moda"), on_title)
+    cached = text_cache.get(cache_key) if text_cache is not None else None
+    if cached is not None:
+        logger.info("Texto editorial recuperado de la caché")
+        metrics.label(cache="hit")
+        parser.feed(cached["raw_markdown"])
+        return parser.finish()
 
-    logger.info("Llamando a OpenAI para generar texto editorial...")
-    response = client.responses.create(
-        model="gpt-4.1-mini",
-        input=prompt,
-    )
-    raw_markdown = response.output[0].content[0].text
+    text_budget.check(count_tokens(prompt))
+    started = time.monotonic()
+    if settings.openai_streaming:
+        logger.info("Llamando a OpenAI en streaming para generar texto editorial...")
+        input_tokens, output_tokens = text_breaker.call(_stream_response, prompt, parser)
+    else:
+        logger.info("Llamando a OpenAI para generar texto editorial...")
+        response = text_breaker.call(
+            client.responses.create,
+            model=settings.openai_text_model,
+            input=prompt,
+        )
+        input_tokens, output_tokens = _usage_tokens(getattr(response, "usage", None))
+        parser.feed(response.output[0].content[0].text)
+    usage_log.record(article, input_tokens, output_tokens, time.monotonic() - started)
+    metrics.add(tokens_in=input_tokens, tokens_out=output_tokens)
+    text_budget.charge(input_tokens + output_tokens)
+    if text_cache is not None:
+        text_cache.put(cache_key, {"raw_markdown": parser.raw_markdown})
+    return parser.finish()
 
-    # ============================
-    # Formateo bonito de salida
-    # ============================
 
-    # Extraer título y subtítulo desde el markdown
-    magazine_title = article.get("title", "Artículo de moda")
-    subtitle = ""
-    lines = raw_markdown.strip().splitlines()
+def parse_article_markdown(raw_markdown: str, article: Dict) -> Dict:
+    """Build the output dictionary of `generate_article_text` from markdown.
 
-    if lines:
-        # primer encabezado como título
-        for line in lines:
-            if line.startswith("#"):
-                magazine_title = line.lstrip("# ").strip()
-                break
+    Extracts the title, subtitle and meta description and renders the
+    HTML body.  `article` provides the fallback title.
+    """
+    parser = ArticleStreamParser(article.get("title", "Artículo de moda"))
+    parser.feed(raw_markdown)
+    return parser.finish()
 
-    for line in lines:
-        if line.startswith("##"):
-            subtitle = line.lstrip("# ").strip()
-            break
 
+# Definiciones de referencias, notas al pie o abreviaturas: afectan a todo
+# el documento, así que impiden convertir bloque a bloque
+_DOC_WIDE_DEFINITION_RE = re.compile(r"^ {0,3}\*?\[[^\]]+\]:", re.MULTILINE)
+_LIST_ITEM_RE = re.compile(r"([-*+]|\d+[.)])\s")
+_LEAD_RE = re.compile(r"<p>(.*?)</p>")
+
+
+def _clean_heading(line: str) -> str:
     # Limpiar posibles restos de markdown en título/subtítulo
-    magazine_title = re.sub(r"[*_`#]", "", magazine_title).strip()
-    subtitle = re.sub(r"[*_`#]", "", subtitle).strip()
-
-    # Meta description: texto plano sin signos de markdown
-    clean_text = re.sub(r"[#*_`]", " ", raw_markdown)
-    clean_text = clean_text.replace("\n", " ")
-    meta_description = clean_text[:155].strip() + "…"
-
-    # Convertir el cuerpo a HTML bonito
-    body_html = markdown_a_html_bonito(raw_markdown)
-
-    return {
-        "magazine_title": magazine_title,
-        "subtitle": subtitle,
-        "raw_markdown": raw_markdown,
-        "body_html": body_html,
-        "meta_description": meta_description,
-    }
+    return re.sub(r"[*_`#]", "", line.lstrip("# ").strip()).strip()
+
+
+class ArticleStreamParser:
+    """Incremental parser for the markdown article returned by OpenAI.
+
+    Text is fed as it arrives (`feed`).  Complete lines are inspected once:
+    the first heading becomes the title, reported right away through
+    `on_title`, the first `##` heading the subtitle, and the meta
+    description is taken from the first 155 characters.  Markdown is
+    converted to HTML one top-level block at a time, as soon as the next
+    block starts, so only the tail is left for `finish`.
+    """
+
+    META_LENGTH = 155
+
+    def __init__(self, fallback_title: str, on_title: Optional[Callable[[str], None]] = None) -> None:
+        self.fallback_title = fallback_title
+        self.on_title = on_title
+        self.title: Optional[str] = None
+        self.subtitle: Optional[str] = None
+        self._chunks: List[str] = []
+        self._head = ""
+        self._partial = ""
+        self._block: List[str] = []
+        self._blank_before = False
+        self._in_fence = False
+        self._html: List[str] = []
+        self._lead_done = False
+
+    @property
+    def raw_markdown(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, text: str) -> None:
+        self._chunks.append(text)
+        if len(self._head) < self.META_LENGTH:
+            self._head += text[: self.META_LENGTH - len(self._head)]
+        *lines, self._partial = (self._partial + text).split("\n")
+        for line in lines:
+            self._line(line)
+
+    def _set_title(self, title: str) -> None:
+        self.title = title
+        if self.on_title is not None:
+            self.on_title(title)
+
+    def _line(self, line: str) -> None:
+        stripped = line.strip()
+        fence = stripped.startswith(("```", "~~~"))
+        # Un "# comentario" dentro de un bloque de código no es un título
+        if line.startswith("#") and not self._in_fence and not fence:
+            if self.title is None:
+                self._set_title(_clean_heading(line))
+            if self.subtitle is None and line.startswith("##"):
+                self.subtitle = _clean_heading(line)
+        # Un bloque termina en una línea en blanco seguida de una línea que
+        # no puede continuarlo (ni sangrada, ni de lista, tabla o cita)
+        if (
+            self._blank_before
+            and stripped
+            and not self._in_fence
+            and not line[0].isspace()
+            and not _LIST_ITEM_RE.match(line)
+            and not line.startswith(("|", ">", ":"))
+        ):
+            self._flush_block()
+        if fence:
+            self._in_fence = not self._in_fence
+        self._blank_before = not stripped and bool(self._block)
+        # Subir un nivel los títulos ### a ## para que se vean más grandes
+        self._block.append(re.sub(r"^###\s+", "## ", line))
+
+    def _to_html(self, text: str) -> str:
+        html = markdown.markdown(text, extensions=["extra", "sane_lists"])
+        if not self._lead_done:
+            # Primer párrafo como "bajada"
+            html, found = _LEAD_RE.subn(r'<p class="elitevogue-lead">\1</p>', html, count=1)
+            self._lead_done = bool(found)
+        return html
+
+    def _flush_block(self) -> None:
+        text = "\n".join(self._block)
+        self._block = []
+        if text.strip():
+            self._html.append(self._to_html(text))
+
+    def finish(self) -> Dict:
+        """Flush the remaining text and return the parsed article."""
+        if self._partial:
+            self._line(self._partial)
+            self._partial = ""
+        raw_markdown = self.raw_markdown
+        if _DOC_WIDE_DEFINITION_RE.search(raw_markdown):
+            body_html = markdown_a_html_bonito(raw_markdown)
+        else:
+            self._flush_block()
+            # Mismo contenedor que markdown_a_html_bonito
+            body_html = '<div class="elitevogue-article">' + "\n".join(self._html) + "</div>"
+        if self.title is None:
+            self._set_title(self.fallback_title)
+        # Meta description: texto plano sin signos de markdown
+        meta_description = re.sub(r"[#*_`]", " ", self._head).replace("\n", " ").strip() + "…"
+        return {
+            "magazine_title": self.title,
+            "subtitle": self.subtitle or "",
+            "raw_markdown": raw_markdown,
+            "body_html": body_html,
+            "meta_description": meta_description,
+        }